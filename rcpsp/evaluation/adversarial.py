@@ -0,0 +1,150 @@
+'''
+Worst case makespan of a fixed sequencing under budgeted uncertainty.
+
+Durations are act_proc * (1 + THETA * delta) with delta in [0, 1] and a total
+deviation of at most GAMMA, the uncertainty set of the robust formulations. On a
+fixed precedence plus resource flow graph the makespan is the longest path, and
+on a single path the adversary spends the budget on its longest activities:
+floor(GAMMA) of them deviate fully and one more by the fractional part.
+
+The longest path is therefore found with a dynamic program over (activity, full
+deviations used, fractional deviation used) in O(E * GAMMA). No duality
+reformulation is involved, so the bound is available on any instance size. For
+a schedule it is an upper bound on the robust objective, since the scheduler may
+only do better by reacting to the realized durations.
+
+Usage: python adversarial.py j120 j1201_1 -theta 0.5 -gamma 0 2 4 8
+'''
+
+import argparse
+import math
+
+import numpy as np
+
+from rcpsp.evaluation.monte_carlo import resource_flow
+from rcpsp.heuristics.cpm import topological_order
+from rcpsp.heuristics.genetic import improve
+from rcpsp.heuristics.portfolio import run_portfolio
+from rcpsp.instance import Instance
+
+
+def worst_case(act_pre, act_proc, theta, gamma, order=None):
+    '''
+    Worst case makespan and the delta of every activity that attains it.
+    act_pre holds the predecessor lists of the graph including any resource flow arcs.
+    '''
+    size = len(act_pre)
+    full, fraction = int(math.floor(gamma)), gamma - math.floor(gamma)
+    if order is None:
+        order = topological_order(act_pre)
+
+    # Longest path to the finish of every activity by (full deviations, fractional deviation used)
+    value = np.full((size, full + 1, 2), -np.inf)
+    for act in order:
+        if len(act_pre[act]):
+            base = value[act_pre[act]].max(axis=0)
+        else:
+            base = np.full((full + 1, 2), -np.inf)
+            base[0, 0] = 0
+
+        p = act_proc[act]
+        best = base + p
+        best[1:] = np.maximum(best[1:], base[:-1] + p * (1 + theta))
+        best[:, 1] = np.maximum(best[:, 1], base[:, 0] + p * (1 + theta * fraction))
+        value[act] = best
+
+    # Follow the maximizing states back from the latest finishing activity
+    act, budget, used = np.unravel_index(np.argmax(value), value.shape)
+    makespan = value[act, budget, used]
+    delta = [0.0] * size
+    while True:
+        p = act_proc[act]
+        if len(act_pre[act]):
+            base = value[act_pre[act]].max(axis=0)
+        else:
+            base = np.full((full + 1, 2), -np.inf)
+            base[0, 0] = 0
+
+        target = value[act, budget, used]
+        if budget > 0 and np.isclose(base[budget - 1, used] + p * (1 + theta), target) and p > 0:
+            delta[act], budget = 1.0, budget - 1
+        elif used and np.isclose(base[budget, 0] + p * (1 + theta * fraction), target) and p > 0:
+            delta[act], used = fraction, 0
+        # Otherwise the activity keeps its nominal duration
+
+        if not len(act_pre[act]):
+            break
+
+        target = base[budget, used]
+        act = next(pre for pre in act_pre[act] if np.isclose(value[pre, budget, used], target))
+
+    return float(makespan), delta
+
+
+def schedule_worst_case(project, start, theta, gamma, act_proc=None, schedule_proc=None):
+    '''
+    Worst case makespan of a schedule, kept as its resource flow network.
+    schedule_proc are the durations the schedule was built with, by default act_proc.
+    '''
+    nominal = (project.act_proc if act_proc is None else np.asarray(act_proc)).tolist()
+    arcs = resource_flow(project, start, nominal if schedule_proc is None else schedule_proc)
+
+    act_pre = [project.predecessors(act).tolist() for act in range(project.act_count + 2)]
+    for i, j in arcs:
+        act_pre[j].append(i)
+
+    return worst_case(act_pre, nominal, theta, gamma)
+
+
+def heuristic_schedule(project, act_proc, portfolio_passes=0, improve_generations=None, seed=0):
+    '''
+    Makespan and start times of the best heuristic schedule for the given durations.
+    '''
+    makespan, start, _ = run_portfolio(project, passes=portfolio_passes, seed=seed, act_proc=act_proc)
+    if improve_generations is not None:
+        improved, improved_start, _ = improve(project, generations=improve_generations, seed=seed, act_proc=act_proc)
+        if improved < makespan:
+            makespan, start = improved, improved_start
+
+    return makespan, start
+
+
+def robust_upper_bounds(project, theta, gammas, portfolio_passes=0, improve_generations=None, seed=0):
+    '''
+    Worst case makespan and delta of the best heuristic schedule for the worst case durations,
+    for every GAMMA. The schedule only depends on THETA and is built once.
+    '''
+    worst = np.round(project.act_proc * (1 + theta)).astype(np.int32)
+    _, start = heuristic_schedule(project, worst, portfolio_passes, improve_generations, seed)
+
+    return [schedule_worst_case(project, start, theta, gamma, schedule_proc=worst.tolist()) for gamma in gammas]
+
+
+def robust_upper_bound(project, theta, gamma, portfolio_passes=0, improve_generations=None, seed=0):
+    '''
+    Worst case makespan and delta of the best heuristic schedule for the worst case durations.
+    '''
+    return robust_upper_bounds(project, theta, [gamma], portfolio_passes, improve_generations, seed)[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-theta", "--theta", type=float, nargs='+', default=[0.5])
+    parser.add_argument("-gamma", "--gamma", type=float, nargs='+', default=[1.0])
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=0, dest="portfolio_passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False)
+    args = parser.parse_args()
+
+    project = Instance.load(args.dir, args.instance)
+
+    print('THETA\tGAMMA\tWorst case makespan')
+    for theta in args.theta:
+        bounds = robust_upper_bounds(project, theta, args.gamma, args.portfolio_passes, args.improve_generations)
+        for gamma, (makespan, delta) in zip(args.gamma, bounds):
+            print('{theta}\t{gamma}\t{makespan:g}'.format(theta=theta, gamma=gamma, makespan=makespan))
+            if args.verbose:
+                print('Delayed activities: ' + ', '.join(
+                    '{act} ({delta:g})'.format(act=act, delta=d) for act, d in enumerate(delta) if d > 0))
@@ -0,0 +1,212 @@
+'''
+Monte Carlo robustness evaluation of a fixed schedule.
+
+A schedule is turned into a resource flow network: every unit of every resource
+is passed from an activity to one that starts after it finishes, and each transfer
+that is not already a precedence relationship becomes an extra arc. Under any
+duration realization, starting every activity as early as the precedence and flow
+arcs allow keeps the sequencing decisions of the schedule and is resource feasible.
+
+Sampled duration vectors are replayed with the batched critical path method, so
+all scenarios of a chunk are propagated with one vectorized pass per activity.
+Durations deviate as act_proc * (1 + THETA * delta) with delta uniform in [0, 1],
+for GAMMA randomly chosen activities per scenario when GAMMA is given.
+
+Usage: python monte_carlo.py j120 j1201_1 --scenarios 100000 --theta 0.5
+'''
+
+import argparse
+import importlib
+
+import numpy as np
+
+from rcpsp.heuristics.cpm import backward_pass, forward_pass, topological_order
+from rcpsp.heuristics.portfolio import run_portfolio
+from rcpsp.instance import Instance
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Scenarios replayed at once, bounds the memory of the time window matrices
+CHUNK = 10000
+
+SOLVERS = {
+    'discrete': 'rcpsp.formulations.perfect_knowledge.discrete.solver_dis',
+    'continuous': 'rcpsp.formulations.perfect_knowledge.continuous.solver_con'
+}
+
+
+def start_times(instance):
+    '''
+    Start times of a solved discrete or continuous instance, robust instances are read from their inner block.
+    '''
+    block = instance.inner if hasattr(instance, 'inner') else instance
+    if hasattr(block, 'start'):
+        return [round(block.start[act].value) for act in sorted(block.start)]
+
+    start = {}
+    for (act, t), var in block.x.items():
+        if var.value is not None and var.value > 0.5:
+            start[act] = t
+    return [start[act] for act in sorted(start)]
+
+
+def resource_flows(project, start, act_proc=None):
+    '''
+    Units of every resource passed between the activities of a feasible schedule as
+    {(i, j, k): units}, with k counted from 1 as in the models. The source hands out
+    the capacities and the sink collects them. Units are taken from direct
+    predecessors first and then from the latest finished activity.
+    '''
+    durations = (project.act_proc if act_proc is None else np.asarray(act_proc)).tolist()
+    size = project.act_count + 2
+    preds = [set(project.predecessors(act).tolist()) for act in range(size)]
+    r_cons = project.r_cons.tolist()
+    for k, cap in enumerate(project.r_cap.tolist()):
+        r_cons[project.source][k] = r_cons[project.sink][k] = cap
+
+    rank = [0] * size
+    for index, act in enumerate(project.topological_order()):
+        rank[act] = index
+
+    # Activities holding units of every resource as [finish, activity, units]
+    holders = [[] for _ in range(project.r_count)]
+    flows = {}
+
+    for j in sorted(range(size), key=lambda act: (start[act], rank[act])):
+        for k, units in enumerate(r_cons[j]):
+            if units == 0 or j == project.source:
+                continue
+
+            finished = [holder for holder in holders[k] if holder[0] <= start[j] and holder[2] > 0]
+            finished.sort(key=lambda holder: (holder[1] not in preds[j], -holder[0]))
+            for holder in finished:
+                taken = min(units, holder[2])
+                holder[2] -= taken
+                units -= taken
+                flows[holder[1], j, k + 1] = taken
+                if units == 0:
+                    break
+
+            if units > 0:
+                raise ValueError('Schedule is not resource feasible at activity {act}'.format(act=j))
+
+        for k, units in enumerate(r_cons[j]):
+            if units > 0 and j != project.sink:
+                holders[k].append([start[j] + durations[j], j, units])
+
+    return flows
+
+
+def resource_flow(project, start, act_proc=None):
+    '''
+    Extra arcs (i, j) of the resource flow network of a feasible schedule, the
+    transfers that are not already precedence relationships.
+    '''
+    arcs = set()
+    for i, j, _ in resource_flows(project, start, act_proc):
+        if i != project.source and j != project.sink and i not in project.predecessors(j):
+            arcs.add((i, j))
+
+    return sorted(arcs)
+
+
+def sample_durations(project, scenarios, theta, gamma=None, rng=None, act_proc=None):
+    '''
+    Matrix of sampled duration vectors, one scenario per row.
+    '''
+    rng = np.random.default_rng(rng)
+    nominal = project.act_proc if act_proc is None else np.asarray(act_proc)
+    # The dummy source and sink never deviate and take no part of the budget
+    real = rng.random((scenarios, project.act_count))
+
+    if gamma is not None:
+        # Only int(gamma) randomly chosen activities of every scenario deviate
+        ranks = rng.random(real.shape).argsort(axis=1).argsort(axis=1)
+        real = np.where(ranks < int(gamma), real, 0.0)
+
+    delta = np.zeros((scenarios, project.act_count + 2))
+    delta[:, 1:-1] = real
+    return nominal * (1 + theta * delta)
+
+
+def replay(act_pre, durations, order=None):
+    '''
+    Makespan and critical activities of every scenario on a precedence network.
+    '''
+    if order is None:
+        order = topological_order(act_pre)
+
+    est, eft = forward_pass(act_pre, durations, order)
+    makespan = eft.max(axis=1)
+    lst, lft = backward_pass(act_pre, durations, makespan, order)
+
+    return makespan, np.isclose(est, lst)
+
+
+def evaluate(project, start, scenarios=10000, theta=0.5, gamma=None, seed=None, act_proc=None,
+             quantiles=QUANTILES):
+    '''
+    Makespan distribution and criticality indices of a schedule over sampled scenarios.
+    '''
+    arcs = resource_flow(project, start, act_proc)
+
+    act_pre = [project.predecessors(act).tolist() for act in range(project.act_count + 2)]
+    for i, j in arcs:
+        act_pre[j].append(i)
+    order = topological_order(act_pre)
+
+    rng = np.random.default_rng(seed)
+    makespans = []
+    critical = np.zeros(project.act_count + 2)
+    for chunk in range(0, scenarios, CHUNK):
+        durations = sample_durations(project, min(CHUNK, scenarios - chunk), theta, gamma, rng, act_proc)
+        makespan, on_path = replay(act_pre, durations, order)
+        makespans.append(makespan)
+        critical += on_path.sum(axis=0)
+
+    makespans = np.concatenate(makespans)
+    nominal = project.act_proc if act_proc is None else np.asarray(act_proc)
+    return {
+        'nominal': float(max(s + d for s, d in zip(start, nominal.tolist()))),
+        'flow_arcs': len(arcs),
+        'makespans': makespans,
+        'mean': float(makespans.mean()),
+        'std': float(makespans.std()),
+        'quantiles': {q: float(np.quantile(makespans, q)) for q in quantiles},
+        'criticality': critical / scenarios
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-f", "--formulation", choices=sorted(SOLVERS), default=None,
+                        help="evaluate the optimal schedule of a formulation instead of the heuristic one")
+    parser.add_argument("--passes", type=int, default=0, help="sampling passes of the priority rule portfolio")
+    parser.add_argument("-n", "--scenarios", type=int, default=10000)
+    parser.add_argument("-theta", "--theta", type=float, default=0.5)
+    parser.add_argument("-gamma", "--gamma", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--top", type=int, default=10, help="number of most critical activities to print")
+    args = parser.parse_args()
+
+    project = Instance.load(args.dir, args.instance)
+    if args.formulation is None:
+        _, start, _ = run_portfolio(project, passes=args.passes, seed=args.seed)
+    else:
+        start, _ = importlib.import_module(SOLVERS[args.formulation]).solve(args.dir, args.instance)
+        if start is None:
+            parser.error('the solver found no schedule')
+
+    result = evaluate(project, start, args.scenarios, args.theta, args.gamma, args.seed)
+
+    print('Nominal makespan: {nominal}, {arcs} resource flow arcs'.format(nominal=result['nominal'], arcs=result['flow_arcs']))
+    print('Mean {mean:.2f}, std {std:.2f} over {scenarios} scenarios'.format(
+        mean=result['mean'], std=result['std'], scenarios=args.scenarios))
+    for q, value in result['quantiles'].items():
+        print('q{q:g}: {value:.2f}'.format(q=q * 100, value=value))
+
+    print('Most critical activities:')
+    for act in np.argsort(-result['criticality'])[:args.top].tolist():
+        print('{act}\t{index:.3f}'.format(act=act, index=result['criticality'][act]))
@@ -0,0 +1,398 @@
+'''
+Depth-first branch and bound for the deterministic RCPSP without a MIP solver.
+
+Every node is a partial schedule. A child takes one eligible activity, all its
+predecessors scheduled, and starts it at its earliest precedence and resource
+feasible time that is not before the last start of the partial schedule. These
+precedence tree children (Patterson et al., 1989) enumerate every active
+schedule in the order of its start times, an optimal one included.
+
+An eligible activity that can not start inside its time window any more closes
+the node. Windows come from energetic reasoning on the heuristic makespan
+(rcpsp.preprocessing.bounds) and shrink with every better schedule through the
+tail of each activity, its longest path to the end of the project. Children are
+also bounded by the remaining work of every resource, and the search stops when
+the makespan meets the lower bound.
+
+The cutset dominance rule of Demeulemeester and Herroelen (1992) is applied to
+partial schedules of the same set of activities. One that did not start later
+and of which no activity finishes after the last start of the other and after
+its own copy there allows every completion of the other, so the other node is
+pruned. Partial schedules are kept in memory up to MEMO_LIMIT.
+
+With several workers the tree is split into subtrees near the root, which are
+searched by a process pool that shares the best makespan found.
+
+Usage: python branch_and_bound.py j30 j301_1 -workers 4 -timelimit 60 --store
+'''
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+from pyomo.opt import TerminationCondition
+
+from rcpsp.formulations import solve_cache
+from rcpsp.formulations.result_store import record_result
+from rcpsp.formulations.results import bound_results, result_filename
+from rcpsp.heuristics.genetic import improve
+from rcpsp.heuristics.portfolio import run_portfolio
+from rcpsp.heuristics.resource_profile import ResourceProfile
+from rcpsp.instance import Instance
+from rcpsp.instance_cache import cached_closure
+from rcpsp.preprocessing.bounds import bound_windows
+
+# Nodes between two checks of the time limit and the shared upper bound
+CHECK_INTERVAL = 1000
+
+# Subtrees per worker process
+SPLIT_FACTOR = 8
+
+# Partial schedules kept for the cutset dominance rule, per process
+MEMO_LIMIT = 500000
+
+# Best makespan of all workers, set by the pool initializer
+shared_bound = None
+
+
+class Search:
+    '''
+    Partial schedule and search state of one process.
+    est and lst are valid for every schedule of at most upper_bound.
+    '''
+
+    def __init__(self, project, est, lst, upper_bound, lower_bound=0, deadline=None, shared=None):
+        size = project.act_count + 2
+        self.size = size
+        self.sink = project.sink
+        self.p = project.act_proc.tolist()
+        self.preds = [project.predecessors(act).tolist() for act in range(size)]
+        self.succs = [project.successors(act).tolist() for act in range(size)]
+        self.demand = [[(k, units) for k, units in enumerate(cons) if units > 0] for cons in project.r_cons.tolist()]
+        self.est = [int(t) for t in est]
+        self.lst = [int(t) for t in lst]
+        self.r_cap = project.r_cap.tolist()
+        self.work = (project.act_proc[:, None] * project.r_cons).tolist()
+
+        # Longest path from the start of every activity to the end of the project
+        self.tail = [0] * size
+        for act in reversed(project.topological_order()):
+            self.tail[act] = self.p[act] + max((self.tail[succ] for succ in self.succs[act]), default=0)
+
+        self.upper_bound = upper_bound
+        self.lower_bound = lower_bound
+        self.best = None
+        self.deadline = deadline
+        self.shared = shared
+        self.complete = True
+        self.nodes = 0
+        self.dominated = 0
+        self.memo = {}
+        self.memo_size = 0
+
+        self.profile = ResourceProfile(dict(enumerate(self.r_cap)), max(upper_bound, 1))
+        self.start = [None] * size
+        self.fin = [0] * size
+        self.pending = [len(self.preds[act]) for act in range(size)]
+        self.remaining = [sum(work[k] for work in self.work) for k in range(project.r_count)]
+        self.scheduled = 0
+        self.last = 0
+        self.path = []
+
+    def schedule(self, act, t):
+        '''
+        Start act at t. Returns the previous last start for unschedule.
+        '''
+        self.profile.reserve(t, self.p[act], self.demand[act])
+        self.start[act], self.fin[act] = t, t + self.p[act]
+        for succ in self.succs[act]:
+            self.pending[succ] -= 1
+        for k, work in enumerate(self.work[act]):
+            self.remaining[k] -= work
+        self.scheduled |= 1 << act
+        self.path.append((act, t))
+
+        last, self.last = self.last, t
+        return last
+
+    def unschedule(self, act, last):
+        t = self.start[act]
+        self.profile.release(t, self.p[act], self.demand[act])
+        self.start[act], self.fin[act] = None, 0
+        for succ in self.succs[act]:
+            self.pending[succ] += 1
+        for k, work in enumerate(self.work[act]):
+            self.remaining[k] += work
+        self.scheduled &= ~(1 << act)
+        self.path.pop()
+        self.last = last
+
+    def children(self):
+        '''
+        (start, activity) of every child that can still beat the upper bound, in the
+        order they are searched. Empty if an eligible activity can not start in time.
+        '''
+        candidates = []
+
+        # Nothing is searched once a schedule meets the lower bound
+        node_bound = max(self.last, self.lower_bound)
+        for act in range(self.size):
+            if self.start[act] is not None or self.pending[act]:
+                continue
+
+            release = max([self.last, self.est[act]] + [self.fin[pre] for pre in self.preds[act]])
+            latest = min(self.lst[act], self.upper_bound - 1 - self.tail[act])
+            t = self.profile.earliest_start(release, latest, self.p[act], self.demand[act])
+            if t is None:
+                return []
+
+            # Later partial schedules only start the activity later
+            node_bound = max(node_bound, t + self.tail[act])
+            candidates.append((t, self.lst[act], act))
+
+        if node_bound >= self.upper_bound:
+            return []
+
+        # Every unscheduled activity, the child one included, starts after the child
+        max_tail = max(self.tail[act] for act in range(self.size) if self.start[act] is None)
+        max_work = max((-(-work // cap) for work, cap in zip(self.remaining, self.r_cap)), default=0)
+
+        children = []
+        for t, _, act in sorted(candidates):
+            if max(node_bound, t + max_tail, t + max_work) >= self.upper_bound:
+                break
+            children.append((t, act))
+
+        return children
+
+    def is_dominated(self):
+        '''
+        Cutset dominance test of the current partial schedule, which is remembered if it is not dominated.
+        '''
+        finish = np.maximum(self.fin, self.last)
+        entries = self.memo.get(self.scheduled, [])
+        for last, other in entries:
+            if last <= self.last and (other <= finish).all():
+                self.dominated += 1
+                return True
+
+        if self.memo_size < MEMO_LIMIT:
+            kept = [(last, other) for last, other in entries if not (last >= self.last and (finish <= other).all())]
+            self.memo_size += len(kept) + 1 - len(entries)
+            kept.append((self.last, finish))
+            self.memo[self.scheduled] = kept
+
+        return False
+
+    def __check(self):
+        if self.shared is not None and self.shared.value < self.upper_bound:
+            self.upper_bound = self.shared.value
+        if self.deadline is not None and time.time() > self.deadline:
+            self.complete = False
+        return self.complete
+
+    def __improve(self):
+        makespan = self.start[self.sink]
+        if makespan < self.upper_bound:
+            self.upper_bound = makespan
+            self.best = list(self.start)
+            if self.shared is not None:
+                with self.shared.get_lock():
+                    self.shared.value = min(self.shared.value, makespan)
+
+    def branch(self):
+        '''
+        Search the subtree of the current partial schedule. Returns False when out of time.
+        '''
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0 and not self.__check():
+            return False
+
+        if self.start[self.sink] is not None:
+            self.__improve()
+            return True
+
+        for t, act in self.children():
+            # The upper bound may have improved in an earlier child
+            if t + self.tail[act] >= self.upper_bound:
+                break
+
+            last = self.schedule(act, t)
+            if not self.is_dominated() and not self.branch():
+                self.unschedule(act, last)
+                return False
+            self.unschedule(act, last)
+
+        return True
+
+
+def __init_worker(bound):
+    global shared_bound
+    shared_bound = bound
+
+
+def __subtree_task(task):
+    project, est, lst, upper_bound, lower_bound, path, deadline = task
+    search = Search(project, est, lst, min(upper_bound, shared_bound.value), lower_bound, deadline, shared_bound)
+    for act, t in path:
+        search.schedule(act, t)
+    search.branch()
+
+    # The shared bound may be below the best schedule of this worker, it only prunes
+    makespan = None if search.best is None else search.best[search.sink]
+    return makespan, search.best, search.complete, search.nodes, search.dominated
+
+
+def split(search, count):
+    '''
+    Paths of (activity, start) to at least count open subtrees, found breadth first.
+    Complete schedules met on the way update the search.
+    '''
+    frontier = [[]]
+    while 0 < len(frontier) < count:
+        expanded = []
+        for path in frontier:
+            lasts = [search.schedule(act, t) for act, t in path]
+
+            if search.start[search.sink] is not None:
+                if search.start[search.sink] < search.upper_bound:
+                    search.upper_bound, search.best = search.start[search.sink], list(search.start)
+            else:
+                for t, act in search.children():
+                    last = search.schedule(act, t)
+                    search.nodes += 1
+                    if not search.is_dominated():
+                        expanded.append(list(search.path))
+                    search.unschedule(act, last)
+
+            for (act, _), last in reversed(list(zip(path, lasts))):
+                search.unschedule(act, last)
+        frontier = expanded
+
+    return frontier
+
+
+def branch_and_bound(project, est, lst, upper_bound, schedule, lower_bound=0, timelimit=None, workers=1):
+    '''
+    Best (makespan, start) found, whether the search completed and the search statistics.
+    schedule is the heuristic schedule of makespan upper_bound, returned if nothing better is found.
+    '''
+    deadline = None if timelimit is None else time.time() + timelimit
+    search = Search(project, est, lst, upper_bound, lower_bound, deadline)
+
+    if workers > 1:
+        frontier = split(search, SPLIT_FACTOR * workers)
+        bound = multiprocessing.Value('i', search.upper_bound)
+        tasks = [(project, est, lst, search.upper_bound, lower_bound, path, deadline) for path in frontier]
+
+        with multiprocessing.Pool(workers, initializer=__init_worker, initargs=(bound,)) as pool:
+            for makespan, start, complete, nodes, dominated in pool.imap_unordered(__subtree_task, tasks):
+                if makespan is not None and makespan < search.upper_bound:
+                    search.upper_bound, search.best = makespan, start
+                search.complete &= complete
+                search.nodes += nodes
+                search.dominated += dominated
+    else:
+        search.branch()
+
+    makespan, start = upper_bound, list(schedule)
+    if search.best is not None:
+        makespan, start = search.best[search.sink], search.best
+
+    stats = {'Nodes': search.nodes, 'Dominated': search.dominated, 'Workers': workers}
+    return makespan, start, search.complete, stats
+
+
+def solve(instance_dir, instance_name, display=False, store=False, workers=1, timelimit=20 * 60, portfolio_passes=None,
+          improve_generations=None, cache=True):
+
+    print('\nSolving instance:' + instance_name)
+    started = time.time()
+
+    project = Instance.load(instance_dir, instance_name)
+
+    # A repeated search is answered from the cache, see rcpsp.formulations.solve_cache
+    parameters = {'portfolio_passes': portfolio_passes, 'improve_generations': improve_generations}
+    key = solve_cache.cache_key(project, 'branch_and_bound', parameters)
+    entry = solve_cache.lookup(key, timelimit) if cache else None
+    if entry is not None:
+        solve_cache.report_hit(entry)
+        return entry['start'], solve_cache.cached_results(entry)
+
+    closure = cached_closure(instance_dir, instance_name)
+
+    # Upper bound from the priority rule portfolio, the serial SGS with the LFT rule included
+    upper_bound, schedule, _ = run_portfolio(project, passes=portfolio_passes or 0, seed=0)
+
+    # Improve the upper bound with forward-backward improvement and the genetic algorithm
+    if improve_generations is not None:
+        makespan, start, _ = improve(project, generations=improve_generations, seed=0)
+        if makespan < upper_bound:
+            upper_bound, schedule = makespan, start
+
+    # Lower bounds and energetic reasoning on the time windows, see rcpsp.preprocessing.bounds
+    lower_bound, lower_bounds, (est, lst) = bound_windows(project, upper_bound, closure=closure)
+    print('Lower bounds: ' + ', '.join('{name}={value}'.format(name=name, value=value) for name, value in lower_bounds.items()))
+
+    # Workers of a process pool, e.g. of run_batch.py, can not start a pool of their own
+    if multiprocessing.current_process().daemon:
+        workers = 1
+
+    stats = {'Nodes': 0, 'Dominated': 0, 'Workers': workers}
+    if lower_bound < upper_bound:
+        print('Preprocessing phase complete. Searching from {makespan}...'.format(makespan=upper_bound))
+        remaining = timelimit - (time.time() - started)
+        upper_bound, schedule, complete, stats = branch_and_bound(
+            project, est, lst, upper_bound, schedule, lower_bound, remaining, workers)
+        if complete:
+            lower_bound = upper_bound
+    else:
+        print('Closed by bounding at {makespan}'.format(makespan=upper_bound))
+
+    termination = TerminationCondition.optimal if lower_bound == upper_bound else TerminationCondition.maxTimeLimit
+    results = bound_results(None, lower_bound, upper_bound, time.time() - started, termination)
+    print('{nodes} nodes, {dominated} dominated partial schedules'.format(nodes=stats['Nodes'], dominated=stats['Dominated']))
+
+    if store:
+        filename = result_filename('branch_and_bound', instance_dir, instance_name)
+        results.write(filename=filename, format='json')
+        with open(filename, 'r') as jsonFile:
+            data = json.load(jsonFile)
+
+        data['Branch and bound'] = stats
+        data['Schedule'] = schedule
+
+        with open(filename, 'w') as jsonFile:
+            json.dump(data, jsonFile, indent=4)
+
+        record_result(filename, 'branch_and_bound', instance_dir, instance_name, start=schedule)
+        solve_cache.store(key, filename, 'branch_and_bound', instance_dir, instance_name, parameters, timelimit, schedule)
+
+    if display:
+        for act, start in enumerate(schedule):
+            print('{act}\t{start}'.format(act=act, start=start))
+
+    return schedule, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-d", "--display", action="store_true", default=False)
+    parser.add_argument("-s", "--store", action="store_true", default=False)
+    parser.add_argument("-workers", "--workers", type=int, default=1,
+                        help="processes that search subtrees in parallel")
+    parser.add_argument("-timelimit", "--timelimit", type=float, default=20 * 60)
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                        help="tighten the upper bound with the priority rule portfolio and this many sampling passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations",
+                        help="tighten the upper bound with this many generations of the genetic algorithm")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="search even if the solve cache holds the result, the new result replaces it")
+    args = parser.parse_args()
+
+    solve(args.dir, args.instance, args.display, args.store, args.workers, args.timelimit, args.portfolio_passes,
+          args.improve_generations, args.cache)
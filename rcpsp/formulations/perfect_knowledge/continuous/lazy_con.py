@@ -0,0 +1,70 @@
+'''
+Separation of the resource and overlap rows of rcpsp_con.py.
+
+In lazy mode the instance is built with empty overlap_rows, tighten_rows and
+resource_rows, so only the precedence and sequencing rows are present and z is
+free. For a solution of this relaxation the activities running when activity i
+starts are the partners j in P ordered before i by x that finish after start[i].
+Resource usage only increases at start times, so the schedule is resource
+feasible if the usage at every start time fits the capacities. z then follows
+from the start and finish times and all rows of the full model hold.
+
+A violated resource row of activity i is added with the rows that keep its terms
+from going negative, x[i, j] <= z[j, i] for every partner j, and with the overlap
+rows that force z[j, i] = 1 for the partners running at start[i]. Together they
+cut off the solution.
+'''
+
+import rcpsp.formulations.perfect_knowledge.continuous.rcpsp_con as rcpsp
+
+
+def partner_lists(project, P):
+    '''
+    Activities that can overlap with every activity.
+    '''
+    partners = [[] for _ in range(project.act_count + 2)]
+    for i, j in P:
+        partners[i].append(j)
+    return partners
+
+
+def violated_rows(instance, project, partners, tolerance=1e-6):
+    '''
+    Resource rows exceeded when their activity starts, as {(activity, resource): running partners}.
+    '''
+    r_cons = project.r_cons.tolist()
+    r_cap = project.r_cap.tolist()
+    start = {act: instance.start[act].value for act in instance.act_set}
+    fin = {act: instance.fin[act].value for act in instance.act_set}
+
+    rows = {}
+    for i in range(1, project.sink):
+        running = [j for j in partners[i] if instance.x[j, i].value > 0.5 and fin[j] > start[i] + tolerance]
+        for k in range(project.r_count):
+            if r_cons[i][k] + sum(r_cons[j][k] for j in running) > r_cap[k]:
+                rows[i, k + 1] = running
+
+    return rows
+
+
+def add_rows(instance, rows, partners):
+    '''
+    Add violated resource rows and the overlap and tightening rows they need.
+    Returns the new constraints, e.g. to push them to a persistent solver.
+    '''
+    added = []
+
+    def add(index_set, constraint, rule, index):
+        if index not in index_set:
+            index_set.add(index)
+            constraint.add(index, rule(instance, *index))
+            added.append(constraint[index])
+
+    for (i, k), running in rows.items():
+        for j in partners[i]:
+            add(instance.tighten_rows, instance.tighten_decision_variables_constraint, rcpsp.tighten_decision_variables, (i, j))
+        for j in running:
+            add(instance.overlap_rows, instance.overlapping_variables_constraint, rcpsp.overlapping_variables, (j, i))
+        add(instance.resource_rows, instance.resource_constraint, rcpsp.resource_capacity_constraint, (i, k))
+
+    return added
@@ -1,5 +1,3 @@
-from pyomo.environ import *
-
 '''
 Mixed-Integer programming formulation for the RCPSP.
 Continuous time horizon. Deterministic activity durations.
@@ -8,6 +6,9 @@ Based on the formulation of Georgios M. Kopanos, Thomas S. Kyriakidis, Michael C
 New continuous-time and discrete-time mathematical formulations for resource-constrained project scheduling problems
 Computers and Chemical Engineering 68 (2014) 96–106
 '''
+
+from pyomo.environ import *
+
 model = AbstractModel(name="RCPSP_CONTINUOUS")
 
 # Activity set
@@ -46,6 +47,12 @@ model.K = Set(dimen=2)
 model.S = Set(dimen=2)
 model.P = Set(dimen=2)
 
+# Indices of the overlap, tightening and resource rows that are built.
+# All of them by default, the lazy mode of solver_con.py starts from empty sets
+model.overlap_rows = Set(dimen=2, initialize=lambda m: list(m.P))
+model.tighten_rows = Set(dimen=2, initialize=lambda m: list(m.P))
+model.resource_rows = Set(dimen=2, initialize=lambda m: [(i, k) for i in m.act_set for k in m.r_set])
+
 # Decision variables.
 # Activity start and finishing times.
 model.start = Var(model.act_set, within=NonNegativeReals)
@@ -130,13 +137,13 @@ model.activity_overlapping_precedence_constraint_2 = Constraint(
 
 # For activities without hard precedence constraints, avoid execution cycles.
 def no_execution_cycles(m, i, j):
-    if i > j and (i, j) not in m.K:
+    if i > j:
         return m.x[i, j] + m.x[j, i] == 1
 
     return Constraint.Skip
 
 model.no_execution_cycles_constraint = Constraint(
-    model.act_set, model.act_set, rule=no_execution_cycles)
+    model.x_set, rule=no_execution_cycles)
 
 '''
 Define overlapping decision variables.
@@ -147,7 +154,7 @@ def overlapping_variables(m, i, j):
     return m.fin[i] <= m.start[j] + (m.lft[i] - m.est[j]) * m.z[i, j]
 
 model.overlapping_variables_constraint = Constraint(
-    model.P, rule=overlapping_variables)
+    model.overlap_rows, rule=overlapping_variables)
 
 
 # Resource capacity constraint for resource r
@@ -155,7 +162,7 @@ def resource_capacity_constraint(m, i, k):
     return m.r_cons[i, k] + sum(m.r_cons[j, k] * (m.z[j, a] - m.x[a, j]) for a, j in m.P if i == a) <= m.r_cap[k]
 
 model.resource_constraint = Constraint(
-    model.act_set, model.r_set, rule=resource_capacity_constraint)
+    model.resource_rows, rule=resource_capacity_constraint)
 
 '''
 For activities that can be executed in parallel,
@@ -165,11 +172,16 @@ def tighten_decision_variables(m, i, j):
     return m.x[i, j] <= m.z[j, i]
 
 model.tighten_decision_variables_constraint = Constraint(
-    model.P, rule=tighten_decision_variables)
+    model.tighten_rows, rule=tighten_decision_variables)
 
 
+'''
+Fix the order of activities that can overlap when their time windows decide it.
+Ties lst[i] == est[j] are left free, both may start at the same time and the
+strict start order of activity_overlapping_precedence_constraint_2 then needs x[j, i] = 1 if i > j.
+'''
 def preprocessing_phase_relaxation(m, i, j):
-    if i != j and m.lst[i] <= m.est[j]:
+    if i != j and m.lst[i] < m.est[j]:
         return m.x[i, j] == 1
 
     return Constraint.Skip
@@ -1,140 +1,248 @@
 import argparse
+import json
 import math
 import random
-from datetime import datetime
+import time
 
-import pyomo.dataportal as dp
 import pyomo.environ as pyo
 from pyomo.core.base.component import CloneError
+from pyomo.opt import SolverStatus, TerminationCondition
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+from rcpsp.formulations import solve_cache
+from rcpsp.formulations.perfect_knowledge.continuous.lazy_con import add_rows, partner_lists, violated_rows
+from rcpsp.formulations.result_store import record_result, solution_start
+from rcpsp.formulations.results import result_filename
+from rcpsp.formulations.solvers import INTERFACES, get_solver, run_solver
+from rcpsp.formulations.warm_start import continuous_start
+from rcpsp.instance import Instance
+from rcpsp.instance_cache import cached_closure, cached_windows
+from rcpsp.preprocessing.continuous_sets import continuous_sets
+from rcpsp.profiling import Profiler, profile_filename
 from rcpsp.heuristics.backward_recursion import BackwardRecursion
 from rcpsp.heuristics.forward_recursion import get_earliest_times
-from rcpsp.heuristics.sgs import serial_schedule_generation
-
-import rcpsp_con as rcpsp
-
-parser = argparse.ArgumentParser()
-parser.add_argument("dir") 
-parser.add_argument("instance")  
-parser.add_argument("-p", "--perturb", action="store_true", default=False) 
-parser.add_argument("-d", "--display", action="store_true", default=False) 
-parser.add_argument("-s", "--store", action="store_true", default=False) 
-args = parser.parse_args()
-
-instance_dir = 'data/instances/json/{instance_dir}/'.format(instance_dir=args.dir)
-instance_name = args.instance
-
-print('\nSolving instance:' + instance_name)
-
-data = dp.DataPortal()
-data.load(filename=instance_dir + instance_name + '.json')
-
-act_count = data['act_count']
-act_pre = data['act_pre']    
-r_count = data['r_count']
-r_cons = data['r_cons']
-r_cap = data['r_cap']
-
-# Perturb instance. Worst case scenario is nominal * 1.5
-act_proc = {}
-if args.perturb:
-    for act in data['act_proc']:
-        act_proc[act] = math.floor(data['act_proc'][act] * (1 + random.randint(0, 50) / 100))
-    data['act_proc'] = act_proc
-else:
-    act_proc = data['act_proc']
-
-# Initialize dummy source and sink activities
-source = 0
-sink = act_count + 1
-
-act_proc[source] = 0
-act_proc[sink] = 0
-
-for r in range(1, r_count + 1):
-    r_cons[source, r] = 0
-    r_cons[sink, r] = 0
-
-# Calculate earliest start and finish times
-est, eft = get_earliest_times(sink, act_pre, act_proc)
-data['est'] = est
-data['eft'] = eft
-
-# Calculate initial latest start and finish times. Upper bound is the sum of processing times
-br_init = BackwardRecursion(sink, sum(act_proc.values()), act_pre, act_proc)
-lst_init, lft_init = br_init.get_latest_times()
-
-# Tighten upper bound with SGS
-upper_bound = serial_schedule_generation(
-    act_count, act_proc, act_pre, r_count, r_cons, r_cap, lft_init)
-
-# Calculate latest start and finish times using the new upper bound
-br = BackwardRecursion(sink, upper_bound, act_pre, act_proc)
-lst, lft = br.get_latest_times()
-
-data['lst'] = lst
-data['lft'] = lft
-data['upper_bound'] = {None: upper_bound}
-
-# Get transitive closure of graph
-C = set()
-def get_transitive_closure(root, act):
-    for pre in act_pre[act]:
-        if (pre, root) not in C:
-            C.update([(pre, root)])
-            C.update([(root, pre)])
-            get_transitive_closure(root, pre)
-
-for act in range(sink + 1):
-    get_transitive_closure(act, act)
-
-# Custom sets
-B = set()
-D = set()
-G = set()
-for i in range(1, sink):
-    for j in range(1, sink):
-        if i!=j and (r_cons[i, k] > 0 and r_cons[j, k] > 0 for k in range(1, r_count + 1)):
-            B.update([(i, j)])
-
-for i, j in B:
-    for k in range(1, r_count + 1):
-        if r_cons[i, k] + r_cons[j, k] > r_cap[k]:
-            G.update([(i, j)])
-            break
-
-for i, j in C:
-    if (i, j) not in C and lft[i] <= est[j]:
-        D.update([(i, j)])
-
-# Activities sharing at least one resource
-data['B'] = B
-# Precedence transitive closure. All hard precedence relationships
-data['C'] = C
-# Activities that cannot be executed in parallel due to resource cap violations.
-data['G'] = G
-K = C.union(D)
-data['K'] = K
-# Activities that cannot overlap due to resource capacity limitations, 
-# excluding those with known precedence relations
-data['S'] = G.difference(K)
-# Activities that can overlap
-data['P'] = B.difference(G.union(K))
-
-print('Preprocessing phase complete. Sending to solver...')
-instance = rcpsp.model.create_instance(data)
-
-# Solve instance and print results
-opt = pyo.SolverFactory('cplex')
-opt.options['threads'] = 2
-opt.options['timelimit'] = 20 * 60
-
-results = opt.solve(instance, load_solutions=True)
-
-if args.store:
-    results.write(filename='data/results/perfect_knowledge/continuous/{instance_dir}/{instance_name}_results_{timestamp}.json'
-              .format(instance_dir=args.dir, instance_name=instance_name, timestamp=datetime.now().strftime("%d_%m_%Y_%H_%M_%S")), format='json')
-
-if args.display:
-    instance.fin.display()
-
-print(round(instance.OBJ()))
\ No newline at end of file
+from rcpsp.heuristics.upper_bound import heuristic_upper_bound
+
+import rcpsp.formulations.perfect_knowledge.continuous.rcpsp_con as rcpsp
+
+
+def solve(instance_dir, instance_name, perturb=False, display=False, store=False, threads=2, timelimit=20 * 60, portfolio_passes=None, improve_generations=None,
+          interface='shell', lazy=False, reduce=False, profiler=None, cache=True, islands=1, improve_timelimit=None):
+
+    print('\nSolving instance:' + instance_name)
+    started = time.time()
+    profiler = profiler or Profiler(enabled=False)
+
+    with profiler.phase('load'):
+        project = Instance.load(instance_dir, instance_name)
+        data = project.to_data()
+
+    act_count = project.act_count
+    act_pre = data['act_pre']
+    r_count = project.r_count
+
+    # Perturb instance. Worst case scenario is nominal * 1.5
+    act_proc = {}
+    if perturb:
+        for act in data['act_proc']:
+            act_proc[act] = math.floor(data['act_proc'][act] * (1 + random.randint(0, 50) / 100))
+        data['act_proc'] = act_proc
+    else:
+        act_proc = data['act_proc']
+
+    # A repeated solve is answered from the cache without a model. Both paths return the
+    # start times and the results, see rcpsp.formulations.solve_cache.
+    # Perturbed durations are random and never cached
+    parameters = {'lazy': lazy, 'reduce': reduce, 'portfolio_passes': portfolio_passes,
+                  'improve_generations': improve_generations,
+                  'islands': islands, 'improve_timelimit': improve_timelimit}
+    key = None if perturb else solve_cache.cache_key(project, 'continuous', parameters)
+    entry = solve_cache.lookup(key, timelimit) if cache and key is not None else None
+    if entry is not None:
+        solve_cache.report_hit(entry)
+        return entry['start'], solve_cache.cached_results(entry)
+
+    # Dummy sink activity
+    sink = project.sink
+
+    # Windows, upper bound and schedule of the nominal heuristics from the instance cache, see
+    # rcpsp.instance_cache. The cache holds the genetic algorithm on one island without a time limit,
+    # perturbed durations are never cached
+    cached = None
+    if not perturb and islands == 1 and improve_timelimit is None:
+        cached = cached_windows(instance_dir, instance_name, portfolio_passes, improve_generations)
+    if cached is not None:
+        est, eft, lst, lft, upper_bound, schedule = cached
+        data['est'] = est
+        data['eft'] = eft
+    else:
+        # Calculate earliest start and finish times
+        with profiler.phase('cpm'):
+            est, eft = get_earliest_times(sink, act_pre, act_proc)
+            data['est'] = est
+            data['eft'] = eft
+
+        # Upper bound and schedule of the heuristics, see rcpsp.heuristics.upper_bound
+        with profiler.phase('heuristics'):
+            upper_bound, schedule = heuristic_upper_bound(
+                project, portfolio_passes, improve_generations, islands, improve_timelimit,
+                [act_proc[act] for act in range(sink + 1)], profiler)
+
+        # Calculate latest start and finish times using the new upper bound
+        with profiler.phase('cpm'):
+            br = BackwardRecursion(sink, upper_bound, act_pre, act_proc)
+            lst, lft = br.get_latest_times()
+
+    data['lst'] = lst
+    data['lft'] = lft
+    data['upper_bound'] = {None: upper_bound}
+
+    # Transitive closure and modelling sets, see rcpsp.preprocessing.continuous_sets
+    with profiler.phase('closure'):
+        closure = cached_closure(instance_dir, instance_name)
+    with profiler.phase('sets'):
+        sets = continuous_sets(project, est, lft, closure, window_precedence=reduce, shared_resources=reduce)
+    for name in ('B', 'C', 'G', 'K', 'S', 'P'):
+        data[name] = sets[name]
+
+    # Pairs without a common resource or ordered by their time windows need no sequencing variables
+    if reduce:
+        full = continuous_sets(project, est, lft, closure)
+        print('Sequencing variables: {x} of {x_full}, overlap variables: {z} of {z_full}'.format(
+            x=len(sets['S']) + len(sets['P']), x_full=len(full['S']) + len(full['P']),
+            z=len(sets['P']), z_full=len(full['P'])))
+
+    # Resource and overlap rows are separated after every solve, see lazy_con.py
+    if lazy:
+        for name in ('overlap_rows', 'tighten_rows', 'resource_rows'):
+            data[name] = []
+
+    print('Preprocessing phase complete. Sending to solver...')
+    with profiler.phase('build'):
+        instance = rcpsp.model.create_instance({None: data})
+
+        # Heuristic schedule as the MIP start
+        continuous_start(instance, schedule, act_proc)
+    profiler.model_size(instance)
+
+    # Solve instance and print results
+    opt = get_solver(interface, threads=threads, timelimit=timelimit)
+
+    with profiler.phase('solve'):
+        results = run_solver(opt, instance, warmstart=True, profiler=profiler)
+
+    lazy_rows = None
+    if lazy:
+        partners = partner_lists(project, sets['P'])
+        iterations = 1
+        with profiler.phase('separate'):
+            rows = violated_rows(instance, project, partners)
+        while rows and time.time() - started < timelimit:
+            with profiler.phase('separate'):
+                added = add_rows(instance, rows, partners)
+                if isinstance(opt, PersistentSolver):
+                    for con in added:
+                        opt.add_constraint(con)
+
+            # The heuristic schedule satisfies the new rows, the last solution does not
+            continuous_start(instance, schedule, act_proc)
+            opt = get_solver(interface, threads=threads, timelimit=timelimit - (time.time() - started))
+            with profiler.phase('solve'):
+                results = run_solver(opt, instance, warmstart=True, profiler=profiler)
+            with profiler.phase('separate'):
+                rows = violated_rows(instance, project, partners)
+            iterations += 1
+        profiler.model_size(instance, 'final model')
+
+        lazy_rows = {
+            'Iterations': iterations,
+            'Resource rows': len(instance.resource_rows),
+            'Overlap rows': len(instance.overlap_rows),
+            'Tighten rows': len(instance.tighten_rows),
+            'Resource rows total': (act_count + 2) * r_count,
+            'Overlap rows total': len(sets['P'])
+        }
+        print('Lazy rows: {Resource rows} of {Resource rows total} resource rows, {Overlap rows} and {Tighten rows} of '
+              '{Overlap rows total} overlap and tightening rows after {Iterations} iterations'.format(**lazy_rows))
+
+        if rows:
+            # Out of time with a schedule that is not resource feasible, fall back to the heuristic one.
+            # The last relaxation still bounds the makespan from below
+            print('Time limit reached with {count} violated resource rows'.format(count=len(rows)))
+            lower_bound = results.problem.lower_bound
+            if results.solver.termination_condition == TerminationCondition.optimal:
+                lower_bound = pyo.value(instance.OBJ)
+            continuous_start(instance, schedule, act_proc)
+            results.problem.lower_bound = lower_bound
+            results.problem.upper_bound = upper_bound
+            results.solver.status = SolverStatus.aborted
+            results.solver.termination_condition = TerminationCondition.maxTimeLimit
+
+    start = solution_start(instance)
+    filename = None
+    if store:
+        with profiler.phase('store'):
+            filename = result_filename('continuous', instance_dir, instance_name)
+            results.write(filename=filename, format='json')
+
+            if lazy_rows is not None:
+                with open(filename, 'r') as jsonFile:
+                    data = json.load(jsonFile)
+
+                # Time of all solves and the separated rows
+                data['Solver'][0]['User time'] = time.time() - started
+                data['Lazy rows'] = lazy_rows
+
+                with open(filename, 'w') as jsonFile:
+                    json.dump(data, jsonFile, indent=4)
+
+            record_result(filename, 'continuous', instance_dir, instance_name, start=start)
+            if key is not None:
+                solve_cache.store(key, filename, 'continuous', instance_dir, instance_name, parameters, timelimit, start)
+
+    if profiler.enabled:
+        if filename is not None:
+            profiler.write(profile_filename(filename))
+        print(profiler.summary())
+
+    if display:
+        instance.fin.display()
+
+    print(round(instance.OBJ()))
+
+    return start, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-p", "--perturb", action="store_true", default=False)
+    parser.add_argument("-d", "--display", action="store_true", default=False)
+    parser.add_argument("-s", "--store", action="store_true", default=False)
+    parser.add_argument("-threads", "--threads", type=int, default=2)
+    parser.add_argument("-timelimit", "--timelimit", type=float, default=20 * 60)
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                        help="tighten the upper bound with the priority rule portfolio and this many sampling passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations",
+                        help="tighten the upper bound with this many generations of the genetic algorithm")
+    parser.add_argument("-islands", "--islands", type=int, default=1,
+                        help="run the genetic algorithm on this many islands, one process each")
+    parser.add_argument("-improve_timelimit", "--improve_timelimit", type=float, default=None,
+                        help="stop the genetic algorithm after this many seconds")
+    parser.add_argument("-interface", "--interface", choices=sorted(INTERFACES), default='shell',
+                        help="CPLEX interface, direct and persistent solve in-process")
+    parser.add_argument("-lazy", "--lazy", action="store_true", default=False,
+                        help="build resource and overlap rows only when the solution violates them")
+    parser.add_argument("-reduce", "--reduce", action="store_true", default=False,
+                        help="sequence only pairs that share a resource and are not ordered by their time windows")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="solve even if the solve cache holds the result, the new result replaces it")
+    parser.add_argument("-profile", "--profile", action="store_true", default=False,
+                        help="time every phase, count the model size and store the profile next to the result")
+    parser.add_argument("-cprofile", "--cprofile", nargs='+', default=[], metavar="PHASE",
+                        help="also run these phases, e.g. sets or build, under cProfile")
+    args = parser.parse_args()
+
+    solve(args.dir, args.instance, args.perturb, args.display, args.store, args.threads, args.timelimit, args.portfolio_passes, args.improve_generations,
+          args.interface, args.lazy, args.reduce, Profiler(args.profile or bool(args.cprofile), args.cprofile),
+          args.cache, args.islands, args.improve_timelimit)
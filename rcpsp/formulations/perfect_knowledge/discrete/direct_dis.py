@@ -0,0 +1,156 @@
+'''
+Direct construction of the discrete time formulation of rcpsp_dis.py.
+
+The abstract model evaluates its rules over the full resource x period and
+activity x activity grids and skips most of them. Here only the real index sets
+are created: the precedence edges and, for every resource and period, the
+activities that can be active in that period according to their time windows.
+The constraint bodies are collected in one pass over the x variables and emitted
+as LinearExpression objects, so no rule builds a sum term by term.
+
+The instance has the same components and indices as the abstract model, with the
+rows that the abstract model skips left out.
+
+With reduce_rows, resource rows that can never be violated are dropped: at most one
+start of every activity is counted in a row, so a row whose activities fit the
+capacity together is redundant. Of two consecutive periods of a resource whose rows
+hold the same terms, or where one row holds a subset of the terms of the other,
+only the larger row is kept. This is the case whenever no time window starts or
+ends between the two periods.
+
+With step, z[j, t] = 1 if activity j has started by period t (Pritsker, Watters and
+Wolfe, 1969; see also Artigues, 2017, On the strength of time-indexed formulations
+for the resource-constrained project scheduling problem). Activity j is running in
+period q if z[j, q] - z[j, q - p_j] = 1, so every resource row has at most two terms
+per activity instead of p_j. x remains as a continuous variable linked to z and is
+used by the precedence constraints and the objective as before.
+'''
+
+from collections import defaultdict
+
+from pyomo.environ import *
+from pyomo.core.expr.numeric_expr import LinearExpression
+
+
+def __reduce_resource_rows(resource_terms, resource_acts, r_cons, r_cap, subsets=True):
+    '''
+    Keys of the resource rows that can be violated, without the rows dominated by the
+    row of the previous or the next period. Dominance by a subset of the terms is only
+    checked with subsets, i.e. when all coefficients are positive.
+    '''
+    kept = []
+    previous = None
+    for k, q in sorted(resource_terms):
+        if sum(r_cons[act][k - 1] for act in resource_acts[k, q]) <= r_cap[k - 1]:
+            continue
+
+        coefs, variables = resource_terms[k, q]
+        terms = frozenset(zip(coefs, map(id, variables)))
+        if previous is not None and previous[0] == k:
+            if terms == previous[1] or (subsets and terms <= previous[1]):
+                continue
+            if subsets and previous[1] <= terms:
+                kept.pop()
+
+        kept.append((k, q))
+        previous = k, terms
+
+    return kept
+
+
+def build_model(project, est, lst, upper_bound, act_proc=None, reduce_rows=False, step=False):
+    '''
+    est and lst are indexed by activity. Durations default to the nominal ones.
+    '''
+    sink = project.sink
+    act_proc = project.act_proc.tolist() if act_proc is None else [act_proc[act] for act in range(sink + 1)]
+    r_cons = project.r_cons.tolist()
+    r_cap = project.r_cap.tolist()
+
+    model = ConcreteModel(name="RCPSP_DISCRETE")
+    model.act_set = RangeSet(0, sink)
+    model.r_set = RangeSet(project.r_count)
+    model.period_set = RangeSet(0, upper_bound)
+
+    # Decision variables. If activity j starts at period t
+    model.x_set_init = Set(dimen=2, ordered=True, initialize=[
+        (act, t) for act in range(sink + 1) for t in range(est[act], lst[act] + 1)])
+    if step:
+        model.x = Var(model.x_set_init, bounds=(0, 1), initialize=0)
+        # If activity j has started by period t
+        model.z = Var(model.x_set_init, within=Binary, initialize=0)
+    else:
+        model.x = Var(model.x_set_init, within=Binary, initialize=False)
+
+    # Start time of every activity as coefficients over its x variables
+    start_terms = {act: ([], []) for act in range(sink + 1)}
+
+    # Resource usage in every period an activity started at t would occupy
+    resource_terms = defaultdict(lambda: ([], []))
+    resource_acts = defaultdict(set)
+    demand = [[(k + 1, units) for k, units in enumerate(cons) if units > 0] for cons in r_cons]
+
+    def add_term(k, q, units, var, act):
+        coefs, variables = resource_terms[k, q]
+        coefs.append(units)
+        variables.append(var)
+        resource_acts[k, q].add(act)
+
+    for (act, t), var in model.x.items():
+        start_terms[act][0].append(t)
+        start_terms[act][1].append(var)
+
+        if not step:
+            for q in range(t, min(t + act_proc[act], upper_bound + 1)):
+                for k, units in demand[act]:
+                    add_term(k, q, units, var, act)
+
+    if step:
+        # Running in period q: started by q and not started by q - p
+        for act in range(sink + 1):
+            for q in range(est[act], min(lst[act] + act_proc[act] - 1, upper_bound) + 1):
+                for k, units in demand[act]:
+                    add_term(k, q, units, model.z[act, min(q, lst[act])], act)
+                    if q - act_proc[act] >= est[act]:
+                        add_term(k, q, -units, model.z[act, q - act_proc[act]], act)
+
+    # Resource capacity constraint for resource r at time t
+    if reduce_rows:
+        resource_rows = __reduce_resource_rows(resource_terms, resource_acts, r_cons, r_cap, subsets=not step)
+    else:
+        resource_rows = sorted(resource_terms)
+    model.resource_set = Set(dimen=2, ordered=True, initialize=resource_rows)
+    model.resource_constraint = Constraint(model.resource_set, rule=lambda m, r, t: (
+        None,
+        LinearExpression(constant=0, linear_coefs=resource_terms[r, t][0], linear_vars=resource_terms[r, t][1]),
+        r_cap[r - 1]))
+
+    # Precedence constraint for every edge (n, pre_n): start[n] - start[pre_n] >= act_proc[pre_n]
+    def activity_precedence_constraint(m, n, pre_n):
+        coefs = start_terms[n][0] + [-t for t in start_terms[pre_n][0]]
+        variables = start_terms[n][1] + start_terms[pre_n][1]
+        return act_proc[pre_n], LinearExpression(constant=0, linear_coefs=coefs, linear_vars=variables), None
+
+    model.precedence_set = Set(dimen=2, ordered=True, initialize=sorted(
+        zip(*reversed([arcs.tolist() for arcs in project.edges()]))))
+    model.precedence_constraint = Constraint(model.precedence_set, rule=activity_precedence_constraint)
+
+    if step:
+        # Every activity has started by its lst and a started activity stays started
+        model.no_preemption_constraint = Constraint(model.act_set, rule=lambda m, n: m.z[n, lst[n]] == 1)
+        model.step_constraint = Constraint(model.x_set_init, rule=lambda m, n, t: (
+            Constraint.Skip if t == est[n] else m.z[n, t - 1] <= m.z[n, t]))
+
+        # x[n, t] = 1 if activity n starts at t
+        model.step_start_constraint = Constraint(model.x_set_init, rule=lambda m, n, t: (
+            m.x[n, t] == m.z[n, t] - (m.z[n, t - 1] if t > est[n] else 0)))
+    else:
+        # Non preemption constraint for activity n
+        model.no_preemption_constraint = Constraint(model.act_set, rule=lambda m, n: (
+            1, LinearExpression(constant=0, linear_coefs=[1] * len(start_terms[n][1]), linear_vars=start_terms[n][1]), 1))
+
+    # Objective - Minimize finish time of the last activity
+    model.OBJ = Objective(expr=LinearExpression(
+        constant=0, linear_coefs=start_terms[sink][0], linear_vars=start_terms[sink][1]))
+
+    return model
@@ -1,5 +1,3 @@
-from pyomo.environ import *
-
 '''
 Binary Integer Programming formulation for the RCPSP.
 Time horizon is divided into discrete intervals. Deterministic activity durations
@@ -8,6 +6,9 @@ Based on the formulation of Aristide Mingozzi, Vittorio Maniezzo, Salvatore Ricc
 An Exact Algorithm for the Resource-Constrained Project Scheduling Problem Based on a New Mathematical Formulation. 
 Management Science 44(5):714-729.
 '''
+
+from pyomo.environ import *
+
 model = AbstractModel(name="RCPSP_DISCRETE")
 
 # Activity set
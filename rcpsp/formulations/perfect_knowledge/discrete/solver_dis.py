@@ -1,98 +1,197 @@
-import sys
-from datetime import datetime
-import pyomo.dataportal as dp
-import pyomo.environ as pyo
-import rcpsp_dis as rcpsp
-from rcpsp.heuristics.sgs import serial_schedule_generation
+import argparse
+import time
+
+import rcpsp.formulations.perfect_knowledge.discrete.rcpsp_dis as rcpsp
+from rcpsp.formulations import solve_cache
+from rcpsp.formulations.perfect_knowledge.discrete.direct_dis import build_model
+from rcpsp.formulations.result_store import record_result, solution_start
+from rcpsp.formulations.results import bound_results, result_filename
+from rcpsp.formulations.solvers import INTERFACES, get_solver, run_solver
+from rcpsp.formulations.warm_start import discrete_start, step_start
+from rcpsp.instance import Instance
+from rcpsp.instance_cache import cached_windows
+from rcpsp.heuristics.upper_bound import heuristic_upper_bound
 from rcpsp.heuristics.forward_recursion import get_earliest_times
 from rcpsp.heuristics.backward_recursion import BackwardRecursion
-
-data = dp.DataPortal()
-
-instance_dir = 'data/instances/json/{instance_dir}/'.format(instance_dir=sys.argv[1])
-instance_name = sys.argv[2]
-
-#instance_dir = 'data/test_data/'
-#instance_name = 'rcpsp_test_instance_1'
-
-print('\nSolving instance:' + instance_name)
-
-data.load(filename=instance_dir + instance_name + '.json')
-
-act_count = data['act_count']
-act_proc = data['act_proc']
-act_pre = data['act_pre']
-r_count = data['r_count']
-r_cons = data['r_cons']
-r_cap = data['r_cap']
-
-# Initialize dummy source and sink activities
-source = 0
-sink = act_count + 1
-
-act_proc[source] = 0
-act_proc[sink] = 0
-
-for r in range(1, r_count + 1):
-    r_cons[source, r] = 0
-    r_cons[sink, r] = 0
-
-# Calculate earliest start and finish times
-est, eft = get_earliest_times(sink, act_pre, act_proc)
-data['est'] = est
-data['eft'] = eft
-
-# Calculate initial latest start and finish times. Upper bound is the sum of processing times
-br_init = BackwardRecursion(sink, sum(act_proc.values()), act_pre, act_proc)
-lst_init, lft_init = br_init.get_latest_times()
-
-# Tighten upper bound with SGS
-upper_bound = serial_schedule_generation(
-    act_count, act_proc, act_pre, r_count, r_cons, r_cap, lft_init)
-
-# Calculate latest start and finish times using the new upper bound
-br = BackwardRecursion(sink, upper_bound, act_pre, act_proc)
-lst, lft = br.get_latest_times()
-
-data['lst'] = lst
-data['lft'] = lft
-data['upper_bound'] = {None: upper_bound}
-
-# Initialize variable sparse index set 
-x_set_init = []
-for act in range(sink + 1):
-    for t in range(est[act], lst[act] + 1):
-        x_set_init.append((act, t))
-data["x_set_init"] = x_set_init
-
-print('Preprocessing phase complete. Sending to solver...')
-instance = rcpsp.model.create_instance(data)
-#instance.pprint()
-
-# Solve instance and print results
-opt = pyo.SolverFactory('cplex')
-opt.options['threads'] = 2
-#opt.options['randomseed'] = 3
-opt.options['timelimit'] = 20 * 60
-results = opt.solve(instance, load_solutions=True)
-
-
-results.write(filename='data/results/perfect_knowledge/discrete/{instance_dir}/{instance_name}_results_{timestamp}.json'
-              .format(instance_dir=sys.argv[1], instance_name=instance_name, timestamp=datetime.now().strftime("%d_%m_%Y_%H_%M_%S")), format='json')
-
-print('Done\n')
-
-'''
-total_free_slack=0
-num_activities = 0
-for v in instance.component_data_objects(pyo.Var):
-    if v.value is not None and int(v.value) == 1:
-        num_activities+=1
-        act = str(v).split('[')[1].split(',')
-        start=act[1].split(']')[0]
-        total_free_slack += lst[int(act[0])] - int(start)
-        print('Activity {act} starts at {start} with lst {lst}'.format(act=act[0], start=start, lst=lst[int(act[0])]))
-
-print('\nTotal duration:' + str(instance.OBJ()))
-print('Total free slack over {activities} activities: {slack}'.format(activities=str(num_activities), slack=str(total_free_slack)))
-'''
\ No newline at end of file
+from rcpsp.preprocessing.bounds import bound_windows
+from rcpsp.profiling import Profiler, profile_filename
+
+
+def solve(instance_dir, instance_name, threads=2, timelimit=20 * 60, portfolio_passes=None, improve_generations=None,
+          builder='direct', interface='shell', bounds=True, reduce_rows=False, step=False, profiler=None, cache=True,
+          islands=1, improve_timelimit=None):
+
+    #instance_dir = 'data/test_data/'
+    #instance_name = 'rcpsp_test_instance_1'
+
+    print('\nSolving instance:' + instance_name)
+    profiler = profiler or Profiler(enabled=False)
+
+    with profiler.phase('load'):
+        project = Instance.load(instance_dir, instance_name)
+        data = project.to_data()
+
+    # A repeated solve is answered from the cache without a model. Both paths return the
+    # start times and the results, see rcpsp.formulations.solve_cache
+    parameters = {'builder': builder, 'bounds': bounds, 'reduce_rows': reduce_rows, 'step': step,
+                  'portfolio_passes': portfolio_passes, 'improve_generations': improve_generations,
+                  'islands': islands, 'improve_timelimit': improve_timelimit}
+    key = solve_cache.cache_key(project, 'discrete', parameters)
+    entry = solve_cache.lookup(key, timelimit) if cache else None
+    if entry is not None:
+        solve_cache.report_hit(entry)
+        return entry['start'], solve_cache.cached_results(entry)
+
+    act_proc = data['act_proc']
+    act_pre = data['act_pre']
+
+    # Dummy sink activity
+    sink = project.sink
+
+    # Windows, upper bound and schedule of the heuristics from the instance cache, see rcpsp.instance_cache.
+    # The cache holds the genetic algorithm on one island without a time limit
+    cached = None
+    if islands == 1 and improve_timelimit is None:
+        cached = cached_windows(instance_dir, instance_name, portfolio_passes, improve_generations)
+    if cached is not None:
+        est, eft, lst, lft, upper_bound, schedule = cached
+        data['est'] = est
+        data['eft'] = eft
+    else:
+        # Calculate earliest start and finish times
+        with profiler.phase('cpm'):
+            est, eft = get_earliest_times(sink, act_pre, act_proc)
+            data['est'] = est
+            data['eft'] = eft
+
+        # Upper bound and schedule of the heuristics, see rcpsp.heuristics.upper_bound
+        with profiler.phase('heuristics'):
+            upper_bound, schedule = heuristic_upper_bound(
+                project, portfolio_passes, improve_generations, islands, improve_timelimit,
+                [act_proc[act] for act in range(sink + 1)], profiler)
+
+        # Calculate latest start and finish times using the new upper bound
+        with profiler.phase('cpm'):
+            br = BackwardRecursion(sink, upper_bound, act_pre, act_proc)
+            lst, lft = br.get_latest_times()
+
+    # Lower bounds and energetic reasoning on the time windows, see rcpsp.preprocessing.bounds
+    lower_bound = None
+    bounds_time = time.time()
+    if bounds:
+        with profiler.phase('bounds'):
+            lower_bound, lower_bounds, windows = bound_windows(project, upper_bound, [act_proc[act] for act in range(sink + 1)])
+        print('Lower bounds: ' + ', '.join('{name}={value}'.format(name=name, value=value) for name, value in lower_bounds.items()))
+
+        for act in range(sink + 1):
+            est[act], lst[act] = int(windows[0][act]), int(windows[1][act])
+            eft[act], lft[act] = est[act] + act_proc[act], lst[act] + act_proc[act]
+    bounds_time = time.time() - bounds_time
+
+    if lower_bound == upper_bound:
+        # The heuristic schedule is optimal, no model is built
+        print('Closed by bounding at {makespan}'.format(makespan=upper_bound))
+        results = bound_results(None, lower_bound, upper_bound, bounds_time)
+        start = [int(schedule[act]) for act in range(sink + 1)]
+    else:
+        data['lst'] = lst
+        data['lft'] = lft
+        data['upper_bound'] = {None: upper_bound}
+
+        # Initialize variable sparse index set
+        x_set_init = []
+        for act in range(sink + 1):
+            for t in range(est[act], lst[act] + 1):
+                x_set_init.append((act, t))
+        data["x_set_init"] = x_set_init
+
+        print('Preprocessing phase complete. Sending to solver...')
+        with profiler.phase('build'):
+            if builder == 'direct':
+                # Only the real index sets, see direct_dis.py
+                instance = build_model(project, est, lst, upper_bound, act_proc, reduce_rows, step)
+            else:
+                instance = rcpsp.model.create_instance({None: data})
+            #instance.pprint()
+
+            # Heuristic schedule as the MIP start
+            warmstart = discrete_start(instance.x, schedule)
+            if warmstart and hasattr(instance, 'z'):
+                step_start(instance.z, schedule)
+        profiler.model_size(instance)
+
+        # Solve instance and print results
+        opt = get_solver(interface, threads=threads, timelimit=timelimit)
+        #opt.options['randomseed'] = 3
+        with profiler.phase('solve'):
+            results = run_solver(opt, instance, warmstart=warmstart, profiler=profiler)
+        start = solution_start(instance)
+
+    with profiler.phase('store'):
+        filename = result_filename('discrete', instance_dir, instance_name)
+        results.write(filename=filename, format='json')
+        record_result(filename, 'discrete', instance_dir, instance_name, start=start)
+        solve_cache.store(key, filename, 'discrete', instance_dir, instance_name, parameters, timelimit, start)
+
+    if profiler.enabled:
+        profiler.write(profile_filename(filename))
+        print(profiler.summary())
+
+    print('Done\n')
+
+    '''
+    total_free_slack=0
+    num_activities = 0
+    for v in instance.component_data_objects(pyo.Var):
+        if v.value is not None and int(v.value) == 1:
+            num_activities+=1
+            act = str(v).split('[')[1].split(',')
+            start=act[1].split(']')[0]
+            total_free_slack += lst[int(act[0])] - int(start)
+            print('Activity {act} starts at {start} with lst {lst}'.format(act=act[0], start=start, lst=lst[int(act[0])]))
+
+    print('\nTotal duration:' + str(instance.OBJ()))
+    print('Total free slack over {activities} activities: {slack}'.format(activities=str(num_activities), slack=str(total_free_slack)))
+    '''
+
+    return start, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-threads", "--threads", type=int, default=2)
+    parser.add_argument("-timelimit", "--timelimit", type=float, default=20 * 60)
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                        help="tighten the upper bound with the priority rule portfolio and this many sampling passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations",
+                        help="tighten the upper bound with this many generations of the genetic algorithm")
+    parser.add_argument("-islands", "--islands", type=int, default=1,
+                        help="run the genetic algorithm on this many islands, one process each")
+    parser.add_argument("-improve_timelimit", "--improve_timelimit", type=float, default=None,
+                        help="stop the genetic algorithm after this many seconds")
+    parser.add_argument("-builder", "--builder", choices=['direct', 'abstract'], default='direct',
+                        help="build the instance directly or from the abstract model")
+    parser.add_argument("-interface", "--interface", choices=sorted(INTERFACES), default='shell',
+                        help="CPLEX interface, direct and persistent solve in-process")
+    parser.add_argument("--no-bounds", dest="bounds", action="store_false", default=True,
+                        help="skip the lower bounds and the energetic reasoning on the time windows")
+    parser.add_argument("-reduce", "--reduce", action="store_true", default=False, dest="reduce_rows",
+                        help="drop resource rows that can never be violated or are dominated by a neighbouring period")
+    parser.add_argument("-step", "--step", action="store_true", default=False,
+                        help="step variables instead of pulse variables in the resource rows")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="solve even if the solve cache holds the result, the new result replaces it")
+    parser.add_argument("-profile", "--profile", action="store_true", default=False,
+                        help="time every phase, count the model size and store the profile next to the result")
+    parser.add_argument("-cprofile", "--cprofile", nargs='+', default=[], metavar="PHASE",
+                        help="also run these phases, e.g. build or solve, under cProfile")
+    args = parser.parse_args()
+
+    if args.builder == 'abstract' and (args.reduce_rows or args.step):
+        parser.error('-reduce and -step need the direct builder')
+
+    solve(args.dir, args.instance, args.threads, args.timelimit, args.portfolio_passes, args.improve_generations,
+          args.builder, args.interface, args.bounds, args.reduce_rows, args.step,
+          Profiler(args.profile or bool(args.cprofile), args.cprofile), args.cache, args.islands, args.improve_timelimit)
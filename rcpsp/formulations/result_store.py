@@ -0,0 +1,199 @@
+'''
+SQLite store of solver results.
+
+Every stored result file is also appended as one row of the results table of
+data/results/results.db at solve time, with the instance, formulation, THETA and
+GAMMA, bounds, gap, times, model size and the start time vector. The table is
+indexed on instance and formulation, so comparing sets and formulations is one
+query instead of a scan of the result files:
+
+    SELECT instance_dir, formulation, AVG(gap), AVG(user_time) FROM results GROUP BY instance_dir, formulation
+
+Result files written before the store existed are added with import_results.
+Rows are unique per result file, so importing twice adds nothing.
+'''
+
+import glob
+import json
+import math
+import numbers
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from rcpsp.evaluation.monte_carlo import start_times
+from rcpsp.formulations.results import RESULTS_DIR
+
+RESULTS_DB = 'data/results/results.db'
+
+# Result file name: <instance>[_theta_<THETA>_gamma_<GAMMA>]_results_<timestamp>.json
+RESULT_FILE = re.compile(r'^(?P<instance>.+?)(_theta_(?P<theta>[^_]+)_gamma_(?P<gamma>[^_]+))?_results_(?P<timestamp>[\d_]+)\.json$')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    instance_dir TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    formulation TEXT NOT NULL,
+    theta REAL,
+    gamma REAL,
+    lower_bound REAL,
+    upper_bound REAL,
+    gap REAL,
+    status TEXT,
+    termination TEXT,
+    user_time REAL,
+    wall_time REAL,
+    variables INTEGER,
+    constraints INTEGER,
+    start TEXT,
+    result_file TEXT UNIQUE,
+    created TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_instance ON results (instance_dir, instance);
+CREATE INDEX IF NOT EXISTS results_formulation ON results (formulation, instance_dir);
+'''
+
+COLUMNS = ('instance_dir', 'instance', 'formulation', 'theta', 'gamma', 'lower_bound', 'upper_bound', 'gap', 'status',
+           'termination', 'user_time', 'wall_time', 'variables', 'constraints', 'start', 'result_file', 'created')
+
+
+def connect(db=RESULTS_DB):
+    '''
+    Open the store, creating it if needed. Batch workers append concurrently, so
+    the journal is written ahead and writers wait for the lock.
+    '''
+    os.makedirs(os.path.dirname(db) or '.', exist_ok=True)
+    connection = sqlite3.connect(db, timeout=60)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def __number(value):
+    # Bounds of unsolved models are written as infinite or missing. numpy numbers are
+    # returned as Python ones, sqlite can not store them
+    if isinstance(value, numbers.Real) and math.isfinite(value):
+        return int(value) if isinstance(value, numbers.Integral) else float(value)
+    return None
+
+
+def result_row(data, formulation, instance_dir, instance_name, theta=None, gamma=None, start=None, wall_time=None,
+               result_file=None):
+    '''
+    Row of the results table for the contents of a result file.
+    '''
+    problem = data.get('Problem', [{}])[0]
+    solver = data.get('Solver', [{}])[0]
+    lower_bound = __number(problem.get('Lower bound'))
+    upper_bound = __number(problem.get('Upper bound'))
+
+    gap = None
+    if lower_bound is not None and upper_bound:
+        gap = (upper_bound - lower_bound) / abs(upper_bound)
+
+    return {
+        'instance_dir': instance_dir,
+        'instance': instance_name,
+        'formulation': formulation,
+        'theta': theta,
+        'gamma': gamma,
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+        'gap': gap,
+        'status': solver.get('Status'),
+        'termination': solver.get('Termination condition'),
+        'user_time': __number(solver.get('User time')),
+        'wall_time': __number(wall_time if wall_time is not None else solver.get('Wallclock time')),
+        'variables': problem.get('Number of variables'),
+        'constraints': problem.get('Number of constraints'),
+        'start': None if start is None else json.dumps([int(round(t)) for t in start]),
+        'result_file': result_file,
+        'created': datetime.now().isoformat(timespec='seconds')
+    }
+
+
+def insert_rows(connection, rows):
+    '''
+    Append rows, skipping result files that are already stored. Returns the number of new rows.
+    '''
+    before = connection.total_changes
+    connection.executemany('INSERT OR IGNORE INTO results ({columns}) VALUES ({values})'.format(
+        columns=', '.join(COLUMNS), values=', '.join(':' + column for column in COLUMNS)), rows)
+    connection.commit()
+    return connection.total_changes - before
+
+
+def solution_start(instance):
+    '''
+    Start times of a solved instance, or None if no solution is loaded.
+    '''
+    block = instance.inner if hasattr(instance, 'inner') else instance
+    if hasattr(block, 'start'):
+        if any(var.value is None for var in block.start.values()):
+            return None
+    elif not any(var.value is not None and var.value > 0.5 for var in block.x.values()):
+        return None
+
+    return start_times(instance)
+
+
+def record_result(result_file, formulation, instance_dir, instance_name, theta=None, gamma=None, start=None,
+                  wall_time=None, db=RESULTS_DB):
+    '''
+    Append a result file that was just written to the store.
+    '''
+    with open(result_file, 'r') as jsonFile:
+        data = json.load(jsonFile)
+
+    row = result_row(data, formulation, instance_dir, instance_name, theta, gamma, start, wall_time, result_file)
+    connection = connect(db)
+    try:
+        insert_rows(connection, [row])
+    finally:
+        connection.close()
+
+
+def import_results(formulations=None, db=RESULTS_DB):
+    '''
+    Add the result files of the given formulations, all by default, that are not stored yet.
+    Every file is read once. Returns the number of new rows.
+    '''
+    connection = connect(db)
+    try:
+        stored = {row[0] for row in connection.execute('SELECT result_file FROM results')}
+
+        rows = []
+        for formulation in formulations or sorted(RESULTS_DIR):
+            for result_file in sorted(glob.glob(RESULTS_DIR[formulation] + '*/*_results_*.json')):
+                match = RESULT_FILE.match(os.path.basename(result_file))
+                if result_file in stored or match is None:
+                    continue
+
+                with open(result_file, 'r') as jsonFile:
+                    data = json.load(jsonFile)
+
+                theta = float(match.group('theta')) if match.group('theta') else None
+                gamma = float(match.group('gamma')) if match.group('gamma') else None
+                instance_dir = os.path.basename(os.path.dirname(result_file))
+                row = result_row(data, formulation, instance_dir, match.group('instance'), theta, gamma,
+                                 data.get('Schedule'), result_file=result_file)
+                row['created'] = datetime.fromtimestamp(os.path.getmtime(result_file)).isoformat(timespec='seconds')
+                rows.append(row)
+
+        return insert_rows(connection, rows)
+    finally:
+        connection.close()
+
+
+def query(sql, parameters=(), db=RESULTS_DB):
+    '''
+    Rows of a query on the store as dictionaries.
+    '''
+    connection = connect(db)
+    connection.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in connection.execute(sql, parameters)]
+    finally:
+        connection.close()
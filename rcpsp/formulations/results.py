@@ -0,0 +1,67 @@
+'''
+Location of the solver result files.
+Results are stored as data/results/<formulation dir>/<instance dir>/<instance>_results_<timestamp>.json
+'''
+
+import glob
+import os
+from datetime import datetime
+
+from pyomo.opt import ProblemSense, SolverResults, SolverStatus, TerminationCondition
+
+RESULTS_DIR = {
+    'discrete': 'data/results/perfect_knowledge/discrete/',
+    'continuous': 'data/results/perfect_knowledge/continuous/',
+    'robust_discrete': 'data/results/robust/discrete/worst_case_makespan/',
+    'robust_continuous': 'data/results/robust/continuous/worst_case_makespan/',
+    'robust_decomposition': 'data/results/robust/decomposition/',
+    'branch_and_bound': 'data/results/perfect_knowledge/branch_and_bound/'
+}
+
+
+def point_tag(theta, gamma):
+    '''
+    Tag of the result files of a robust formulation for THETA and GAMMA.
+    '''
+    return 'theta_{theta}_gamma_{gamma}'.format(theta=float(theta), gamma=float(gamma))
+
+
+def result_filename(formulation, instance_dir, instance_name, tag=None):
+    '''
+    A tag, e.g. the THETA and GAMMA of a robust result, is added after the instance name.
+    '''
+    result_dir = RESULTS_DIR[formulation] + instance_dir + '/'
+    os.makedirs(result_dir, exist_ok=True)
+    if tag is not None:
+        instance_name = instance_name + '_' + tag
+    return '{result_dir}{instance_name}_results_{timestamp}.json'.format(
+        result_dir=result_dir, instance_name=instance_name, timestamp=datetime.now().strftime("%d_%m_%Y_%H_%M_%S"))
+
+
+def has_result(formulation, instance_dir, instance_name, tag=None):
+    '''
+    Whether a result file of the instance exists, only those with the tag if one is given.
+    '''
+    if tag is not None:
+        instance_name = instance_name + '_' + tag
+    return len(glob.glob('{result_dir}{instance_dir}/{instance_name}_results_*.json'.format(
+        result_dir=RESULTS_DIR[formulation], instance_dir=instance_dir, instance_name=instance_name))) > 0
+
+
+def bound_results(instance, lower_bound, upper_bound, user_time, termination=TerminationCondition.optimal):
+    '''
+    Results of an instance closed without a solver, e.g. by a lower bound that meets the upper bound.
+    The model size is left out without a Pyomo instance, e.g. for rcpsp.exact.branch_and_bound.
+    '''
+    results = SolverResults()
+    results.problem.lower_bound = lower_bound
+    results.problem.upper_bound = upper_bound
+    if instance is not None:
+        results.problem.number_of_variables = instance.nvariables()
+        results.problem.number_of_constraints = instance.nconstraints()
+    results.problem.number_of_objectives = 1
+    results.problem.sense = ProblemSense.minimize
+    results.solver.status = SolverStatus.ok if termination == TerminationCondition.optimal else SolverStatus.aborted
+    results.solver.termination_condition = termination
+    results.solver.user_time = user_time
+    return results
@@ -40,9 +40,9 @@ model.r_cons = Param(model.act_set, model.r_set,
 # Nominal activity processing times
 model.act_proc = Param(model.act_set, within=NonNegativeReals)
 # Worst case duration factor
-model.THETA = Param()
+model.THETA = Param(mutable=True)
 # Uncertainty budget
-model.GAMMA = Param()
+model.GAMMA = Param(mutable=True)
 
 # Activity time windows
 model.est = Param(model.act_set, within=NonNegativeReals)
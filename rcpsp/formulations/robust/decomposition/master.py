@@ -0,0 +1,113 @@
+'''
+Master problem of the scenario decomposition for the robust RCPSP.
+
+Sequencing is modelled with resource flows (Artigues, Michelon and Reusser, 2003).
+y[i, j] = 1 if activity j may not start before i finishes, and units of resource k
+can only be passed from i to j if y[i, j] = 1 or i is a known predecessor of j.
+Every duration scenario adds a block with its own start times, which follow the
+precedence arcs and the chosen sequencing, and the makespan C is the largest
+finish time over all scenarios, so the optimum is a lower bound on the robust
+makespan of the scenarios seen so far.
+
+Based on the flow formulation of Christian Artigues, Philippe Michelon, Stephane Reusser (2003)
+Insertion techniques for static and dynamic resource-constrained project scheduling.
+European Journal of Operational Research 149(2):249-267.
+'''
+
+from pyomo.environ import *
+from rcpsp.heuristics.cpm import backward_pass, forward_pass
+
+
+def build_master(project, closure, horizon):
+    '''
+    Master problem without scenarios. horizon bounds the finish time of every scenario.
+    '''
+    size = project.act_count + 2
+    source, sink = project.source, project.sink
+    r_cons = project.r_cons.tolist()
+    for k, cap in enumerate(project.r_cap.tolist()):
+        r_cons[source][k] = r_cons[sink][k] = cap
+
+    users = [[act for act in range(size) if r_cons[act][k] > 0] for k in range(project.r_count)]
+
+    model = ConcreteModel(name="RCPSP_ROBUST_MASTER")
+    model.act_set = RangeSet(0, sink)
+    model.r_set = RangeSet(project.r_count)
+    model.horizon = horizon
+
+    # Sequencing decisions between activities that share a resource and are not related by precedence
+    model.y_set = Set(dimen=2, ordered=True, initialize=sorted(
+        (i, j) for k in range(project.r_count) for i in users[k] for j in users[k]
+        if i != j and i not in (source, sink) and j not in (source, sink) and not closure[i, j] and not closure[j, i]))
+    model.y = Var(model.y_set, within=Binary, initialize=0)
+
+    # Resource flows, never against a precedence relationship
+    model.flow_set = Set(dimen=3, ordered=True, initialize=[
+        (i, j, k + 1) for k in range(project.r_count) for i in users[k] for j in users[k]
+        if i != j and i != sink and j != source and not closure[j, i]])
+    model.f = Var(model.flow_set, within=NonNegativeReals, initialize=0)
+
+    model.C = Var(within=NonNegativeReals, bounds=(0, horizon))
+
+    out_flows, in_flows = {}, {}
+    for i, j, k in model.flow_set:
+        out_flows.setdefault((i, k), []).append(model.f[i, j, k])
+        in_flows.setdefault((j, k), []).append(model.f[i, j, k])
+
+    # Every activity passes on exactly the units it consumes
+    model.flow_out_constraint = Constraint(sorted(out_flows), rule=lambda m, i, k: sum(out_flows[i, k]) == r_cons[i][k - 1])
+    model.flow_in_constraint = Constraint(sorted(in_flows), rule=lambda m, j, k: sum(in_flows[j, k]) == r_cons[j][k - 1])
+
+    # Flows need a sequencing decision
+    def flow_sequencing(m, i, j, k):
+        if (i, j) not in m.y_set:
+            return Constraint.Skip
+        return m.f[i, j, k] <= min(r_cons[i][k - 1], r_cons[j][k - 1]) * m.y[i, j]
+
+    model.flow_sequencing_constraint = Constraint(model.flow_set, rule=flow_sequencing)
+
+    # Two activities can not both precede each other
+    def no_two_cycles(m, i, j):
+        if i < j:
+            return m.y[i, j] + m.y[j, i] <= 1
+        return Constraint.Skip
+
+    model.no_two_cycles_constraint = Constraint(model.y_set, rule=no_two_cycles)
+
+    model.scenarios = Block(Any)
+    model.OBJ = Objective(expr=model.C)
+
+    return model
+
+
+def add_scenario(model, project, durations):
+    '''
+    Add the start times and constraints of a duration scenario. Returns the new block.
+    Start times are bounded by the time windows of the scenario durations.
+    '''
+    scenario = len(model.scenarios)
+    block = model.scenarios[scenario]
+
+    act_pre = [project.predecessors(act).tolist() for act in range(project.act_count + 2)]
+    est, _ = forward_pass(act_pre, durations)
+    lst, _ = backward_pass(act_pre, durations, model.horizon)
+    est, lst = est.tolist(), lst.tolist()
+
+    block.start = Var(model.act_set, within=NonNegativeReals, bounds=lambda b, act: (est[act], lst[act]))
+
+    pre, succ = project.edges()
+    block.precedence_constraint = Constraint(list(zip(pre.tolist(), succ.tolist())), rule=lambda b, i, j: (
+        b.start[j] >= b.start[i] + durations[i]))
+
+    # Big M from the time windows, pairs that can never overlap need no row
+    def sequencing(b, i, j):
+        big_m = lst[i] + durations[i] - est[j]
+        if big_m <= 0:
+            return Constraint.Skip
+        return b.start[j] >= b.start[i] + durations[i] - big_m * (1 - model.y[i, j])
+
+    block.sequencing_constraint = Constraint(model.y_set, rule=sequencing)
+
+    block.makespan_constraint = Constraint(expr=model.C >= block.start[project.sink] + durations[project.sink])
+
+    return block
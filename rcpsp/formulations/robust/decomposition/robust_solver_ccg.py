@@ -0,0 +1,295 @@
+'''
+Column-and-constraint generation for the robust RCPSP.
+
+The master problem (master.py) chooses a resource flow sequencing that minimizes
+the largest makespan over a finite set of duration scenarios, a lower bound on the
+robust makespan. The adversary (rcpsp.evaluation.adversarial) returns the worst
+scenario of the budgeted uncertainty set for the master sequencing, whose makespan
+is an upper bound. The worst scenario is added to the master with its own start
+time variables and the master is solved again, until the bounds meet.
+
+Sequencing decisions are fixed before the durations are known, so the method
+solves the min-max problem. Its value is never below the worst case makespan of
+the bilevel formulations, where the schedule may react to the durations.
+
+The master is warm started from the best sequencing found so far. The persistent
+interface keeps the master loaded in CPLEX and only adds the new scenario blocks.
+Stored results are added to the solve cache under their own formulation, a run
+that stopped before the bounds met as a time limited entry.
+
+Usage: python robust_solver_ccg.py j30 j301_1 -theta 0.5 -gamma 2
+'''
+
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+import pyomo.environ as pyo
+from pyomo.opt import TerminationCondition
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+from rcpsp.evaluation.adversarial import heuristic_schedule, worst_case
+from rcpsp.evaluation.monte_carlo import resource_flows
+from rcpsp.formulations import solve_cache
+from rcpsp.formulations.result_store import record_result
+from rcpsp.formulations.results import bound_results, point_tag, result_filename
+from rcpsp.formulations.robust.decomposition.master import add_scenario, build_master
+from rcpsp.formulations.solvers import INTERFACES, get_solver, run_solver
+from rcpsp.heuristics.cpm import forward_pass
+from rcpsp.instance import Instance
+from rcpsp.instance_cache import cached_closure
+from rcpsp.preprocessing.closure import transitive_closure
+
+
+def sequencing_graph(project, model, arcs=None):
+    '''
+    Predecessor lists of the precedence network plus the resource flow arcs of the
+    master solution, or of the given arcs.
+    '''
+    if arcs is None:
+        arcs = [(i, j) for (i, j, k), var in model.f.items() if var.value is not None and var.value > 1e-6]
+
+    act_pre = [project.predecessors(act).tolist() for act in range(project.act_count + 2)]
+    for i, j in set(arcs):
+        if i != project.source and j != project.sink:
+            act_pre[j].append(i)
+    return act_pre
+
+
+def cache_parameters(theta, gamma, portfolio_passes=None, improve_generations=None, max_iterations=50, tolerance=1e-4):
+    '''
+    Parameters of the solve cache key of a grid point, see rcpsp.formulations.solve_cache.
+    '''
+    return {'theta': theta, 'gamma': gamma, 'portfolio_passes': portfolio_passes,
+            'improve_generations': improve_generations, 'max_iterations': max_iterations, 'tolerance': tolerance}
+
+
+def load_sequencing(model, sequencing, scenarios, act_pre):
+    '''
+    Set the master variables to a sequencing, {(i, j, k): units} of resource flow,
+    with the start times of every scenario block from the forward pass on act_pre.
+    '''
+    for index, var in model.f.items():
+        var.set_value(sequencing.get(index, 0))
+    for (i, j), var in model.y.items():
+        var.set_value(0)
+    for i, j, k in sequencing:
+        if (i, j) in model.y_set:
+            model.y[i, j].set_value(1)
+
+    makespan = 0
+    for index, durations in enumerate(scenarios):
+        est, eft = forward_pass(act_pre, durations)
+        for act, start in enumerate(est.tolist()):
+            model.scenarios[index].start[act].set_value(start)
+        makespan = max(makespan, float(eft.max()))
+    model.C.set_value(makespan)
+
+
+def decompose(instance_dir, instance_name, theta=0.0, gamma=0.0, display=False, store=False, portfolio_passes=None,
+              improve_generations=None, interface='shell', threads=2, timelimit=20 * 60, max_iterations=50,
+              tolerance=1e-4, key=None):
+    '''
+    Column-and-constraint generation for one THETA and GAMMA. Returns the master model with the best
+    sequencing and its bounds, the start times of that sequencing in its worst scenario and the results.
+    With a cache key the stored result is added to the solve cache.
+    '''
+    print('\nSolving instance: {instance}. Using GAMMA={GAMMA}, THETA={THETA}'.format(
+        instance=instance_name, GAMMA=gamma, THETA=theta))
+    started = time.time()
+
+    project = Instance.load(instance_dir, instance_name)
+    closure = cached_closure(instance_dir, instance_name)
+    if closure is None:
+        closure = transitive_closure(project)
+    nominal = project.act_proc.astype(float)
+
+    # Initial sequencing from the best heuristic schedule for the worst case durations
+    worst = np.round(project.act_proc * (1 + theta)).astype(np.int32)
+    _, schedule = heuristic_schedule(project, worst, portfolio_passes or 0, improve_generations)
+    incumbent = resource_flows(project, schedule, worst.tolist())
+    incumbent_pre = sequencing_graph(project, None, [(i, j) for i, j, _ in incumbent])
+    upper_bound, delta = worst_case(incumbent_pre, nominal.tolist(), theta, gamma)
+    incumbent_delta = delta
+    lower_bound = 0.0
+
+    # No optimal sequencing has a scenario finishing after the heuristic one
+    model = build_master(project, closure, upper_bound)
+    scenarios = []
+
+    print('Preprocessing phase complete. Sending to solver...')
+    opt = None
+    iterations = []
+    results = None
+    for iteration in range(1, max_iterations + 1):
+        # Worst scenario of the last sequencing
+        durations = nominal * (1 + theta * np.asarray(delta))
+        scenarios.append(durations)
+        block = add_scenario(model, project, durations.tolist())
+        if isinstance(opt, PersistentSolver) and opt._pyomo_model is model:
+            opt.add_block(block)
+
+        load_sequencing(model, incumbent, scenarios, incumbent_pre)
+
+        remaining = timelimit - (time.time() - started)
+        if remaining <= 0:
+            break
+
+        opt = get_solver(interface, threads=threads, timelimit=remaining)
+        results = run_solver(opt, model, warmstart=True)
+
+        bound = results.problem.lower_bound
+        if bound is not None and math.isfinite(bound):
+            lower_bound = max(lower_bound, bound)
+        if model.C.value is None:
+            break
+
+        # Adversary on the master sequencing
+        act_pre = sequencing_graph(project, model)
+        makespan, delta = worst_case(act_pre, nominal.tolist(), theta, gamma)
+        if makespan < upper_bound:
+            upper_bound, incumbent_pre, incumbent_delta = makespan, act_pre, delta
+            incumbent = {index: var.value for index, var in model.f.items() if var.value > 1e-6}
+
+        iterations.append({'Iteration': iteration, 'Lower bound': lower_bound, 'Upper bound': upper_bound,
+                           'Master objective': pyo.value(model.C), 'Adversary makespan': makespan,
+                           'Time': time.time() - started})
+        print('Iteration {iteration}: lower bound {lower:g}, upper bound {upper:g}'.format(
+            iteration=iteration, lower=lower_bound, upper=upper_bound))
+
+        if upper_bound - lower_bound <= tolerance * upper_bound:
+            break
+
+    # Leave the best sequencing and the bounds on the model
+    load_sequencing(model, incumbent, scenarios, incumbent_pre)
+    model.lower_bound, model.upper_bound = lower_bound, upper_bound
+
+    # Start times of the best sequencing in its worst scenario, as the inner start times of the bilevel solvers
+    start, _ = forward_pass(incumbent_pre, (nominal * (1 + theta * np.asarray(incumbent_delta))).tolist())
+    start = start.tolist()
+
+    # Out of time before the first master solve, only the heuristic sequencing is known
+    if results is None:
+        print('Time limit reached before the first master solve')
+        results = bound_results(model, lower_bound, upper_bound, time.time() - started,
+                                TerminationCondition.maxTimeLimit)
+    elif upper_bound - lower_bound <= tolerance * upper_bound:
+        results.solver.termination_condition = TerminationCondition.optimal
+    elif time.time() - started >= timelimit:
+        results.solver.termination_condition = TerminationCondition.maxTimeLimit
+    else:
+        results.solver.termination_condition = TerminationCondition.maxIterations
+
+    if store:
+        filename = result_filename('robust_decomposition', instance_dir, instance_name, point_tag(theta, gamma))
+        results.write(filename=filename, format='json')
+        with open(filename, 'r') as jsonFile:
+            data = json.load(jsonFile)
+
+        # Bounds, termination and time of the whole decomposition instead of the last master
+        data['Problem'][0]['Lower bound'] = lower_bound
+        data['Problem'][0]['Upper bound'] = upper_bound
+        data['Solver'][0]['User time'] = time.time() - started
+        data['Iterations'] = iterations
+
+        with open(filename, 'w') as jsonFile:
+            json.dump(data, jsonFile, indent=4)
+
+        record_result(filename, 'robust_decomposition', instance_dir, instance_name, theta, gamma, start)
+        if key is not None:
+            solve_cache.store(key, filename, 'robust_decomposition', instance_dir, instance_name,
+                              cache_parameters(theta, gamma, portfolio_passes, improve_generations, max_iterations,
+                                               tolerance), timelimit, start=start, objective=upper_bound)
+
+    if display:
+        model.scenarios[len(scenarios) - 1].start.display()
+
+    print('Worst case makespan:' + str(upper_bound))
+
+    return model, start, results
+
+
+def solve(instance_dir, instance_name, theta=0.0, gamma=0.0, display=False, store=False, portfolio_passes=None,
+          improve_generations=None, interface='shell', threads=2, timelimit=20 * 60, max_iterations=50, tolerance=1e-4,
+          cache=True):
+    '''
+    Start times and results like the solve of the bilevel robust solvers, see decompose.
+    A repeated solve is answered from the solve cache.
+    '''
+    project = Instance.load(instance_dir, instance_name)
+    key = solve_cache.cache_key(project, 'robust_decomposition', cache_parameters(
+        theta, gamma, portfolio_passes, improve_generations, max_iterations, tolerance))
+    entry = solve_cache.lookup(key, timelimit) if cache else None
+    if entry is not None:
+        solve_cache.report_hit(entry)
+        return entry['start'], solve_cache.cached_results(entry)
+
+    _, start, results = decompose(instance_dir, instance_name, theta, gamma, display, store, portfolio_passes,
+                                  improve_generations, interface, threads, timelimit, max_iterations, tolerance, key)
+    return start, results
+
+
+def sweep(instance_dir, instance_name, thetas, gammas, display=False, store=False, portfolio_passes=None,
+          improve_generations=None, interface='shell', threads=2, timelimit=20 * 60, max_iterations=50, tolerance=1e-4,
+          cache=True):
+    '''
+    Worst case makespan over a grid of THETA and GAMMA values, grid points in the
+    solve cache are not solved. Returns (THETA, GAMMA, makespan, lower bound, time) tuples.
+    '''
+    project = Instance.load(instance_dir, instance_name)
+
+    curve = []
+    for theta in sorted(thetas):
+        for gamma in sorted(gammas):
+            key = solve_cache.cache_key(project, 'robust_decomposition', cache_parameters(
+                theta, gamma, portfolio_passes, improve_generations, max_iterations, tolerance))
+            entry = solve_cache.lookup(key, timelimit) if cache else None
+            if entry is not None:
+                solve_cache.report_hit(entry)
+                curve.append((theta, gamma, entry['objective'], entry['lower_bound'], entry['user_time']))
+                continue
+
+            started = time.time()
+            model, _, _ = decompose(instance_dir, instance_name, theta, gamma, display, store, portfolio_passes,
+                                    improve_generations, interface, threads, timelimit, max_iterations, tolerance, key)
+            curve.append((theta, gamma, model.upper_bound, model.lower_bound, time.time() - started))
+
+    print('\nTHETA\tGAMMA\tWorst case makespan\tLower bound')
+    for theta, gamma, makespan, bound, _ in curve:
+        print('{theta}\t{gamma}\t{makespan:g}\t{bound:g}'.format(theta=theta, gamma=gamma, makespan=makespan, bound=bound))
+
+    return curve
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-theta", "--theta", type=float, nargs='+', default=[0.0])
+    parser.add_argument("-gamma", "--gamma", type=float, nargs='+', default=[0.0])
+    parser.add_argument("-d", "--display", action="store_true", default=False)
+    parser.add_argument("-s", "--store", action="store_true", default=False)
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                        help="initial sequencing from the priority rule portfolio with this many sampling passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations",
+                        help="improve the initial sequencing with this many generations of the genetic algorithm")
+    parser.add_argument("-interface", "--interface", choices=sorted(INTERFACES), default='shell',
+                        help="CPLEX interface, persistent only adds the new scenarios to the loaded master")
+    parser.add_argument("-threads", "--threads", type=int, default=2)
+    parser.add_argument("-timelimit", "--timelimit", type=float, default=20 * 60)
+    parser.add_argument("-iterations", "--iterations", type=int, default=50, dest="max_iterations")
+    parser.add_argument("-tolerance", "--tolerance", type=float, default=1e-4,
+                        help="relative gap between the upper and lower bound to stop at")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="solve even if the solve cache holds the result, the new result replaces it")
+    args = parser.parse_args()
+
+    if len(args.theta) > 1 or len(args.gamma) > 1:
+        sweep(args.dir, args.instance, args.theta, args.gamma, args.display, args.store, args.portfolio_passes,
+              args.improve_generations, args.interface, args.threads, args.timelimit, args.max_iterations, args.tolerance,
+              args.cache)
+    else:
+        solve(args.dir, args.instance, args.theta[0], args.gamma[0], args.display, args.store, args.portfolio_passes,
+              args.improve_generations, args.interface, args.threads, args.timelimit, args.max_iterations, args.tolerance,
+              args.cache)
@@ -29,9 +29,9 @@ model.act_pre = Param(model.act_set, mutable=True, domain=Any)
 # Nominal activity processing times
 model.act_proc = Param(model.act_set, within=NonNegativeReals)
 # Worst case duration factor
-model.THETA = Param()
+model.THETA = Param(mutable=True)
 # Uncertainty budget
-model.GAMMA = Param()
+model.GAMMA = Param(mutable=True)
 
 # Resource set
 model.r_count = Param(within=NonNegativeIntegers, domain=Any)
@@ -85,7 +85,7 @@ def resource_capacity_constraint(sub_m, r, t):
         M.r_cons[act, r] * sub_m.x[act, q]
         for act in M.act_set
         for q in range(
-            max(0, t - round(M.act_proc[act] * (1 + value(M.delta[act]) * M.THETA)) + 1), t + 1
+            max(0, t - round(M.act_proc[act] * (1 + value(M.delta[act]) * value(M.THETA))) + 1), t + 1
         ) if q >= M.est[act] and q <= M.lst[act]
     )
     
@@ -1,121 +1,94 @@
-import json
-import argparse
-from datetime import datetime
-import pyomo.dataportal as dp
-import pyomo.environ as pyo
-import robust_rcpsp_dis as rcpsp
-from rcpsp.heuristics.sgs import serial_schedule_generation
+from functools import partial
+
+from rcpsp.heuristics.upper_bound import heuristic_upper_bound
+from rcpsp.formulations.robust import robust_solver
+from rcpsp.formulations.warm_start import discrete_start
+from rcpsp.instance import Instance
+from rcpsp.profiling import Profiler
 from rcpsp.heuristics.forward_recursion import get_earliest_times
 from rcpsp.heuristics.backward_recursion import BackwardRecursion
 
+import rcpsp.formulations.robust.discrete.worst_case_makespan.robust_rcpsp_dis as rcpsp
+
+
+def build_instance(instance_dir, instance_name, theta=0.0, gamma=0.0, portfolio_passes=None, improve_generations=None,
+                   profiler=None, project=None, islands=1, improve_timelimit=None):
+    '''
+    Preprocessing and model instance. Time windows are computed for theta,
+    so the instance remains valid for every smaller THETA and any GAMMA.
+    An Instance that is already loaded can be passed as project. islands and
+    improve_timelimit are passed to the genetic algorithm.
+    '''
+    profiler = profiler or Profiler(enabled=False)
+
+    with profiler.phase('load'):
+        if project is None:
+            project = Instance.load(instance_dir, instance_name)
+        data = project.to_data()
+
+    # Worst case duration factor
+    THETA = theta
+    data['THETA'] = {None: THETA}
+
+    # Uncertainty budget
+    GAMMA = gamma
+    data['GAMMA'] = {None: GAMMA}
+
+    act_proc = data['act_proc']
+    act_pre = data['act_pre']
+
+    # Dummy sink activity
+    sink = project.sink
+
+    act_proc_worst = {}
+    for act in act_proc:
+        act_proc_worst[act] = round(act_proc[act] * (1 + THETA))
+    data['act_proc_worst'] = act_proc_worst
+
+    # Calculate earliest start and finish times using the best case durations.
+    with profiler.phase('cpm'):
+        est, eft = get_earliest_times(sink, act_pre, act_proc)
+        data['est'] = est
+        data['eft'] = eft
+
+    # Upper bound and schedule of the heuristics, see rcpsp.heuristics.upper_bound
+    with profiler.phase('heuristics'):
+        upper_bound, schedule = heuristic_upper_bound(
+            project, portfolio_passes, improve_generations, islands, improve_timelimit,
+            [act_proc_worst[act] for act in range(sink + 1)], profiler)
+
+    # Calculate latest start and finish times using the new upper bound
+    with profiler.phase('cpm'):
+        br = BackwardRecursion(sink, upper_bound, act_pre, act_proc_worst)
+        lst, lft = br.get_latest_times()
+
+    data['lst'] = lst
+    data['lft'] = lft
+    data['upper_bound'] = {None: upper_bound}
+
+    # Initialize variable sparse index set
+    x_set_init = []
+    for act in range(sink + 1):
+        for t in range(est[act], lst[act] + 1):
+            x_set_init.append((act, t))
+    data["x_set_init"] = x_set_init
+
+    print('Preprocessing phase complete. Sending to solver...')
+    with profiler.phase('build'):
+        instance = rcpsp.model.create_instance({None: data})
+
+        # Initial values of the inner problem from the heuristic schedule with delta = 0.
+        # The metasolver does not forward a MIP start, so the values do not warm start CPLEX
+        discrete_start(instance.inner.x, schedule)
+    profiler.model_size(instance)
+
+    return instance
+
+
+# Solve, sweep and command line shared with the continuous solver, see rcpsp.formulations.robust.robust_solver
+solve = partial(robust_solver.solve, 'robust_discrete', build_instance)
+sweep = partial(robust_solver.sweep, 'robust_discrete', build_instance)
+
 
-parser = argparse.ArgumentParser()
-parser.add_argument("dir") 
-parser.add_argument("instance")
-parser.add_argument("-theta", "--theta", type=float, default=0.0) 
-parser.add_argument("-gamma", "--gamma", type=float, default=0.0) 
-parser.add_argument("-p", "--perturb", action="store_true", default=False) 
-parser.add_argument("-d", "--display", action="store_true", default=False) 
-parser.add_argument("-s", "--store", action="store_true", default=False) 
-args = parser.parse_args()
-
-instance_dir = 'data/instances/json/{instance_dir}/'.format(instance_dir=args.dir)
-instance_name = args.instance
-
-data = dp.DataPortal()
-data.load(filename=instance_dir + instance_name + '.json')
-
-# Worst case duration factor
-THETA = args.theta
-data['THETA'] = {None: THETA}
-
-# Uncertainty budget
-GAMMA = args.gamma
-data['GAMMA'] = {None: GAMMA}
-
-print('\nSolving instance: {instance}. Using GAMMA={GAMMA}, THETA={THETA}'.format(instance=instance_name, GAMMA=GAMMA,THETA=THETA))
-
-act_count = data['act_count']
-act_proc = data['act_proc']
-act_pre = data['act_pre']
-r_count = data['r_count']
-r_cons = data['r_cons']
-r_cap = data['r_cap']
-
-# Initialize dummy source and sink activities
-source = 0
-sink = act_count + 1
-
-act_proc[source] = 0
-act_proc[sink] = 0
-
-for r in range(1, r_count + 1):
-    r_cons[source, r] = 0
-    r_cons[sink, r] = 0
-
-act_proc_worst = {}
-for act in act_proc:
-    act_proc_worst[act] = round(act_proc[act] * (1 + THETA))
-data['act_proc_worst'] = act_proc_worst
-
-# Calculate earliest start and finish times using the best case durations.
-est, eft = get_earliest_times(sink, act_pre, act_proc)
-data['est'] = est
-data['eft'] = eft
-
-# Calculate initial latest start and finish times using the worst case durations. 
-# Upper bound is the sum of processing times
-br_init = BackwardRecursion(sink, sum(act_proc_worst.values()), act_pre, act_proc_worst)
-lst_init, lft_init = br_init.get_latest_times()
-
-# Tighten upper bound with SGS
-upper_bound = serial_schedule_generation(
-    act_count, act_proc_worst, act_pre, r_count, r_cons, r_cap, lft_init)
-
-# Calculate latest start and finish times using the new upper bound
-br = BackwardRecursion(sink, upper_bound, act_pre, act_proc_worst)
-lst, lft = br.get_latest_times()
-
-data['lst'] = lst
-data['lft'] = lft
-data['upper_bound'] = {None: upper_bound}
-
-# Initialize variable sparse index set 
-x_set_init = []
-for act in range(sink + 1):
-    for t in range(est[act], lst[act] + 1):
-        x_set_init.append((act, t))
-data["x_set_init"] = x_set_init
-
-print('Preprocessing phase complete. Sending to solver...')
-instance = rcpsp.model.create_instance(data)
-#instance.inner.pprint()
-
-''' 
-Apply the bilevel linear duality metasolver.
-The metasolver will perform a series of transformations
-using duality and linearization. The cplex solver will
-be used to solve the transformed instance.
-'''
-opt = pyo.SolverFactory('bilevel_ld')
-opt.options['solver'] = 'cplex'
-
-results = opt.solve(instance, load_solutions=True)
-
-if args.store:
-    # Get the inner solver results from the temp file.
-    with open("data/results/robust/discrete/worst_case_makespan/inner_results.json", "r") as jsonFile:
-        data = json.load(jsonFile)
-
-    # Set the inner only time to the total time 
-    data['Solver'][0]['User time'] = results.solver.wallclock_time
-
-    # Dump to the correct directory
-    with open('data/results/robust/discrete/worst_case_makespan/{instance_dir}/{instance_name}_results_{timestamp}.json'
-                .format(instance_dir=args.dir, instance_name=instance_name, timestamp=datetime.now().strftime("%d_%m_%Y_%H_%M_%S")), "w") as jsonFile:
-        json.dump(data,jsonFile, indent=4)
-
-if args.display:
-    instance.inner.x.display()
-
-print('Worst case makespan:' + str(instance.inner.OBJ()))
\ No newline at end of file
+if __name__ == '__main__':
+    robust_solver.main('robust_discrete', build_instance)
@@ -0,0 +1,265 @@
+'''
+Solve, sweep and command line of the bilevel robust formulations.
+
+robust_solver_dis.py and robust_solver_con.py only differ in how they preprocess
+and build their model. Each passes its formulation name and its build_instance to
+the functions here, which solve the instance with the bilevel_ld metasolver, store
+the results and answer repeated solves from the solve cache. build_instance takes
+(instance_dir, instance_name, theta, gamma, portfolio_passes, improve_generations,
+profiler, project, islands, improve_timelimit) and returns the model instance.
+'''
+
+import argparse
+import json
+
+import pyomo.environ as pyo
+from rcpsp.evaluation.adversarial import robust_upper_bounds
+from rcpsp.formulations import solve_cache
+from rcpsp.formulations.result_store import record_result, solution_start
+from rcpsp.formulations.results import RESULTS_DIR, point_tag, result_filename
+from rcpsp.formulations.robust.decomposition import robust_solver_ccg
+from rcpsp.formulations.solvers import INTERFACES, solve_phases
+from rcpsp.instance import Instance
+from rcpsp.profiling import Profiler, profile_filename
+
+# Variables of the inner problem shown by -display
+DISPLAY = {'robust_discrete': 'x', 'robust_continuous': 'fin'}
+
+
+def cache_parameters(theta, gamma, portfolio_passes=None, improve_generations=None, islands=1, improve_timelimit=None):
+    '''
+    Parameters of the solve cache key of a grid point, see rcpsp.formulations.solve_cache.
+    '''
+    return {'theta': theta, 'gamma': gamma, 'portfolio_passes': portfolio_passes,
+            'improve_generations': improve_generations, 'islands': islands, 'improve_timelimit': improve_timelimit}
+
+
+def solve_instance(formulation, instance, instance_dir, instance_name, display=False, store=False, interface='shell',
+                   tag=None, profiler=None, key=None, parameters=None, timelimit=None):
+    '''
+    Solve an instance for its current THETA and GAMMA. With a profiler the profile
+    so far is stored next to the result, with a cache key the stored result is added
+    to the solve cache. timelimit is passed to CPLEX, None solves without a limit.
+    '''
+    profiler = profiler or Profiler(enabled=False)
+    print('\nSolving instance: {instance}. Using GAMMA={GAMMA}, THETA={THETA}'.format(
+        instance=instance_name, GAMMA=pyo.value(instance.GAMMA), THETA=pyo.value(instance.THETA)))
+
+    '''
+    Apply the bilevel linear duality metasolver.
+    The metasolver will perform a series of transformations
+    using duality and linearization. The cplex solver will
+    be used to solve the transformed instance.
+    '''
+    opt = pyo.SolverFactory('bilevel_ld')
+    # The transformed instance is new on every call, so a persistent interface runs as direct
+    opt.options['solver'] = INTERFACES['direct' if interface == 'persistent' else interface]
+
+    with profiler.phase('bilevel_ld'), solve_phases(opt, profiler):
+        results = opt.solve(instance, load_solutions=True, timelimit=timelimit)
+
+    if store:
+        with profiler.phase('store'):
+            # Get the inner solver results from the temp file.
+            with open(RESULTS_DIR[formulation] + 'inner_results.json', 'r') as jsonFile:
+                data = json.load(jsonFile)
+
+            # Set the inner only time to the total time
+            data['Solver'][0]['User time'] = results.solver.wallclock_time
+
+            # Dump to the correct directory
+            filename = result_filename(formulation, instance_dir, instance_name, tag)
+            with open(filename, "w") as jsonFile:
+                json.dump(data,jsonFile, indent=4)
+
+            start = solution_start(instance)
+            record_result(filename, formulation, instance_dir, instance_name, pyo.value(instance.THETA),
+                          pyo.value(instance.GAMMA), start)
+            if key is not None:
+                solve_cache.store(key, filename, formulation, instance_dir, instance_name, parameters, timelimit,
+                                  start=start, objective=instance.inner.OBJ())
+
+        if profiler.enabled:
+            profiler.write(profile_filename(filename))
+
+    if display:
+        getattr(instance.inner, DISPLAY[formulation]).display()
+
+    print('Worst case makespan:' + str(instance.inner.OBJ()))
+
+    return results
+
+
+def adversarial_bounds(project, theta, gammas, portfolio_passes=None, improve_generations=None):
+    '''
+    Worst case makespan of the heuristic schedule for every GAMMA, upper bounds on the robust objective.
+    The heuristic schedule is computed once for theta.
+    '''
+    bounds = {}
+    for gamma, (makespan, _) in zip(gammas, robust_upper_bounds(project, theta, gammas, portfolio_passes or 0,
+                                                                improve_generations)):
+        print('Adversarial upper bound for GAMMA={gamma}: {makespan:g}'.format(gamma=gamma, makespan=makespan))
+        bounds[gamma] = makespan
+    return bounds
+
+
+def solve(formulation, build_instance, instance_dir, instance_name, theta=0.0, gamma=0.0, display=False, store=False,
+          portfolio_passes=None, improve_generations=None, interface='shell', adversarial=False, profiler=None,
+          cache=True, islands=1, improve_timelimit=None, timelimit=None):
+
+    profiler = profiler or Profiler(enabled=False)
+
+    # A repeated solve is answered from the cache without a model. Both paths return the
+    # start times and the results, see rcpsp.formulations.solve_cache
+    project = Instance.load(instance_dir, instance_name)
+    parameters = cache_parameters(theta, gamma, portfolio_passes, improve_generations, islands, improve_timelimit)
+    key = solve_cache.cache_key(project, formulation, parameters)
+    entry = solve_cache.lookup(key, timelimit) if cache else None
+    if entry is not None:
+        solve_cache.report_hit(entry)
+        return entry['start'], solve_cache.cached_results(entry)
+
+    instance = build_instance(instance_dir, instance_name, theta, gamma, portfolio_passes, improve_generations, profiler,
+                              project, islands, improve_timelimit)
+    if adversarial:
+        with profiler.phase('adversarial'):
+            adversarial_bounds(project, theta, [gamma], portfolio_passes, improve_generations)
+    results = solve_instance(formulation, instance, instance_dir, instance_name, display, store, interface,
+                             point_tag(theta, gamma), profiler=profiler, key=key, parameters=parameters,
+                             timelimit=timelimit)
+
+    if profiler.enabled:
+        print(profiler.summary())
+
+    return solution_start(instance), results
+
+
+def sweep(formulation, build_instance, instance_dir, instance_name, thetas, gammas, display=False, store=False,
+          portfolio_passes=None, improve_generations=None, interface='shell', adversarial=False, profiler=None,
+          cache=True, islands=1, improve_timelimit=None, timelimit=None):
+    '''
+    Worst case makespan over a grid of THETA and GAMMA values.
+    The instance is parsed once. Windows, upper bound and heuristic schedule depend
+    on THETA only, so every THETA is preprocessed and built once and only the
+    mutable GAMMA changes between its points, each of which is the same model as a
+    solve of the point on its own. The metasolver transforms the instance again for
+    every point and does not forward a MIP start, so points are not warm started.
+    Grid points in the solve cache are not solved, an instance is only built for a
+    THETA with a point that is not. Returns (THETA, GAMMA, makespan, time, bound)
+    tuples, where bound is the adversarial upper bound or None.
+    '''
+    thetas, gammas = sorted(thetas), sorted(gammas)
+    profiler = profiler or Profiler(enabled=False)
+    project = Instance.load(instance_dir, instance_name)
+
+    curve = []
+    for theta in thetas:
+        instance = None
+        bounds = {}
+        if adversarial:
+            with profiler.phase('adversarial'):
+                bounds = adversarial_bounds(project, theta, gammas, portfolio_passes, improve_generations)
+
+        for gamma in gammas:
+            parameters = cache_parameters(theta, gamma, portfolio_passes, improve_generations, islands,
+                                          improve_timelimit)
+            key = solve_cache.cache_key(project, formulation, parameters)
+            entry = solve_cache.lookup(key, timelimit) if cache else None
+
+            if entry is not None:
+                solve_cache.report_hit(entry)
+                curve.append((theta, gamma, entry['objective'], entry['user_time'], bounds.get(gamma)))
+                continue
+
+            if instance is None:
+                instance = build_instance(instance_dir, instance_name, theta, gamma, portfolio_passes,
+                                          improve_generations, profiler, project, islands, improve_timelimit)
+            instance.GAMMA.set_value(gamma)
+
+            results = solve_instance(formulation, instance, instance_dir, instance_name, display, store, interface,
+                                     point_tag(theta, gamma), profiler, key, parameters, timelimit)
+            curve.append((theta, gamma, instance.inner.OBJ(), results.solver.wallclock_time, bounds.get(gamma)))
+
+    print('\nTHETA\tGAMMA\tWorst case makespan\tAdversarial bound')
+    for theta, gamma, makespan, _, bound in sorted(curve):
+        print('{theta}\t{gamma}\t{makespan}\t{bound}'.format(theta=theta, gamma=gamma, makespan=makespan, bound=bound))
+
+    if profiler.enabled:
+        print(profiler.summary())
+
+    return curve
+
+
+def main(formulation, build_instance):
+    '''
+    Command line of a robust solver script.
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("instance")
+    parser.add_argument("-theta", "--theta", type=float, nargs='+', default=[0.0])
+    parser.add_argument("-gamma", "--gamma", type=float, nargs='+', default=[0.0])
+    parser.add_argument("-p", "--perturb", action="store_true", default=False)
+    parser.add_argument("-d", "--display", action="store_true", default=False)
+    parser.add_argument("-s", "--store", action="store_true", default=False)
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                        help="tighten the upper bound with the priority rule portfolio and this many sampling passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations",
+                        help="tighten the upper bound with this many generations of the genetic algorithm")
+    parser.add_argument("-islands", "--islands", type=int, default=1,
+                        help="run the genetic algorithm on this many islands, one process each")
+    parser.add_argument("-improve_timelimit", "--improve_timelimit", type=float, default=None,
+                        help="stop the genetic algorithm after this many seconds")
+    parser.add_argument("-timelimit", "--timelimit", type=float, default=None,
+                        help="time limit of every metasolver run in seconds, none by default, "
+                             "20 minutes per grid point for the decomposition")
+    parser.add_argument("-threads", "--threads", type=int, default=None,
+                        help="CPLEX threads of the decomposition, 2 by default")
+    parser.add_argument("-interface", "--interface", choices=sorted(INTERFACES), default='shell',
+                        help="CPLEX interface of the metasolver, direct solves in-process")
+    parser.add_argument("-adversarial", "--adversarial", action="store_true", default=False,
+                        help="also print the worst case makespan of the heuristic schedule")
+    parser.add_argument("-method", "--method", choices=['bilevel', 'decomposition'], default='bilevel',
+                        help="decomposition solves by column-and-constraint generation instead of the metasolver")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="solve even if the solve cache holds the result, the new result replaces it")
+    parser.add_argument("-profile", "--profile", action="store_true", default=False,
+                        help="time every phase, count the model size and store the profile next to every result")
+    parser.add_argument("-cprofile", "--cprofile", nargs='+', default=[], metavar="PHASE",
+                        help="also run these phases, e.g. build or bilevel_ld, under cProfile")
+    args = parser.parse_args()
+
+    # Options the decomposition does not take
+    if args.method == 'decomposition':
+        unsupported = [option for option, given in (('-profile', args.profile), ('-cprofile', args.cprofile),
+                                                    ('-islands', args.islands != 1),
+                                                    ('-improve_timelimit', args.improve_timelimit is not None),
+                                                    ('-adversarial', args.adversarial)) if given]
+        if unsupported:
+            parser.error('-method decomposition does not support ' + ', '.join(unsupported))
+    elif args.threads is not None:
+        parser.error('-threads only applies to -method decomposition')
+
+    profiler = Profiler(args.profile or bool(args.cprofile), args.cprofile)
+
+    # More than one value of THETA or GAMMA solves the whole grid
+    if args.method == 'decomposition':
+        options = {'interface': args.interface, 'cache': args.cache}
+        if args.threads is not None:
+            options['threads'] = args.threads
+        if args.timelimit is not None:
+            options['timelimit'] = args.timelimit
+        if len(args.theta) > 1 or len(args.gamma) > 1:
+            robust_solver_ccg.sweep(args.dir, args.instance, args.theta, args.gamma, args.display, args.store,
+                                    args.portfolio_passes, args.improve_generations, **options)
+        else:
+            robust_solver_ccg.solve(args.dir, args.instance, args.theta[0], args.gamma[0], args.display, args.store,
+                                    args.portfolio_passes, args.improve_generations, **options)
+    elif len(args.theta) > 1 or len(args.gamma) > 1:
+        sweep(formulation, build_instance, args.dir, args.instance, args.theta, args.gamma, args.display, args.store,
+              args.portfolio_passes, args.improve_generations, args.interface, args.adversarial, profiler, args.cache,
+              args.islands, args.improve_timelimit, args.timelimit)
+    else:
+        solve(formulation, build_instance, args.dir, args.instance, args.theta[0], args.gamma[0], args.display,
+              args.store, args.portfolio_passes, args.improve_generations, args.interface, args.adversarial, profiler,
+              args.cache, args.islands, args.improve_timelimit, args.timelimit)
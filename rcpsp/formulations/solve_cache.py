@@ -0,0 +1,203 @@
+'''
+Content addressed cache of solver results.
+
+An entry is keyed by the hash of the normalized instance data, the formulation,
+the parameters that change the result (THETA, GAMMA, heuristics, model variant)
+and the code version. The instance name is not part of the key, so renamed or
+copied instances hit as well. The code version is the hash of the sources of
+the rcpsp package without rcpsp/util, so every change to a model, heuristic or
+solver starts a fresh cache.
+
+The time limit is not part of the key. An optimal entry answers every request,
+an entry that ended on a time limit only requests with at most its time limit.
+A longer time limit solves again and replaces the entry, so sweeps can be
+refined by raising the limit. Entries live in the solve_cache table of the
+result store, next to the results table, and point at their result file.
+'''
+
+import glob
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+from pyomo.opt import TerminationCondition
+
+from rcpsp.formulations.result_store import RESULTS_DB, connect, result_row
+from rcpsp.formulations.results import bound_results
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solve_cache (
+    key TEXT PRIMARY KEY,
+    formulation TEXT NOT NULL,
+    instance_dir TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    code_version TEXT NOT NULL,
+    timelimit REAL,
+    lower_bound REAL,
+    upper_bound REAL,
+    objective REAL,
+    gap REAL,
+    status TEXT,
+    termination TEXT,
+    time_limited INTEGER NOT NULL,
+    user_time REAL,
+    start TEXT,
+    result_file TEXT,
+    created TEXT NOT NULL
+);
+'''
+
+COLUMNS = ('key', 'formulation', 'instance_dir', 'instance', 'parameters', 'code_version', 'timelimit', 'lower_bound',
+           'upper_bound', 'objective', 'gap', 'status', 'termination', 'time_limited', 'user_time', 'start',
+           'result_file', 'created')
+
+
+def instance_digest(project):
+    '''
+    Hash of the durations, consumptions, capacities and precedence relations of an instance.
+    '''
+    digest = hashlib.sha256()
+    digest.update(np.array([project.act_count, project.r_count], dtype=np.int64).tobytes())
+    for array in (project.act_proc, project.r_cons, project.r_cap):
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+
+    # Predecessor lists in any order describe the same instance
+    for act in range(project.sink + 1):
+        digest.update(np.sort(np.asarray(project.predecessors(act), dtype=np.int64)).tobytes())
+        digest.update(b';')
+
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    '''
+    Hash of the sources of the rcpsp package, the scripts of rcpsp/util left out.
+    '''
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for filename in sorted(glob.glob(os.path.join(package, '**', '*.py'), recursive=True)):
+        relative = os.path.relpath(filename, package)
+        if relative.split(os.sep)[0] == 'util':
+            continue
+        digest.update(relative.replace(os.sep, '/').encode())
+        with open(filename, 'rb') as source:
+            digest.update(source.read())
+
+    return digest.hexdigest()
+
+
+def __normalized(parameters):
+    # Integral floats and ints of the same value give the same key
+    return json.dumps({name: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+                       for name, value in parameters.items()}, sort_keys=True)
+
+
+def cache_key(project, formulation, parameters):
+    '''
+    Key of a solve of an instance with a formulation and its parameters.
+    '''
+    digest = hashlib.sha256()
+    for part in (instance_digest(project), formulation, __normalized(parameters), code_version()):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def __answers(entry, timelimit):
+    if not entry['time_limited']:
+        return True
+    if entry['timelimit'] is None or timelimit is None:
+        return entry['timelimit'] is None and timelimit is None
+    return timelimit <= entry['timelimit']
+
+
+def lookup(key, timelimit=None, db=RESULTS_DB):
+    '''
+    Entry of a key that answers a solve with the given time limit, or None.
+    '''
+    connection = connect(db)
+    connection.executescript(SCHEMA)
+    try:
+        row = connection.execute('SELECT {columns} FROM solve_cache WHERE key = ?'.format(columns=', '.join(COLUMNS)),
+                                 (key,)).fetchone()
+    finally:
+        connection.close()
+
+    if row is None:
+        return None
+
+    entry = dict(zip(COLUMNS, row))
+    entry['start'] = None if entry['start'] is None else json.loads(entry['start'])
+    return entry if __answers(entry, timelimit) else None
+
+
+def store(key, result_file, formulation, instance_dir, instance_name, parameters, timelimit=None, start=None,
+          objective=None, wall_time=None, db=RESULTS_DB):
+    '''
+    Add or replace the entry of a key from a result file that was just written.
+    Results without a solution are not cached.
+    '''
+    with open(result_file, 'r') as jsonFile:
+        data = json.load(jsonFile)
+
+    row = result_row(data, formulation, instance_dir, instance_name, start=start, wall_time=wall_time,
+                     result_file=result_file)
+    if objective is None:
+        objective = row['upper_bound']
+    if objective is None:
+        return
+
+    optimal = row['termination'] == 'optimal' or row['gap'] == 0
+    entry = {
+        'key': key,
+        'formulation': formulation,
+        'instance_dir': instance_dir,
+        'instance': instance_name,
+        'parameters': __normalized(parameters),
+        'code_version': code_version(),
+        'timelimit': timelimit,
+        'lower_bound': row['lower_bound'],
+        'upper_bound': row['upper_bound'],
+        'objective': objective,
+        'gap': row['gap'],
+        'status': row['status'],
+        'termination': row['termination'],
+        'time_limited': int(not optimal),
+        'user_time': row['user_time'],
+        'start': row['start'],
+        'result_file': result_file,
+        'created': row['created']
+    }
+
+    connection = connect(db)
+    connection.executescript(SCHEMA)
+    try:
+        connection.execute('INSERT OR REPLACE INTO solve_cache ({columns}) VALUES ({values})'.format(
+            columns=', '.join(COLUMNS), values=', '.join(':' + column for column in COLUMNS)), entry)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def cached_results(entry):
+    '''
+    Solver results of a cache entry, with the objective as the upper bound.
+    '''
+    try:
+        termination = TerminationCondition(entry['termination'])
+    except ValueError:
+        termination = TerminationCondition.unknown
+
+    results = bound_results(None, entry['lower_bound'], entry['objective'], entry['user_time'], termination)
+    results.solver.wallclock_time = entry['user_time']
+    return results
+
+
+def report_hit(entry):
+    print('Cached result of {created}: {objective:g}{limited} ({result_file})'.format(
+        created=entry['created'], objective=entry['objective'],
+        limited=', time limited' if entry['time_limited'] else '', result_file=entry['result_file']))
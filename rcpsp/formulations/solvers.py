@@ -0,0 +1,81 @@
+'''
+CPLEX interfaces.
+
+shell writes an LP file, runs the CPLEX executable and parses the solution file
+for every solve. direct hands the model to the CPLEX Python API in-process and
+persistent additionally keeps it loaded in CPLEX, so later changes are pushed as
+updates instead of rebuilding the model. Solver objects are cached per process,
+so every worker of a batch keeps one alive across instances.
+'''
+
+from contextlib import contextmanager
+
+import pyomo.environ as pyo
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+
+INTERFACES = {
+    'shell': 'cplex',
+    'direct': 'cplex_direct',
+    'persistent': 'cplex_persistent'
+}
+
+# Steps of OptSolver.solve, measured as phases when profiling
+SOLVE_PHASES = (('_presolve', 'write'), ('_apply_solver', 'optimize'), ('_postsolve', 'read'))
+
+_solvers = {}
+
+
+def get_solver(interface='shell', **options):
+    '''
+    Cached solver of an interface with its options replaced by the given ones.
+    '''
+    if interface not in _solvers:
+        _solvers[interface] = pyo.SolverFactory(INTERFACES[interface])
+
+    opt = _solvers[interface]
+    opt.options.clear()
+    opt.options.update(options)
+    return opt
+
+
+@contextmanager
+def solve_phases(opt, profiler=None):
+    '''
+    Measure the steps of a solve as phases of a rcpsp.profiling.Profiler. For the
+    shell interface these are writing the LP file, running CPLEX and reading the
+    solution, for the in-process interfaces building the CPLEX model, solving and
+    loading the solution, and for the bilevel metasolver the reformulation and
+    inner solve in optimize.
+    '''
+    if profiler is None or not profiler.enabled:
+        yield
+        return
+
+    def measured(step, phase):
+        def run(*args, **kwds):
+            with profiler.phase(phase):
+                return step(*args, **kwds)
+        return run
+
+    patched = [name for name, _ in SOLVE_PHASES if name not in vars(opt) and hasattr(opt, name)]
+    for name, phase in SOLVE_PHASES:
+        if name in patched:
+            setattr(opt, name, measured(getattr(opt, name), phase))
+    try:
+        yield
+    finally:
+        for name in patched:
+            delattr(opt, name)
+
+
+def run_solver(opt, instance, warmstart=False, profiler=None):
+    '''
+    Solve an instance and load the solution. A persistent solver is pointed at the
+    instance unless it already holds it, changes to a loaded instance must have been
+    pushed with the methods of the persistent solver.
+    '''
+    with solve_phases(opt, profiler):
+        if isinstance(opt, PersistentSolver) and opt._pyomo_model is not instance:
+            opt.set_instance(instance)
+
+        return opt.solve(instance, warmstart=warmstart, load_solutions=True)
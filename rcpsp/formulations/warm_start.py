@@ -0,0 +1,52 @@
+'''
+Initial variable values from a heuristic schedule.
+
+The values are passed to CPLEX as a MIP start with opt.solve(..., warmstart=True),
+so the solver has an incumbent at the root node. start holds the start time of
+every activity 0, ..., n + 1 and must be resource and precedence feasible for
+the durations given. In the continuous models x and z follow the start order,
+activities that start together are ordered by index as the models expect.
+'''
+
+
+def discrete_start(x, start):
+    '''
+    x[act, t] = 1 if act starts at t. Returns False if a start time falls outside the
+    time windows of x, the variables are left untouched in that case.
+    '''
+    if any((act, start[act]) not in x for act in range(len(start))):
+        return False
+
+    for act, t in x:
+        x[act, t].value = int(start[act] == t)
+
+    return True
+
+
+def step_start(z, start):
+    '''
+    z[act, t] = 1 if act has started by t. Call after discrete_start succeeded.
+    '''
+    for act, t in z:
+        z[act, t].value = int(start[act] <= t)
+
+
+def continuous_start(block, start, act_proc):
+    '''
+    Sets start, fin, x and z of a block holding the continuous time variables.
+    '''
+    fin = [start[act] + act_proc[act] for act in range(len(start))]
+
+    def before(i, j):
+        return (start[i], i) < (start[j], j)
+
+    for act in range(len(start)):
+        block.start[act].value = start[act]
+        block.fin[act].value = fin[act]
+
+    for i, j in block.x:
+        block.x[i, j].value = int(before(i, j))
+
+    # z[i, j] = 1 if j starts before i or i is still running when j starts
+    for i, j in block.z:
+        block.z[i, j].value = int(before(j, i) or fin[i] > start[j])
@@ -1,22 +1,18 @@
+from rcpsp.heuristics.cpm import backward_pass
+
+
 class BackwardRecursion:
- 
+
     def __init__(self, n, upper_bound, act_pre, act_proc):
         self.act_pre = act_pre
         self.act_proc = act_proc
         self.n = n
+        self.upper_bound = upper_bound
         self.lst = {}
-        self.lst[n] = upper_bound
         self.lft = {}
-        self.visited = []
-    
-    def __get_latest_starting_time(self, act):
-        for pre in self.act_pre[act]:
-            if pre not in self.visited:
-                self.visited.append(pre)
-                self.lst[pre] = self.lst[act] - self.act_proc[pre]
-                self.__get_latest_starting_time(pre)
 
     def get_latest_times(self):
-        self.__get_latest_starting_time(self.n)
-        self.lft = {act : val + self.act_proc[act] for act, val in self.lst.items()}
-        return self.lst, self.lft
\ No newline at end of file
+        lst, lft = backward_pass(self.act_pre, [self.act_proc[act] for act in range(self.n + 1)], self.upper_bound)
+        self.lst = {act: val for act, val in enumerate(lst.tolist())}
+        self.lft = {act: val for act, val in enumerate(lft.tolist())}
+        return self.lst, self.lft
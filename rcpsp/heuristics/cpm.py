@@ -0,0 +1,110 @@
+'''
+Critical path method.
+
+Earliest and latest start and finish times are computed with one forward and one
+backward pass over an explicit topological order, in O(V + E) and without recursion.
+
+Durations may be a single vector of n + 2 processing times or a matrix with one
+duration vector per row. In the batched case every pass is vectorized over the
+rows, so time windows of thousands of duration realizations are computed at once.
+'''
+
+import numpy as np
+
+
+def topological_order(act_pre):
+    '''
+    Activities ordered so that every activity comes after all its predecessors.
+    act_pre is indexed by activity 0, ..., n + 1 and holds predecessor lists.
+    '''
+    size = len(act_pre)
+    successors = [[] for _ in range(size)]
+    pending = [0] * size
+    for act in range(size):
+        for pre in act_pre[act]:
+            successors[pre].append(act)
+            pending[act] += 1
+
+    order = [act for act in range(size) if pending[act] == 0]
+    for act in order:
+        for succ in successors[act]:
+            pending[succ] -= 1
+            if pending[succ] == 0:
+                order.append(succ)
+
+    if len(order) != size:
+        raise ValueError('Precedence graph contains a cycle')
+
+    return order
+
+
+def __as_batch(act_proc):
+    act_proc = np.asarray(act_proc)
+    return act_proc.reshape(1, -1) if act_proc.ndim == 1 else act_proc
+
+
+def forward_pass(act_pre, act_proc, order=None):
+    '''
+    Earliest start and finish times. Returns arrays shaped like act_proc.
+    '''
+    durations = __as_batch(act_proc)
+    if order is None:
+        order = topological_order(act_pre)
+
+    est = np.zeros(durations.shape, dtype=durations.dtype)
+    eft = np.zeros(durations.shape, dtype=durations.dtype)
+    for act in order:
+        preds = act_pre[act]
+        if len(preds):
+            est[:, act] = eft[:, preds].max(axis=1)
+        eft[:, act] = est[:, act] + durations[:, act]
+
+    shape = np.shape(act_proc)
+    return est.reshape(shape), eft.reshape(shape)
+
+
+def backward_pass(act_pre, act_proc, horizon, order=None):
+    '''
+    Latest start and finish times for a project deadline (horizon).
+    The horizon may be a scalar or one deadline per duration vector.
+    Every activity finishes before the minimum latest start of all its successors.
+    '''
+    durations = __as_batch(act_proc)
+    if order is None:
+        order = topological_order(act_pre)
+
+    successors = [[] for _ in range(durations.shape[1])]
+    for act in range(durations.shape[1]):
+        for pre in act_pre[act]:
+            successors[pre].append(act)
+
+    horizon = np.broadcast_to(np.asarray(horizon, dtype=durations.dtype), durations.shape[:1])
+    lst = np.zeros(durations.shape, dtype=durations.dtype)
+    lft = np.zeros(durations.shape, dtype=durations.dtype)
+    for act in reversed(order):
+        succs = successors[act]
+        lft[:, act] = lst[:, succs].min(axis=1) if succs else horizon
+        lst[:, act] = lft[:, act] - durations[:, act]
+
+    shape = np.shape(act_proc)
+    return lst.reshape(shape), lft.reshape(shape)
+
+
+def time_windows(project, horizon=None, act_proc=None):
+    '''
+    est, eft, lst and lft of an Instance.
+    Nominal durations are used unless act_proc is given (one vector or a matrix of vectors)
+    and the horizon defaults to the critical path length.
+    '''
+    if act_proc is None:
+        act_proc = project.act_proc
+
+    act_pre = [project.predecessors(act) for act in range(project.act_count + 2)]
+    order = project.topological_order()
+
+    est, eft = forward_pass(act_pre, act_proc, order)
+    if horizon is None:
+        horizon = eft[..., project.sink]
+
+    lst, lft = backward_pass(act_pre, act_proc, horizon, order)
+    return est, eft, lst, lft
@@ -1,7 +1,8 @@
+from rcpsp.heuristics.cpm import forward_pass
+
+
 def get_earliest_times(n, act_pre, act_proc):
-    est = {}
-    for act in range(n + 1):
-        est[act] = max((est[pre] + act_proc[pre]
-                    for pre in act_pre[act]), default=0)
-    eft = {act : val + act_proc[act] for act, val in est.items()}
-    return est, eft
\ No newline at end of file
+    est, eft = forward_pass(act_pre, [act_proc[act] for act in range(n + 1)])
+    est = {act: val for act, val in enumerate(est.tolist())}
+    eft = {act: val for act, val in enumerate(eft.tolist())}
+    return est, eft
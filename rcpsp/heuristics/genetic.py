@@ -0,0 +1,165 @@
+'''
+Genetic algorithm over activity lists with forward-backward improvement.
+
+Every individual is a precedence feasible activity list decoded with the serial
+schedule generation scheme. Each decoded schedule is justified to the right and
+back to the left (forward-backward improvement), which never increases the makespan,
+and the list is replaced by the order of the improved start times.
+
+Children are created with the two-point crossover and the adjacent swap mutation
+of Hartmann (1998) and the best individuals of parents and children survive.
+Several islands evolve independently on a process pool and send their best list
+to the next island after every epoch. With a generation budget the result only
+depends on the seed and the number of islands, a time limit stops after the
+first epoch that exceeds it.
+'''
+
+import contextlib
+import multiprocessing
+import time
+
+import numpy as np
+
+from rcpsp.heuristics.portfolio import RULES, biased_activity_list, makespan, priority_values
+from rcpsp.heuristics.sgs import activity_list_from_priority, serial_sgs
+
+POPULATION = 40
+MUTATION_RATE = 0.05
+
+# Generations every island runs between two migrations
+EPOCH = 10
+
+
+def justify(project, activity_list, act_proc=None):
+    '''
+    Forward-backward improvement of the serial schedule of an activity list.
+    Returns (makespan, start, activity_list) where the list follows the improved start times.
+    '''
+    durations = (project.act_proc if act_proc is None else act_proc).tolist()
+    position = [0] * len(activity_list)
+    for index, act in enumerate(activity_list):
+        position[act] = index
+    start = serial_sgs(project, activity_list, act_proc)
+
+    # Ties are broken by the position in the previous list so both lists stay precedence feasible
+    backward_list = sorted(activity_list, key=lambda act: (-start[act] - durations[act], -position[act]))
+    for index, act in enumerate(backward_list):
+        position[act] = index
+    start = serial_sgs(project, backward_list, act_proc, backward=True)
+
+    forward_list = sorted(activity_list, key=lambda act: (start[act], -position[act]))
+    start = serial_sgs(project, forward_list, act_proc)
+
+    return makespan(project, start, durations), start, forward_list
+
+
+def crossover(mother, father, rng):
+    '''
+    Two-point crossover. Positions up to q1 come from the mother, up to q2 from the
+    father and the rest from the mother, always in the relative order of the parent.
+    '''
+    q1, q2 = sorted(rng.integers(0, len(mother) + 1, size=2).tolist())
+    daughter = mother[:q1]
+    taken = set(daughter)
+
+    for parent, stop in ((father, q2), (mother, len(mother))):
+        for act in parent:
+            if len(daughter) == stop:
+                break
+            if act not in taken:
+                daughter.append(act)
+                taken.add(act)
+
+    return daughter
+
+
+def mutate(project, activity_list, rng):
+    '''
+    Swap neighbouring activities with probability MUTATION_RATE unless the first
+    is a predecessor of the second. Neighbours can only be related by a direct arc.
+    '''
+    for index in np.flatnonzero(rng.random(len(activity_list) - 1) < MUTATION_RATE).tolist():
+        first, second = activity_list[index], activity_list[index + 1]
+        if first not in project.predecessors(second):
+            activity_list[index], activity_list[index + 1] = second, first
+
+    return activity_list
+
+
+def initial_population(project, size, rng, act_proc=None):
+    '''
+    Priority rule lists completed with regret based biased random sampling.
+    '''
+    lists = [activity_list_from_priority(project, priority_values(project, rule, act_proc)) for rule in RULES]
+    lft = priority_values(project, 'LFT', act_proc)
+    while len(lists) < size:
+        lists.append(biased_activity_list(project, lft, rng))
+
+    return [justify(project, activity_list, act_proc) for activity_list in lists[:size]]
+
+
+def evolve(project, population, generations, rng, deadline=None, act_proc=None):
+    '''
+    Run a number of generations on one island. Individuals are (makespan, start, activity_list).
+    '''
+    size = len(population)
+    for _ in range(generations):
+        if deadline is not None and time.time() > deadline:
+            break
+
+        order = rng.permutation(size).tolist()
+        children = []
+        for mother, father in zip(order[::2], order[1::2]):
+            for first, second in ((mother, father), (father, mother)):
+                child = crossover(population[first][2], population[second][2], rng)
+                children.append(justify(project, mutate(project, child, rng), act_proc))
+
+        # Ranking selection, parents win ties
+        population = sorted(population + children, key=lambda individual: individual[0])[:size]
+
+    return population
+
+
+def __island_task(task):
+    project, population, generations, rng, deadline, act_proc = task
+    return evolve(project, population, generations, rng, deadline, act_proc), rng
+
+
+def improve(project, generations=50, population=POPULATION, islands=1, timelimit=None, seed=None,
+            act_proc=None, initial=None):
+    '''
+    Best (makespan, start, activity_list) found by the genetic algorithm.
+    initial optionally adds activity lists, e.g. from a previous heuristic, to every island.
+    '''
+    if act_proc is not None:
+        act_proc = np.asarray(act_proc, dtype=np.int32)
+    deadline = None if timelimit is None else time.time() + timelimit
+
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(islands)]
+    populations = []
+    for rng in rngs:
+        individuals = initial_population(project, population, rng, act_proc)
+        for activity_list in initial or []:
+            individuals.append(justify(project, list(activity_list), act_proc))
+        populations.append(sorted(individuals, key=lambda individual: individual[0])[:population])
+
+    # One process per island, the pool is shut down on errors as well
+    with multiprocessing.Pool(islands) if islands > 1 else contextlib.nullcontext() as pool:
+        for done in range(0, generations, EPOCH):
+            tasks = [(project, populations[i], min(EPOCH, generations - done), rngs[i], deadline, act_proc)
+                     for i in range(islands)]
+            results = pool.map(__island_task, tasks) if pool else list(map(__island_task, tasks))
+            populations = [island for island, _ in results]
+            rngs = [rng for _, rng in results]
+
+            # Ring migration, the best individual replaces the worst of the next island
+            if islands > 1:
+                best = [island[0] for island in populations]
+                for i in range(islands):
+                    populations[i][-1] = best[i - 1]
+                    populations[i].sort(key=lambda individual: individual[0])
+
+            if deadline is not None and time.time() > deadline:
+                break
+
+    return min((island[0] for island in populations), key=lambda individual: individual[0])
@@ -0,0 +1,149 @@
+'''
+Multi-pass priority rule portfolio.
+
+Every deterministic rule is decoded once with the serial and the parallel
+schedule generation scheme. Regret based biased random sampling around the
+LFT rule adds any number of randomized passes, which can be spread over a
+process pool. The best schedule found is returned.
+
+Priorities are values per activity where the lowest value is scheduled first,
+rules that prefer large values are negated.
+'''
+
+import multiprocessing
+
+import numpy as np
+
+from rcpsp.heuristics.cpm import time_windows
+from rcpsp.heuristics.sgs import activity_list_from_priority, parallel_sgs, serial_sgs
+from rcpsp.preprocessing.closure import transitive_closure
+
+RULES = ('LFT', 'LST', 'MTS', 'GRPW', 'WRUP')
+SCHEMES = ('serial', 'parallel')
+
+# Weight of the successor count in WRUP
+WRUP_WEIGHT = 0.7
+
+# Bias of the random sampling towards the LFT rule
+SAMPLING_ALPHA = 1.0
+
+
+def priority_values(project, rule, act_proc=None):
+    '''
+    Priority value of every activity for one of the rules in RULES.
+    '''
+    durations = project.act_proc if act_proc is None else np.asarray(act_proc)
+
+    if rule in ('LFT', 'LST'):
+        est, eft, lst, lft = time_windows(project, act_proc=durations)
+        return (lft if rule == 'LFT' else lst).tolist()
+
+    if rule == 'MTS':
+        # Most total successors
+        return (-transitive_closure(project).sum(axis=1)).tolist()
+
+    if rule == 'GRPW':
+        # Greatest rank positional weight: own and immediate successors' durations
+        weights = [durations[act] + durations[project.successors(act)].sum()
+                   for act in range(project.act_count + 2)]
+        return [-int(weight) for weight in weights]
+
+    if rule == 'WRUP':
+        # Weighted resource utilization and precedence
+        successors = np.diff(project.suc_ptr)
+        utilization = (project.r_cons / project.r_cap).sum(axis=1)
+        return (-(WRUP_WEIGHT * successors + (1 - WRUP_WEIGHT) * utilization)).tolist()
+
+    raise ValueError('Unknown priority rule ' + rule)
+
+
+def biased_activity_list(project, lft, rng):
+    '''
+    Regret based biased random sampling. An eligible activity is drawn with
+    probability proportional to (max eligible lft - own lft + 1) ^ alpha.
+    '''
+    pending = np.diff(project.pre_ptr).tolist()
+    eligible = [act for act in range(project.act_count + 2) if pending[act] == 0]
+
+    activity_list = []
+    while eligible:
+        latest = max(lft[act] for act in eligible)
+        weights = np.array([(latest - lft[act] + 1) ** SAMPLING_ALPHA for act in eligible], dtype=float)
+        act = eligible.pop(rng.choice(len(eligible), p=weights / weights.sum()))
+
+        activity_list.append(act)
+        for succ in project.successors(act).tolist():
+            pending[succ] -= 1
+            if pending[succ] == 0:
+                eligible.append(succ)
+
+    return activity_list
+
+
+def decode(project, activity_list, scheme, act_proc=None):
+    if scheme == 'serial':
+        return serial_sgs(project, activity_list, act_proc)
+
+    position = [0] * len(activity_list)
+    for index, act in enumerate(activity_list):
+        position[act] = index
+    return parallel_sgs(project, position, act_proc)
+
+
+def makespan(project, start, act_proc=None):
+    durations = project.act_proc if act_proc is None else act_proc
+    return int(start[project.sink] + durations[project.sink])
+
+
+def sampling_passes(project, passes, seed, schemes=SCHEMES, act_proc=None):
+    '''
+    Best (makespan, start, rule) over a number of biased random sampling passes.
+    '''
+    rng = np.random.default_rng(seed)
+    lft = priority_values(project, 'LFT', act_proc)
+
+    best = None
+    for _ in range(passes):
+        activity_list = biased_activity_list(project, lft, rng)
+        for scheme in schemes:
+            start = decode(project, activity_list, scheme, act_proc)
+            candidate = (makespan(project, start, act_proc), start, 'sampling/' + scheme)
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+
+    return best
+
+
+def __sampling_task(task):
+    return sampling_passes(*task)
+
+
+def run_portfolio(project, rules=RULES, passes=0, schemes=SCHEMES, workers=1, seed=None, act_proc=None):
+    '''
+    Best (makespan, start, rule) over all rules and schemes plus the random sampling passes.
+    Sampling is split into one chunk per worker with independent seeds, so results
+    only depend on the seed and the number of workers.
+    '''
+    if act_proc is not None:
+        act_proc = np.asarray(act_proc, dtype=np.int32)
+
+    results = []
+    for rule in rules:
+        activity_list = activity_list_from_priority(project, priority_values(project, rule, act_proc))
+        for scheme in schemes:
+            start = decode(project, activity_list, scheme, act_proc)
+            results.append((makespan(project, start, act_proc), start, rule + '/' + scheme))
+
+    if passes > 0:
+        workers = max(1, min(workers, passes))
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        tasks = [(project, passes // workers + (1 if w < passes % workers else 0), seeds[w], schemes, act_proc)
+                 for w in range(workers)]
+
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                results.extend(pool.map(__sampling_task, tasks))
+        else:
+            results.extend(map(__sampling_task, tasks))
+
+    return min(results, key=lambda result: result[0])
@@ -0,0 +1,64 @@
+class ResourceProfile:
+    '''
+    Remaining capacity of every renewable resource over a discrete time horizon.
+
+    Capacities are stored as one array per resource indexed by period, so placing
+    an activity only touches the periods it occupies. An activity that starts at
+    period t with processing time p occupies periods t, ..., t + p - 1.
+    '''
+
+    def __init__(self, r_cap, horizon):
+        self.r_cap = r_cap
+        self.horizon = horizon
+        self.free = {k: [cap] * horizon for k, cap in r_cap.items()}
+
+    def __extend(self, horizon):
+        for k, cap in self.r_cap.items():
+            self.free[k].extend([cap] * (horizon - self.horizon))
+        self.horizon = horizon
+
+    def last_conflict(self, t, p, demand):
+        '''
+        Return the latest period in [t, t + p) in which the demand does not fit,
+        or -1 if the activity can be placed at t.
+        '''
+        if t + p > self.horizon:
+            self.__extend(t + p)
+
+        for moment in range(t + p - 1, t - 1, -1):
+            for k, units in demand:
+                if self.free[k][moment] < units:
+                    return moment
+
+        return -1
+
+    def earliest_start(self, t, latest, p, demand):
+        '''
+        Earliest resource feasible start time in [t, latest] or None.
+        On a conflict the search jumps past the conflicting period.
+        '''
+        while t <= latest:
+            conflict = self.last_conflict(t, p, demand)
+            if conflict < 0:
+                return t
+            t = conflict + 1
+
+        return None
+
+    def reserve(self, t, p, demand):
+        if t + p > self.horizon:
+            self.__extend(t + p)
+
+        for k, units in demand:
+            free = self.free[k]
+            for moment in range(t, t + p):
+                free[moment] -= units
+
+    def release(self, t, p, demand):
+        '''
+        Undo a reservation, e.g. when a search backtracks.
+        '''
+        for k, units in demand:
+            free = self.free[k]
+            for moment in range(t, t + p):
+                free[moment] += units
@@ -1,59 +1,184 @@
-from pkg_resources import safe_version
-import random
+'''
+Schedule generation schemes on an Instance.
+
+Activity lists are precedence feasible orderings of all n + 2 activities and priorities
+are values per activity where the lowest value is scheduled first. Both schemes return
+the start times of all activities and never exceed a time window, the resource profile
+grows with the schedule. Processing times default to the nominal ones.
+'''
+
+import heapq
+import math
+
+from rcpsp.heuristics.resource_profile import ResourceProfile
+
+
+def serial_schedule_generation(n, p, preds, r_count, r_cons, r_cap, lft, use_pr=False, return_schedule=False):
+    '''
+    Makespan of the serial schedule or None if an activity could not be scheduled within its lft.
+    With return_schedule the start times of all activities are returned as well.
+    '''
+
+    source = 0
+    sink = n + 1
+
+    # Number of unscheduled predecessors of every activity
+    succs = {j: [] for j in range(sink + 1)}
+    pending = {}
+    for j in range(1, sink + 1):
+        pending[j] = len(preds[j])
+        for pre in preds[j]:
+            succs[pre].append(j)
+
+    # Only resources actually requested by an activity are checked
+    demand = {j: [(k, r_cons[j, k]) for k in range(1, r_count + 1) if r_cons[j, k] > 0]
+              for j in range(1, sink + 1)}
+
+    profile = ResourceProfile(r_cap, max(lft.values()))
 
-def serial_schedule_generation(n, p, preds, r_count, r_cons, r_cap, lft, use_pr=False):
-    
-    eft = {}    
     fin = {}
-    scheduled = []
-    
-    fin[0] = 0
-    scheduled.append(0)
+    fin[source] = 0
 
-    for g in range(n + 1):
+    for succ in succs[source]:
+        pending[succ] -= 1
+    eligible_activities = [j for j in range(1, sink + 1) if pending[j] == 0]
 
-        eligible_activities = [j for j in range(1, n + 2) if j not in scheduled and set(
-            preds[j]) <= set(scheduled)]
+    for g in range(n + 1):
 
         if not eligible_activities:
             print('No feasible schedule could be structured.')
             break
 
         # For the min-lft priority rule
-        pr = {i: lft[i] for i in eligible_activities}
+        if use_pr:
+            candidates = sorted(eligible_activities, key=lambda j: (lft[j], j))
+        else:
+            candidates = sorted(eligible_activities)
+
+        for j in candidates:
+            est = max((fin[pre] for pre in preds[j]), default=0)
+            start = profile.earliest_start(est, lft[j] - p[j], p[j], demand[j])
 
-        while eligible_activities:
-            
-            if use_pr:
-                j = min(pr, key=pr.get)
+            if start is not None:
+                fin[j] = start + p[j]
+                profile.reserve(start, p[j], demand[j])
                 eligible_activities.remove(j)
-            else:
-                j = eligible_activities.pop(0)
-            
-            eft[j] = max((fin[pre] for pre in preds[j]), default=0) + p[j]
-
-            eligible_times = []
-            for t in range(eft[j] - p[j], lft[j] - p[j] + 1):
-                if t in fin.values():
-                    is_eligible = True
-                    for k in range(1, r_count + 1):
-                        for moment in range(t, t + p[j] + 1):
-                            active = __get_active_jobs(moment, scheduled, fin, p)
-                            if r_cons[j, k] > r_cap[k] - sum(r_cons[act_j, k] for act_j in active):
-                                is_eligible = False
-                                break
-
-                    if is_eligible:
-                        eligible_times.append(t)
-
-            if eligible_times:
-                fin[j] = min(eligible_times) + p[j]
-                scheduled.append(j)
+                for succ in succs[j]:
+                    pending[succ] -= 1
+                    if pending[succ] == 0:
+                        eligible_activities.append(succ)
                 break
-            
+        else:
+            print('No feasible schedule could be structured.')
+            break
+
     #print('SGS upper bound:' + str(fin[n+1]))
-    return fin[n + 1]
+    if return_schedule:
+        return fin.get(n + 1), {j: fin[j] - p[j] for j in fin}
+
+    return fin.get(n + 1)
+
+
+def __schedule_data(project, act_proc):
+    p = (project.act_proc if act_proc is None else act_proc).tolist()
+    preds = [project.predecessors(act).tolist() for act in range(project.act_count + 2)]
+    demand = [[(k, units) for k, units in enumerate(cons) if units > 0] for cons in project.r_cons.tolist()]
+    profile = ResourceProfile(dict(enumerate(project.r_cap.tolist())), max(sum(p), 1))
+    return p, preds, demand, profile
+
+
+def activity_list_from_priority(project, priority):
+    '''
+    Precedence feasible activity list that always takes the eligible activity with the lowest priority.
+    '''
+    pending = (project.pre_ptr[1:] - project.pre_ptr[:-1]).tolist()
+    eligible = [(priority[act], act) for act in range(project.act_count + 2) if pending[act] == 0]
+    heapq.heapify(eligible)
+
+    activity_list = []
+    while eligible:
+        _, act = heapq.heappop(eligible)
+        activity_list.append(act)
+        for succ in project.successors(act).tolist():
+            pending[succ] -= 1
+            if pending[succ] == 0:
+                heapq.heappush(eligible, (priority[succ], succ))
+
+    return activity_list
+
+
+def serial_sgs(project, activity_list, act_proc=None, backward=False):
+    '''
+    Serial scheme. Activities are taken in list order and started as early as
+    precedence and resource availability allow.
+    A backward pass schedules the list on the reversed precedence graph, so every
+    activity finishes as late as possible. The returned schedule still starts at zero.
+    '''
+    # Such an activity never fits the profile, the search for its start would not end
+    if (project.r_cons > project.r_cap).any():
+        raise ValueError('Resource demand of an activity exceeds the resource capacity')
+
+    p, preds, demand, profile = __schedule_data(project, act_proc)
+    if backward:
+        preds = [project.successors(act).tolist() for act in range(project.act_count + 2)]
+    start = [0] * (project.act_count + 2)
+
+    for j in activity_list:
+        est = max((start[pre] + p[pre] for pre in preds[j]), default=0)
+        start[j] = profile.earliest_start(est, math.inf, p[j], demand[j])
+        profile.reserve(start[j], p[j], demand[j])
+
+    if backward:
+        horizon = max(s + d for s, d in zip(start, p))
+        start = [horizon - s - d for s, d in zip(start, p)]
+
+    return start
+
+
+def parallel_sgs(project, priority, act_proc=None):
+    '''
+    Parallel scheme. Time advances over finish times and at every decision point
+    the eligible activities are started in priority order while resources last.
+    '''
+    p, preds, demand, profile = __schedule_data(project, act_proc)
+    start = [None] * (project.act_count + 2)
+    pending = [len(pre) for pre in preds]
+    succs = [project.successors(act).tolist() for act in range(project.act_count + 2)]
+
+    # Activities whose predecessors have been scheduled, with the time they are released
+    released = {act: 0 for act in range(project.act_count + 2) if pending[act] == 0}
+    finish_times = [0]
+    scheduled = 0
+
+    while scheduled < project.act_count + 2:
+        if not finish_times:
+            raise ValueError('Resource demand of an activity exceeds the resource capacity')
+
+        t = heapq.heappop(finish_times)
+        while finish_times and finish_times[0] == t:
+            heapq.heappop(finish_times)
+
+        eligible = sorted((act for act, release in released.items() if release <= t),
+                          key=lambda act: (priority[act], act))
+
+        for j in eligible:
+            if profile.last_conflict(t, p[j], demand[j]) >= 0:
+                continue
+
+            start[j] = t
+            profile.reserve(t, p[j], demand[j])
+            scheduled += 1
+            del released[j]
+            heapq.heappush(finish_times, t + p[j])
+
+            for succ in succs[j]:
+                pending[succ] -= 1
+                if pending[succ] == 0:
+                    released[succ] = max(start[pre] + p[pre] for pre in preds[succ])
+                    heapq.heappush(finish_times, released[succ])
 
+            # Zero duration activities release their successors at the same decision point
+            if p[j] == 0:
+                heapq.heappush(finish_times, t)
 
-def __get_active_jobs(t, scheduled, fin, p):
-    return [s for s in scheduled if fin[s] > t and fin[s] - p[s] <= t]
+    return start
@@ -0,0 +1,53 @@
+'''
+Heuristic upper bound of the solvers.
+
+The serial schedule generation scheme on the latest finish times of the trivial
+upper bound, the sum of all durations, gives a first schedule. The priority rule
+portfolio and the genetic algorithm can tighten it. The best makespan bounds the
+time windows of the models and its schedule is their warm start.
+'''
+
+from rcpsp.heuristics.backward_recursion import BackwardRecursion
+from rcpsp.heuristics.genetic import improve
+from rcpsp.heuristics.portfolio import run_portfolio
+from rcpsp.heuristics.sgs import serial_schedule_generation
+from rcpsp.profiling import Profiler
+
+
+def heuristic_upper_bound(project, portfolio_passes=None, improve_generations=None, islands=1, improve_timelimit=None,
+                          act_proc=None, profiler=None):
+    '''
+    Makespan and start times of the best heuristic schedule for the durations act_proc,
+    a list per activity, the nominal durations by default. No portfolio or genetic
+    algorithm runs for None passes or generations, islands and improve_timelimit are
+    passed to the genetic algorithm. A profiler times the sgs, portfolio and improve phases.
+    '''
+    profiler = profiler or Profiler(enabled=False)
+    sink = project.sink
+    data = project.to_data()
+    act_pre = data['act_pre']
+    if act_proc is None:
+        act_proc = project.act_proc.tolist()
+    durations = {act: act_proc[act] for act in range(sink + 1)}
+
+    with profiler.phase('sgs'):
+        _, lft_init = BackwardRecursion(sink, sum(durations.values()), act_pre, durations).get_latest_times()
+        upper_bound, schedule = serial_schedule_generation(
+            project.act_count, durations, act_pre, project.r_count, data['r_cons'], data['r_cap'], lft_init,
+            return_schedule=True)
+
+    if portfolio_passes is not None:
+        with profiler.phase('portfolio'):
+            makespan, start, _ = run_portfolio(project, passes=portfolio_passes, seed=0, act_proc=list(act_proc))
+        if makespan < upper_bound:
+            upper_bound, schedule = makespan, start
+
+    # Forward-backward improvement and the genetic algorithm
+    if improve_generations is not None:
+        with profiler.phase('improve'):
+            makespan, start, _ = improve(project, generations=improve_generations, islands=islands,
+                                         timelimit=improve_timelimit, seed=0, act_proc=list(act_proc))
+        if makespan < upper_bound:
+            upper_bound, schedule = makespan, start
+
+    return upper_bound, schedule
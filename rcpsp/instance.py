@@ -0,0 +1,198 @@
+'''
+Compact in-memory representation of a single mode RCPSP instance.
+
+Activities are numbered 0, ..., act_count + 1 where 0 and act_count + 1 are the
+dummy source and sink. Both have zero duration and consume no resources.
+Resources are numbered 1, ..., r_count in the Pyomo models and stored in
+column k - 1 of the consumption matrix.
+'''
+
+import json
+import os
+
+import numpy as np
+
+from rcpsp.heuristics.cpm import topological_order
+
+INSTANCE_DIR = 'data/instances/json/{instance_dir}/'
+
+
+class Instance:
+
+    __slots__ = ('name', 'act_count', 'r_count', 'act_proc', 'r_cons', 'r_cap',
+                 'pre_ptr', 'pre_idx', 'suc_ptr', 'suc_idx')
+
+    def __init__(self, act_count, r_count, act_proc, r_cons, r_cap, act_pre, name=None):
+        '''
+        act_proc: processing times of all n + 2 activities
+        r_cons: (n + 2) x R resource consumption matrix
+        r_cap: capacities of the R resources
+        act_pre: predecessor list of every activity
+        '''
+        self.name = name
+        self.act_count = int(act_count)
+        self.r_count = int(r_count)
+        self.act_proc = np.asarray(act_proc, dtype=np.int32)
+        self.r_cons = np.asarray(r_cons, dtype=np.int32).reshape(self.act_count + 2, self.r_count)
+        self.r_cap = np.asarray(r_cap, dtype=np.int32)
+
+        # Predecessor adjacency in compressed sparse row form
+        counts = np.fromiter((len(act_pre[j]) for j in range(self.act_count + 2)),
+                             dtype=np.int32, count=self.act_count + 2)
+        self.pre_ptr = np.zeros(self.act_count + 3, dtype=np.int32)
+        np.cumsum(counts, out=self.pre_ptr[1:])
+        self.pre_idx = np.fromiter((pre for j in range(self.act_count + 2) for pre in act_pre[j]),
+                                   dtype=np.int32, count=int(self.pre_ptr[-1]))
+
+        self._index_successors()
+
+    def _index_successors(self):
+        # Successor adjacency is the transpose of the predecessor one
+        counts = np.diff(self.pre_ptr)
+        targets = np.repeat(np.arange(self.act_count + 2, dtype=np.int32), counts)
+        order = np.argsort(self.pre_idx, kind='stable')
+        self.suc_idx = targets[order]
+        self.suc_ptr = np.zeros(self.act_count + 3, dtype=np.int32)
+        np.cumsum(np.bincount(self.pre_idx, minlength=self.act_count + 2), out=self.suc_ptr[1:])
+
+    @property
+    def source(self):
+        return 0
+
+    @property
+    def sink(self):
+        return self.act_count + 1
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, attr).nbytes for attr in
+                   ('act_proc', 'r_cons', 'r_cap', 'pre_ptr', 'pre_idx', 'suc_ptr', 'suc_idx'))
+
+    def predecessors(self, act):
+        return self.pre_idx[self.pre_ptr[act]:self.pre_ptr[act + 1]]
+
+    def successors(self, act):
+        return self.suc_idx[self.suc_ptr[act]:self.suc_ptr[act + 1]]
+
+    def topological_order(self):
+        '''
+        Activities ordered so that every activity comes after all its predecessors.
+        '''
+        return topological_order([self.predecessors(act) for act in range(self.act_count + 2)])
+
+    def edges(self):
+        '''
+        Precedence arcs as two aligned arrays of predecessors and successors.
+        '''
+        return self.pre_idx, np.repeat(np.arange(self.act_count + 2, dtype=np.int32), np.diff(self.pre_ptr))
+
+    @classmethod
+    def from_csr(cls, act_count, r_count, act_proc, r_cons, r_cap, pre_ptr, pre_idx, name=None):
+        '''
+        Build an instance directly from its arrays, e.g. views of a memory mapped cache.
+        '''
+        instance = cls.__new__(cls)
+        instance.name = name
+        instance.act_count = int(act_count)
+        instance.r_count = int(r_count)
+        instance.act_proc = act_proc
+        instance.r_cons = r_cons.reshape(instance.act_count + 2, instance.r_count)
+        instance.r_cap = r_cap
+        instance.pre_ptr = pre_ptr
+        instance.pre_idx = pre_idx
+        instance._index_successors()
+        return instance
+
+    @classmethod
+    def from_data(cls, data, name=None):
+        '''
+        Build an instance from the indexed dictionaries of a Pyomo data file.
+        The dummy source and sink may be missing from act_proc and r_cons.
+        '''
+        act_count = data['act_count']
+        r_count = data['r_count']
+        sink = act_count + 1
+
+        act_proc = np.zeros(sink + 1, dtype=np.int32)
+        for act, val in data['act_proc'].items():
+            act_proc[act] = val
+
+        r_cons = np.zeros((sink + 1, r_count), dtype=np.int32)
+        for (act, r), val in data['r_cons'].items():
+            r_cons[act, r - 1] = val
+
+        r_cap = np.array([data['r_cap'][r] for r in range(1, r_count + 1)], dtype=np.int32)
+
+        return cls(act_count, r_count, act_proc, r_cons, r_cap, data['act_pre'], name)
+
+    @classmethod
+    def from_json(cls, filename, name=None):
+        with open(filename, 'r') as fp:
+            raw = json.load(fp)
+
+        return cls.from_json_data(raw, name)
+
+    @classmethod
+    def from_json_data(cls, raw, name=None):
+        '''
+        Build an instance from the contents of a json instance file.
+        '''
+        data = {
+            'act_count': raw['act_count'],
+            'r_count': raw['r_count'],
+            'act_pre': {entry['index']: entry['value'] for entry in raw['act_pre']},
+            'r_cap': {entry['index']: entry['value'] for entry in raw['r_cap']},
+            'r_cons': {tuple(entry['index']): entry['value'] for entry in raw['r_cons']},
+            'act_proc': {entry['index']: entry['value'] for entry in raw['act_proc']}
+        }
+
+        return cls.from_data(data, name)
+
+    @classmethod
+    def load(cls, instance_dir, instance_name, use_cache=True):
+        '''
+        Load an instance from the PSPLIB json directory, e.g. load('j30', 'j301_1'),
+        or from the npz arrays of psplibconverter.py if there is no json file.
+        The binary cache of the set is used when it holds a current entry.
+        '''
+        if use_cache:
+            from rcpsp.instance_cache import cached_instance
+            instance = cached_instance(instance_dir, instance_name)
+            if instance is not None:
+                return instance
+
+        filename = INSTANCE_DIR.format(instance_dir=instance_dir) + instance_name
+        if not os.path.exists(filename + '.json') and os.path.exists(filename + '.npz'):
+            return cls.from_npz(filename + '.npz', instance_name)
+        return cls.from_json(filename + '.json', instance_name)
+
+    @classmethod
+    def from_npz(cls, filename, name=None):
+        '''
+        Build an instance from the arrays written by psplibconverter.py -f npz.
+        '''
+        with np.load(filename) as arrays:
+            return cls.from_csr(int(arrays['act_count']), int(arrays['r_count']),
+                                *(arrays[array] for array in ('act_proc', 'r_cons', 'r_cap', 'pre_ptr', 'pre_idx')),
+                                name=name)
+
+    def to_data(self):
+        '''
+        Indexed dictionaries in the shape the Pyomo models expect.
+        Scalar parameters are keyed by None as in a DataPortal, so the result
+        can be extended and passed to create_instance as {None: data}.
+        '''
+        act_set = range(self.act_count + 2)
+        r_set = range(1, self.r_count + 1)
+        act_proc = self.act_proc.tolist()
+        r_cons = self.r_cons.tolist()
+        r_cap = self.r_cap.tolist()
+
+        return {
+            'act_count': {None: self.act_count},
+            'r_count': {None: self.r_count},
+            'act_pre': {act: self.predecessors(act).tolist() for act in act_set},
+            'r_cap': {r: r_cap[r - 1] for r in r_set},
+            'r_cons': {(act, r): r_cons[act][r - 1] for act in act_set for r in r_set},
+            'act_proc': {act: act_proc[act] for act in act_set}
+        }
@@ -0,0 +1,320 @@
+'''
+Binary cache of preprocessed PSPLIB instances.
+
+Every instance set is stored under data/instances/cache/<set>/ as one flat .npy
+file per array, holding the arrays of all instances back to back, and an
+index.json with the offsets of every instance. The arrays are memory mapped on
+load so a batch worker can keep a whole set open without parsing it.
+
+Besides the raw instance the cache holds the precedence transitive closure and,
+for every combination of heuristic parameters it was built with, the time
+windows, the upper bound and the schedule of the nominal heuristics under
+windows/<heuristics>/. Entries are keyed by the SHA-1 of the source json file,
+so an edited instance is never served from a stale cache. The file is hashed
+once per process, its modification time and size tell whether it has to be
+hashed again.
+'''
+
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from rcpsp.heuristics.backward_recursion import BackwardRecursion
+from rcpsp.heuristics.forward_recursion import get_earliest_times
+from rcpsp.heuristics.upper_bound import heuristic_upper_bound
+from rcpsp.instance import INSTANCE_DIR, Instance
+from rcpsp.preprocessing.closure import transitive_closure
+
+CACHE_DIR = 'data/instances/cache/{instance_dir}/'
+WINDOWS_DIR = CACHE_DIR + 'windows/{heuristics}/'
+
+# Bump when the cached contents change meaning, e.g. a different SGS or closure
+CACHE_VERSION = 5
+
+# Arrays stored per instance and the length of each entry
+ARRAYS = ('act_proc', 'r_cons', 'r_cap', 'pre_ptr', 'pre_idx', 'closure')
+
+# Arrays stored per instance and heuristic parameters, all of them as long as act_proc
+WINDOWS = ('est', 'eft', 'lst', 'lft', 'start')
+
+# Open caches of the current process
+_caches = {}
+
+# Modification time, size and SHA-1 of every json file hashed by the current process
+_hashes = {}
+
+
+def file_stamp(filename):
+    '''
+    Modification time in nanoseconds and size of a file.
+    '''
+    stat = os.stat(filename)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def file_hash(filename):
+    '''
+    SHA-1 of a file, read again only when its modification time or size changed.
+    '''
+    stamp = file_stamp(filename)
+    known = _hashes.get(filename)
+    if known is None or known[0] != stamp:
+        with open(filename, 'rb') as fp:
+            known = _hashes[filename] = (stamp, hashlib.sha1(fp.read()).hexdigest())
+
+    return known[1]
+
+
+def heuristics_name(portfolio_passes=None, improve_generations=None):
+    '''
+    Directory name of the windows computed with these heuristic parameters.
+    '''
+    return 'portfolio_{passes}_improve_{generations}'.format(passes=portfolio_passes, generations=improve_generations)
+
+
+def preprocess(project, portfolio_passes=None, improve_generations=None):
+    '''
+    Time windows, upper bound and schedule of the nominal heuristics, computed as
+    the perfect knowledge solvers do.
+    '''
+    data = project.to_data()
+    act_pre = data['act_pre']
+    act_proc = data['act_proc']
+    sink = project.sink
+
+    est, eft = get_earliest_times(sink, act_pre, act_proc)
+
+    upper_bound, schedule = heuristic_upper_bound(project, portfolio_passes, improve_generations)
+
+    br = BackwardRecursion(sink, upper_bound, act_pre, act_proc)
+    lst, lft = br.get_latest_times()
+
+    def to_array(times):
+        return np.array([times[act] for act in range(sink + 1)], dtype=np.int32)
+
+    return {
+        'est': to_array(est),
+        'eft': to_array(eft),
+        'lst': to_array(lst),
+        'lft': to_array(lft),
+        'start': to_array(schedule),
+        'upper_bound': int(upper_bound)
+    }
+
+
+def build_cache(instance_dir, heuristics=((None, None),)):
+    '''
+    Parse and preprocess every json instance of a set and write its cache, with the
+    windows of every (portfolio_passes, improve_generations) pair in heuristics.
+    '''
+    cache_dir = CACHE_DIR.format(instance_dir=instance_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    chunks = {name: [] for name in ARRAYS}
+    offsets = {name: 0 for name in ARRAYS}
+    index = {}
+
+    filenames = sorted(glob.glob(INSTANCE_DIR.format(instance_dir=instance_dir) + '*.json'))
+    for filename in filenames:
+        instance_name = os.path.splitext(os.path.basename(filename))[0]
+        project = Instance.from_json(filename, instance_name)
+        arrays = {
+            'act_proc': project.act_proc,
+            'r_cons': project.r_cons.ravel(),
+            'r_cap': project.r_cap,
+            'pre_ptr': project.pre_ptr,
+            'pre_idx': project.pre_idx,
+            'closure': np.packbits(transitive_closure(project))
+        }
+
+        entry = {
+            'hash': file_hash(filename),
+            'size': file_stamp(filename)[1],
+            'act_count': project.act_count,
+            'r_count': project.r_count
+        }
+        for name in ARRAYS:
+            entry[name] = [offsets[name], offsets[name] + len(arrays[name])]
+            offsets[name] += len(arrays[name])
+            chunks[name].append(arrays[name])
+
+        index[instance_name] = entry
+
+    for name in ARRAYS:
+        dtype = np.uint8 if name == 'closure' else np.int32
+        values = np.concatenate(chunks[name]) if chunks[name] else np.zeros(0, dtype=dtype)
+        np.save(cache_dir + name + '.npy', values.astype(dtype, copy=False))
+
+    with open(cache_dir + 'index.json', 'w') as fp:
+        json.dump({'version': CACHE_VERSION, 'instances': index}, fp)
+
+    _caches.pop(instance_dir, None)
+
+    for portfolio_passes, improve_generations in heuristics:
+        build_windows(instance_dir, portfolio_passes, improve_generations)
+
+    return len(index)
+
+
+def build_windows(instance_dir, portfolio_passes=None, improve_generations=None):
+    '''
+    Add the windows of one combination of heuristic parameters to the cache of a set.
+    '''
+    cache = InstanceCache(instance_dir, mmap=False)
+    windows_dir = WINDOWS_DIR.format(instance_dir=instance_dir,
+                                     heuristics=heuristics_name(portfolio_passes, improve_generations))
+    os.makedirs(windows_dir, exist_ok=True)
+
+    chunks = {name: [] for name in WINDOWS}
+    index = {}
+
+    # Windows follow the act_proc offsets of the instance index
+    for instance_name in sorted(cache.index, key=lambda name: cache.index[name]['act_proc'][0]):
+        arrays = preprocess(cache.instance(instance_name), portfolio_passes, improve_generations)
+        for name in WINDOWS:
+            chunks[name].append(arrays[name])
+        index[instance_name] = {'hash': cache.index[instance_name]['hash'], 'upper_bound': arrays['upper_bound']}
+
+    for name in WINDOWS:
+        values = np.concatenate(chunks[name]) if chunks[name] else np.zeros(0, dtype=np.int32)
+        np.save(windows_dir + name + '.npy', values.astype(np.int32, copy=False))
+
+    with open(windows_dir + 'index.json', 'w') as fp:
+        json.dump({'version': CACHE_VERSION, 'instances': index}, fp)
+
+    _caches.pop(instance_dir, None)
+    return len(index)
+
+
+class InstanceCache:
+
+    def __init__(self, instance_dir, mmap=True):
+        cache_dir = CACHE_DIR.format(instance_dir=instance_dir)
+        with open(cache_dir + 'index.json', 'r') as fp:
+            index = json.load(fp)
+
+        self.instance_dir = instance_dir
+        self.mmap = mmap
+        self.valid = index['version'] == CACHE_VERSION
+        self.index = index['instances']
+        self.arrays = {name: np.load(cache_dir + name + '.npy', mmap_mode='r' if mmap else None)
+                       for name in ARRAYS}
+
+        # Windows of every combination of heuristic parameters, opened on first use
+        self.windows = {}
+
+    def __contains__(self, instance_name):
+        return self.valid and instance_name in self.index
+
+    def is_current(self, instance_name):
+        '''
+        True if the cached entry was built from the current json file.
+        '''
+        if instance_name not in self:
+            return False
+
+        filename = INSTANCE_DIR.format(instance_dir=self.instance_dir) + instance_name + '.json'
+        if not os.path.exists(filename):
+            return False
+
+        # A different size is a different file, no need to hash it
+        entry = self.index[instance_name]
+        return file_stamp(filename)[1] == entry['size'] and file_hash(filename) == entry['hash']
+
+    def __get(self, instance_name, name):
+        start, end = self.index[instance_name][name]
+        return self.arrays[name][start:end]
+
+    def instance(self, instance_name):
+        entry = self.index[instance_name]
+        return Instance.from_csr(entry['act_count'], entry['r_count'],
+                                 *(self.__get(instance_name, name) for name in
+                                   ('act_proc', 'r_cons', 'r_cap', 'pre_ptr', 'pre_idx')),
+                                 name=instance_name)
+
+    def closure(self, instance_name):
+        size = self.index[instance_name]['act_count'] + 2
+        bits = np.unpackbits(self.__get(instance_name, 'closure'), count=size * size)
+        return bits.reshape(size, size).astype(bool)
+
+    def __windows(self, heuristics):
+        if heuristics not in self.windows:
+            windows_dir = WINDOWS_DIR.format(instance_dir=self.instance_dir, heuristics=heuristics)
+            if not os.path.exists(windows_dir + 'index.json'):
+                self.windows[heuristics] = None
+            else:
+                with open(windows_dir + 'index.json', 'r') as fp:
+                    index = json.load(fp)
+                arrays = {name: np.load(windows_dir + name + '.npy', mmap_mode='r' if self.mmap else None)
+                          for name in WINDOWS}
+                self.windows[heuristics] = (index, arrays) if index['version'] == CACHE_VERSION else None
+
+        return self.windows[heuristics]
+
+    def time_windows(self, instance_name, portfolio_passes=None, improve_generations=None):
+        '''
+        est, eft, lst, lft, upper bound and schedule of the heuristics with these parameters
+        as the solvers use them, or None if they were not cached for the current json file.
+        '''
+        windows = self.__windows(heuristics_name(portfolio_passes, improve_generations))
+        if windows is None:
+            return None
+
+        index, arrays = windows
+        entry = index['instances'].get(instance_name)
+        if entry is None or entry['hash'] != self.index[instance_name]['hash']:
+            return None
+
+        start, end = self.index[instance_name]['act_proc']
+        est, eft, lst, lft = ({act: val for act, val in enumerate(arrays[name][start:end].tolist())}
+                              for name in ('est', 'eft', 'lst', 'lft'))
+        return est, eft, lst, lft, entry['upper_bound'], arrays['start'][start:end].tolist()
+
+
+def get_cache(instance_dir):
+    '''
+    Open cache of a set or None if the set has not been cached.
+    '''
+    if instance_dir not in _caches:
+        if not os.path.exists(CACHE_DIR.format(instance_dir=instance_dir) + 'index.json'):
+            return None
+        _caches[instance_dir] = InstanceCache(instance_dir)
+
+    return _caches[instance_dir]
+
+
+def cached_instance(instance_dir, instance_name):
+    '''
+    Instance from the cache of its set, or None if it is missing or stale.
+    '''
+    cache = get_cache(instance_dir)
+    if cache is None or not cache.is_current(instance_name):
+        return None
+
+    return cache.instance(instance_name)
+
+
+def cached_closure(instance_dir, instance_name):
+    '''
+    Transitive closure from the cache of its set, or None if it is missing or stale.
+    '''
+    cache = get_cache(instance_dir)
+    if cache is None or not cache.is_current(instance_name):
+        return None
+
+    return cache.closure(instance_name)
+
+
+def cached_windows(instance_dir, instance_name, portfolio_passes=None, improve_generations=None):
+    '''
+    Time windows, upper bound and schedule from the cache of its set, or None if they
+    are missing or stale, see InstanceCache.time_windows.
+    '''
+    cache = get_cache(instance_dir)
+    if cache is None or not cache.is_current(instance_name):
+        return None
+
+    return cache.time_windows(instance_name, portfolio_passes, improve_generations)
@@ -0,0 +1,226 @@
+'''
+Lower bounds on the makespan and time window reduction.
+
+LB0 is the critical path length and LB1 the largest total work of a resource over
+its capacity. LB2 is the critical sequence bound of Stinson, Davis and Khumawala
+(1978): the critical path is fixed at its earliest start times and every other
+activity is charged for the periods of its window in which it conflicts with the
+path activity running then. LB3 is the node packing bound of Mingozzi et al.
+(1998), the largest total duration of activities of which no two can run in
+parallel, found greedily.
+
+Energetic reasoning (Baptiste, Le Pape and Nuijten, 1999) compares, for every
+interval between two window bounds, the work that must be done inside the interval
+with the capacity of the interval. With a deadline on the makespan it also moves
+the est and lst of every activity that can not be shifted into an interval
+without overloading it. Adjustments are propagated over the precedence network
+until nothing changes. A deadline is infeasible when a window becomes empty or
+an interval is overloaded, so testing deadlines gives the destructive bound.
+
+Windows are propagated for the upper bound itself, so every schedule of at most
+that makespan, the heuristic one included, stays inside them.
+'''
+
+import numpy as np
+
+from rcpsp.heuristics.cpm import time_windows
+from rcpsp.preprocessing.closure import transitive_closure
+
+# Rounds of energetic reasoning and precedence propagation per deadline
+ROUNDS = 10
+
+
+def critical_path_bound(project, act_proc=None):
+    '''
+    LB0. Length of the longest path of the precedence network.
+    '''
+    est, eft, _, _ = time_windows(project, act_proc=act_proc)
+    return int(eft.max())
+
+
+def capacity_bound(project, act_proc=None):
+    '''
+    LB1. Total work of every resource over its capacity.
+    '''
+    act_proc = project.act_proc if act_proc is None else np.asarray(act_proc)
+    work = act_proc @ project.r_cons
+    return int(np.max(-(-work // project.r_cap), initial=0))
+
+
+def critical_sequence_bound(project, act_proc=None):
+    '''
+    LB2. Critical path length plus the largest delay an activity outside the path
+    forces when the path activities start at their earliest start times.
+    '''
+    act_proc = project.act_proc if act_proc is None else np.asarray(act_proc)
+    est, eft, lst, lft = time_windows(project, act_proc=act_proc)
+    length = int(eft.max())
+
+    # One critical path, followed back from the sink over predecessors that finish when it starts
+    path = []
+    act = project.sink
+    while len(project.predecessors(act)):
+        act = next(pre for pre in project.predecessors(act).tolist() if eft[pre] == est[act] and est[pre] == lst[pre])
+        path.append(act)
+    path = [act for act in path if act != project.source and act_proc[act] > 0]
+
+    # Path activity running in every period, -1 when there is none
+    running = np.full(length, -1)
+    for act in path:
+        running[est[act]:eft[act]] = act
+
+    # Activities that can run in parallel with a path activity
+    fits = ((project.r_cons[:, None, :] + project.r_cons[None, :, :]) <= project.r_cap).all(axis=2)
+
+    extra = 0
+    on_path = set(path)
+    for act in range(1, project.sink):
+        if act in on_path or act_proc[act] == 0:
+            continue
+
+        window = running[est[act]:lft[act]]
+        available = np.count_nonzero((window < 0) | fits[act, np.maximum(window, 0)])
+        extra = max(extra, int(act_proc[act]) - available)
+
+    return int(length + extra)
+
+
+def node_packing_bound(project, act_proc=None, closure=None):
+    '''
+    LB3. Greedy packing of activities that pairwise can not run in parallel, started
+    from every activity with the longest compatible activities added first.
+    '''
+    act_proc = project.act_proc if act_proc is None else np.asarray(act_proc)
+    if closure is None:
+        closure = transitive_closure(project)
+
+    exceeds = ((project.r_cons[:, None, :] + project.r_cons[None, :, :]) > project.r_cap).any(axis=2)
+    disjoint = (closure | closure.T | exceeds) & ~np.eye(len(act_proc), dtype=bool)
+
+    order = np.argsort(-act_proc, kind='stable')
+    best = 0
+    for seed in range(1, project.sink):
+        candidates = disjoint[seed].copy()
+        total = int(act_proc[seed])
+        for act in order.tolist():
+            if candidates[act]:
+                total += int(act_proc[act])
+                candidates &= disjoint[act]
+        best = max(best, total)
+
+    return best
+
+
+def __propagate_precedence(project, est, lst, act_proc, order):
+    for act in order:
+        for pre in project.predecessors(act).tolist():
+            est[act] = max(est[act], est[pre] + act_proc[pre])
+    for act in reversed(order):
+        for pre in project.predecessors(act).tolist():
+            lst[pre] = min(lst[pre], lst[act] - act_proc[pre])
+
+
+def energetic_windows(project, deadline, act_proc=None, est=None, lst=None, rounds=ROUNDS):
+    '''
+    est and lst of every activity after energetic reasoning for a makespan of at most
+    deadline, or None if no schedule meets the deadline.
+    '''
+    act_proc = (project.act_proc if act_proc is None else np.asarray(act_proc)).astype(np.int64)
+    r_cons = project.r_cons.astype(np.int64)
+    r_cap = project.r_cap.astype(np.int64)
+    if est is None or lst is None:
+        windows = time_windows(project, horizon=deadline, act_proc=act_proc)
+        est, lst = windows[0], windows[2]
+    est, lst = np.array(est, dtype=np.int64), np.array(lst, dtype=np.int64)
+    order = project.topological_order()
+
+    for _ in range(rounds):
+        if (est > lst).any():
+            return None
+
+        eft, lft = est + act_proc, lst + act_proc
+        ends = np.unique(np.concatenate((eft, lft)))
+        new_est, new_lst = est.copy(), lst.copy()
+
+        for t1 in np.unique(np.concatenate((est, lst))).tolist():
+            t2 = ends[ends > t1]
+            if not len(t2):
+                continue
+            length = (t2 - t1)[:, None]
+
+            # Work every activity must do inside [t1, t2)
+            overlap = np.maximum(0, np.minimum(np.minimum(length, act_proc), np.minimum(eft - t1, t2[:, None] - lst)))
+            slack = r_cap * length - overlap @ r_cons
+            if (slack < 0).any():
+                return None
+
+            # Capacity left for every activity by the others, per interval and resource
+            own = slack[:, None, :] + overlap[:, :, None] * r_cons
+            units = np.where(r_cons > 0, r_cons, 1)
+            room = own // units
+
+            # Work inside the interval when the activity starts at its est or at its lst
+            left = np.minimum(np.minimum(length, act_proc), np.maximum(0, eft - t1))
+            right = np.minimum(np.minimum(length, act_proc), np.maximum(0, t2[:, None] - lst))
+
+            pushed = (r_cons > 0) & (left[:, :, None] * r_cons > own)
+            if pushed.any():
+                bound = np.where(pushed, t2[:, None, None] - room, np.iinfo(np.int64).min)
+                new_est = np.maximum(new_est, bound.max(axis=(0, 2)))
+
+            pulled = (r_cons > 0) & (right[:, :, None] * r_cons > own)
+            if pulled.any():
+                bound = np.where(pulled, t1 + room - act_proc[None, :, None], np.iinfo(np.int64).max)
+                new_lst = np.minimum(new_lst, bound.min(axis=(0, 2)))
+
+        __propagate_precedence(project, new_est, new_lst, act_proc.tolist(), order)
+        if (new_est == est).all() and (new_lst == lst).all():
+            break
+        est, lst = new_est, new_lst
+
+    if (est > lst).any():
+        return None
+    return est, lst
+
+
+def energetic_bound(project, lower_bound, upper_bound, act_proc=None):
+    '''
+    Smallest deadline in [lower_bound, upper_bound] that energetic reasoning can not
+    rule out, found by bisection. upper_bound is returned if all smaller ones fail.
+    '''
+    while lower_bound < upper_bound:
+        deadline = (lower_bound + upper_bound) // 2
+        if energetic_windows(project, deadline, act_proc) is None:
+            lower_bound = deadline + 1
+        else:
+            upper_bound = deadline
+
+    return int(lower_bound)
+
+
+def bound_windows(project, upper_bound, act_proc=None, closure=None):
+    '''
+    Best lower bound and the est and lst of every activity, as lists of ints, for a makespan
+    of at most upper_bound. The windows are those of the precedence network if upper_bound is
+    not feasible for energetic reasoning, e.g. for a heuristic schedule of rounded durations.
+    '''
+    bounds = {
+        'LB0': critical_path_bound(project, act_proc),
+        'LB1': capacity_bound(project, act_proc),
+        'LB2': critical_sequence_bound(project, act_proc),
+        'LB3': node_packing_bound(project, act_proc, closure)
+    }
+    lower_bound = min(max(bounds.values()), upper_bound)
+    bounds['ER'] = energetic_bound(project, lower_bound, upper_bound, act_proc)
+
+    windows = energetic_windows(project, upper_bound, act_proc)
+    if windows is None:
+        est, _, lst, _ = time_windows(project, horizon=upper_bound, act_proc=act_proc)
+        windows = est, lst
+
+    # The project can not finish before the lower bound
+    lower_bound = max(bounds.values())
+    est, lst = [int(t) for t in windows[0]], [int(t) for t in windows[1]]
+    est[project.sink] = max(est[project.sink], min(lower_bound, lst[project.sink]))
+
+    return lower_bound, bounds, (est, lst)
@@ -0,0 +1,37 @@
+'''
+Precedence transitive closure.
+
+The ancestors of every activity are kept as a bitset (a Python integer) and the
+activities are visited in topological order, so every ancestor set is the union
+of the finished sets of the direct predecessors. No recursion is involved.
+'''
+
+import numpy as np
+
+
+def ancestor_bitsets(project):
+    '''
+    Bitset of the direct and indirect predecessors of every activity.
+    '''
+    ancestors = [0] * (project.act_count + 2)
+    for act in project.topological_order():
+        bits = 0
+        for pre in project.predecessors(act).tolist():
+            bits |= ancestors[pre] | (1 << pre)
+        ancestors[act] = bits
+
+    return ancestors
+
+
+def transitive_closure(project):
+    '''
+    Boolean matrix with closure[i, j] = True if i is a direct or indirect predecessor of j.
+    '''
+    size = project.act_count + 2
+    width = (size + 7) // 8
+    packed = b''.join(bits.to_bytes(width, 'little') for bits in ancestor_bitsets(project))
+
+    # Row j holds the ancestors of j, the closure is its transpose
+    ancestors = np.unpackbits(np.frombuffer(packed, dtype=np.uint8).reshape(size, width),
+                              axis=1, count=size, bitorder='little')
+    return ancestors.T.astype(bool)
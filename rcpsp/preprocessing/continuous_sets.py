@@ -0,0 +1,68 @@
+'''
+Modelling sets of the continuous time formulations.
+
+All sets are ordered pairs of activities computed as boolean matrices over the
+consumption matrix and the transitive closure, and returned as sorted lists of
+tuples as expected by the Set(dimen=2) components of the models.
+'''
+
+import numpy as np
+
+from rcpsp.preprocessing.closure import transitive_closure
+
+
+def to_pairs(mask):
+    rows, cols = np.nonzero(mask)
+    return list(zip(rows.tolist(), cols.tolist()))
+
+
+def continuous_sets(project, est, lft, closure=None, window_precedence=False, shared_resources=False):
+    '''
+    B: every ordered pair of distinct real activities. With shared_resources only the
+       pairs that use at least one common resource, the others never compete
+    C: precedence transitive closure. All hard precedence relationships, in both directions
+    G: activities that cannot be executed in parallel due to resource cap violations
+    D: activities ordered by their time windows (lft[i] <= est[j]) without a hard precedence,
+       in both directions as C. Only derived with window_precedence, the solver scripts
+       have used an empty D unless asked to reduce the sets
+    K: C | D
+    S: activities that cannot overlap due to resource capacity limitations,
+       excluding those with known precedence relations
+    P: activities that can overlap
+    '''
+    size = project.act_count + 2
+    if closure is None:
+        closure = transitive_closure(project)
+
+    real = np.zeros(size, dtype=bool)
+    real[1:project.sink] = True
+    distinct = real[:, None] & real[None, :] & ~np.eye(size, dtype=bool)
+
+    r_cons = np.asarray(project.r_cons)
+    B = distinct
+    if shared_resources:
+        B = distinct & ((r_cons[:, None, :] > 0) & (r_cons[None, :, :] > 0)).any(axis=2)
+    C = closure | closure.T
+
+    # Pairs exceeding the capacity of at least one resource
+    exceeds = ((r_cons[:, None, :] + r_cons[None, :, :]) > np.asarray(project.r_cap)).any(axis=2)
+    G = B & exceeds
+
+    D = np.zeros((size, size), dtype=bool)
+    if window_precedence:
+        lft = np.array([lft[act] for act in range(size)])
+        est = np.array([est[act] for act in range(size)])
+        D = distinct & ~C & (lft[:, None] <= est[None, :])
+        D = D | D.T
+
+    K = C | D
+
+    return {
+        'B': to_pairs(B),
+        'C': to_pairs(C),
+        'D': to_pairs(D),
+        'G': to_pairs(G),
+        'K': to_pairs(K),
+        'S': to_pairs(G & ~K),
+        'P': to_pairs(B & ~(G | K))
+    }
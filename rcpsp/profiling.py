@@ -0,0 +1,219 @@
+'''
+Phase timers and model sizes of the solver entry points.
+
+A Profiler measures named phases, which may be nested, e.g. preprocessing/sgs.
+Every phase records its wall and CPU time, the CPU time of child processes (the
+CPLEX executable of the shell interface), the peak resident set size of the
+process and of its children at the end of the phase, and how much the phase
+raised that peak. Phases with the same name under the same parent are added up,
+so the iterations of a lazy or sweep run show as one row with a call count.
+
+model_size counts the variables, constraints and nonzeros of every Pyomo
+component of an instance. Nonzeros are the distinct unfixed variables in the
+body of every active row.
+
+A disabled Profiler runs the phases without measuring them, so the solvers
+declare their phases whether profiling is asked for or not. Phases named, or
+given by their path, in cprofile are also run under cProfile; the
+statistics are written next to the profile, one .prof file per phase, and read
+with python -m pstats.
+'''
+
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then left out
+    resource = None
+
+MB = 1024 * 1024 if sys.platform == 'darwin' else 1024
+
+
+def _peak_rss(children=False):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss / MB
+
+
+def _child_cpu_time():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def profile_filename(result_file):
+    '''
+    Profile of a result file, stored next to it.
+    '''
+    return os.path.splitext(result_file)[0] + '.profile.json'
+
+
+def model_size(model):
+    '''
+    Variables, constraints and nonzeros of the active components of a Pyomo model,
+    submodels included, as a list of dictionaries in declaration order.
+    '''
+    # Pyomo is only loaded for models, run_sgs.py starts without it
+    import pyomo.environ as pyo
+    from pyomo.core.expr.visitor import identify_variables
+
+    components = []
+    for var in model.component_objects(pyo.Var, active=True, descend_into=True):
+        components.append({'name': var.name, 'type': 'Var', 'count': len(var), 'nonzeros': None})
+
+    for con in model.component_objects(pyo.Constraint, active=True, descend_into=True):
+        rows = nonzeros = 0
+        for row in con.values():
+            if row.active:
+                rows += 1
+                nonzeros += sum(1 for _ in identify_variables(row.body, include_fixed=False))
+        components.append({'name': con.name, 'type': 'Constraint', 'count': rows, 'nonzeros': nonzeros})
+
+    return components
+
+
+class Profiler:
+
+    def __init__(self, enabled=True, cprofile=()):
+        self.enabled = enabled
+        self.cprofile = set(cprofile)
+        self.root = self.__node(None)
+        self.models = {}
+        self.__stack = [self.root]
+        self.__stats = {}
+        self.__active = None
+        self.__started = time.time()
+
+    @staticmethod
+    def __node(name):
+        return {'name': name, 'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0, 'child_cpu_time': 0.0,
+                'peak_rss_mb': None, 'rss_growth_mb': None, 'peak_child_rss_mb': None, 'phases': {}}
+
+    def path(self):
+        return '/'.join(node['name'] for node in self.__stack[1:])
+
+    @contextmanager
+    def phase(self, name):
+        '''
+        Measure the enclosed block as a phase below the current one.
+        '''
+        if not self.enabled:
+            yield
+            return
+
+        parent = self.__stack[-1]
+        node = parent['phases'].setdefault(name, self.__node(name))
+        self.__stack.append(node)
+        path = self.path()
+
+        # cProfile can not be nested, an enclosing profiled phase already covers this one
+        profiler = None
+        if self.__active is None and (name in self.cprofile or path in self.cprofile):
+            profiler = self.__stats.setdefault(path, cProfile.Profile())
+            self.__active = profiler
+            profiler.enable()
+
+        peak = _peak_rss()
+        wall, cpu, child_cpu = time.time(), time.process_time(), _child_cpu_time()
+        try:
+            yield
+        finally:
+            node['wall_time'] += time.time() - wall
+            node['cpu_time'] += time.process_time() - cpu
+            node['child_cpu_time'] += _child_cpu_time() - child_cpu
+            node['calls'] += 1
+
+            if profiler is not None:
+                profiler.disable()
+                self.__active = None
+
+            if peak is not None:
+                node['peak_rss_mb'] = _peak_rss()
+                node['rss_growth_mb'] = (node['rss_growth_mb'] or 0.0) + node['peak_rss_mb'] - peak
+                node['peak_child_rss_mb'] = _peak_rss(children=True)
+            self.__stack.pop()
+
+    def model_size(self, model, label='model'):
+        '''
+        Record the size of a model under a label, e.g. the initial and final model of a lazy run.
+        '''
+        if not self.enabled:
+            return None
+
+        with self.phase('model size'):
+            components = model_size(model)
+
+        self.models[label] = {
+            'variables': sum(c['count'] for c in components if c['type'] == 'Var'),
+            'constraints': sum(c['count'] for c in components if c['type'] == 'Constraint'),
+            'nonzeros': sum(c['nonzeros'] for c in components if c['type'] == 'Constraint'),
+            'components': components
+        }
+        return self.models[label]
+
+    def __phases(self, node):
+        return [dict({key: value for key, value in child.items() if key != 'phases'},
+                     phases=self.__phases(child)) for child in node['phases'].values()]
+
+    def to_dict(self):
+        return {
+            'Wall time': time.time() - self.__started,
+            'Peak RSS MB': _peak_rss(),
+            'Peak child RSS MB': _peak_rss(children=True),
+            'Phases': self.__phases(self.root),
+            'Models': self.models
+        }
+
+    def write(self, filename):
+        '''
+        Write the profile as json and the cProfile statistics of every profiled phase next to it.
+        '''
+        if not self.enabled:
+            return
+
+        with open(filename, 'w') as jsonFile:
+            json.dump(self.to_dict(), jsonFile, indent=4)
+
+        base = filename[:-len('.json')] if filename.endswith('.json') else filename
+        for path, profiler in self.__stats.items():
+            profiler.dump_stats('{base}.{phase}.prof'.format(base=base, phase=path.replace('/', '.').replace(' ', '_')))
+
+    def summary(self):
+        '''
+        Phases and model sizes as a table.
+        '''
+        def number(value, digits):
+            return '-' if value is None else '{value:.{digits}f}'.format(value=value, digits=digits)
+
+        lines = ['{:<32}{:>10}{:>10}{:>10}{:>12}{:>10}{:>7}'.format(
+            'Phase', 'Wall s', 'CPU s', 'Child s', 'Peak RSS MB', '+RSS MB', 'Calls')]
+
+        def add(node, depth):
+            for child in node['phases'].values():
+                lines.append('{:<32}{:>10}{:>10}{:>10}{:>12}{:>10}{:>7}'.format(
+                    ('  ' * depth + child['name'])[:31], number(child['wall_time'], 3), number(child['cpu_time'], 3),
+                    number(child['child_cpu_time'], 3), number(child['peak_rss_mb'], 1),
+                    number(child['rss_growth_mb'], 1), child['calls']))
+                add(child, depth + 1)
+
+        add(self.root, 0)
+        lines.append('{:<32}{:>10}{:>20}{:>12}'.format('Total', number(time.time() - self.__started, 3), '',
+                                                      number(_peak_rss(), 1)))
+
+        for label, model in self.models.items():
+            lines.append('')
+            lines.append('{:<52}{:>12}{:>12}{:>12}'.format(label, 'Variables', 'Rows', 'Nonzeros'))
+            for component in model['components']:
+                variables = component['count'] if component['type'] == 'Var' else ''
+                rows = component['count'] if component['type'] == 'Constraint' else ''
+                lines.append('{:<52}{:>12}{:>12}{:>12}'.format(
+                    component['name'][:51], variables, rows, '' if component['nonzeros'] is None else component['nonzeros']))
+            lines.append('{:<52}{:>12}{:>12}{:>12}'.format('Total', model['variables'], model['constraints'], model['nonzeros']))
+
+        return '\n'.join(lines)
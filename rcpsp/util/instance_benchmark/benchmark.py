@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+
+'''
+Benchmark of the heuristics, the preprocessing and the model build, without CPLEX.
+
+run measures every phase on a fixed stratified sample of the PSPLIB sets: a
+number of parameter groups spread evenly over every set and one seeded instance
+of each group, so the same seed always gives the same sample. Times are the
+minimum over the repeats. Memory is the peak of the Python allocations during
+the build, measured with tracemalloc in a separate run so it does not slow down
+the timed ones. The SGS makespan is compared with the critical path bound, so
+changes to the heuristics show up as a change in bound quality.
+
+Phases:
+    load        Instance.load from json, without the instance cache
+    cpm         earliest and latest times with the forward and backward recursion
+    sgs         serial SGS of the solvers, makespan and deviation from the critical path
+    portfolio   priority rule portfolio with --portfolio sampling passes, if given
+    closure     precedence transitive closure
+    sets        sets of the continuous model
+    dis_build   create_instance of rcpsp_dis.py, variables, rows and memory
+    dis_direct  build_model of direct_dis.py
+    con_build   create_instance of rcpsp_con.py, variables, rows and memory
+    dis_lp      LP file of the discrete instance, time and size
+    con_lp      LP file of the continuous instance, time and size
+
+Every run is stored as json with the commit, the versions and the sample. compare
+adds up every metric over the instances of both runs and flags the metrics that
+grew by more than the threshold, and the SGS and portfolio makespans that grew at
+all. Its exit status is 1 if there are regressions.
+
+Usage: python benchmark.py run j30 j60 j90 j120 -n 8 -r 3
+       python benchmark.py compare data/results/benchmarks/benchmark_<old>.json data/results/benchmarks/benchmark_<new>.json -t 0.1
+'''
+
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from rcpsp.heuristics.backward_recursion import BackwardRecursion
+from rcpsp.heuristics.forward_recursion import get_earliest_times
+from rcpsp.heuristics.portfolio import run_portfolio
+from rcpsp.heuristics.sgs import serial_schedule_generation
+from rcpsp.instance import Instance
+from rcpsp.preprocessing.closure import transitive_closure
+from rcpsp.preprocessing.continuous_sets import continuous_sets
+
+INSTANCE_BASE = 'data/instances/json/'
+BENCHMARK_DIR = 'data/results/benchmarks/'
+
+# Lower is better for every metric. Times below MIN_TIME in total are noise and never flagged,
+# the quality metrics are deterministic and have their own threshold.
+METRICS = {
+    'time': ('load.time', 'cpm.time', 'sgs.time', 'portfolio.time', 'closure.time', 'sets.time', 'dis_build.time',
+             'dis_direct.time', 'con_build.time', 'dis_lp.time', 'con_lp.time'),
+    'memory': ('dis_build.peak_mb', 'con_build.peak_mb'),
+    'quality': ('sgs.makespan', 'sgs.deviation', 'portfolio.makespan'),
+    'size': ('dis_build.variables', 'dis_build.constraints', 'con_build.variables', 'con_build.constraints',
+             'dis_lp.bytes', 'con_lp.bytes')
+}
+MIN_TIME = 0.01
+
+
+def stratified_sample(instance_dir, per_set, seed=0):
+    '''
+    Instance names of per_set parameter groups spread evenly over a set, one seeded instance per group.
+    Names are <set><group>_<instance>, e.g. j3010_1 is instance 1 of group 10 of j30.
+    '''
+    groups = {}
+    for filename in glob.glob(INSTANCE_BASE + instance_dir + '/*.json'):
+        instance_name = os.path.splitext(os.path.basename(filename))[0]
+        match = re.match(r'^{set}(\d+)_(\d+)$'.format(set=re.escape(instance_dir)), instance_name)
+        if match is not None:
+            groups.setdefault(int(match.group(1)), []).append((int(match.group(2)), instance_name))
+
+    keys = sorted(groups)
+    if per_set < len(keys):
+        keys = [keys[round(i * (len(keys) - 1) / max(per_set - 1, 1))] for i in range(per_set)]
+
+    rng = random.Random('{seed}/{instance_dir}'.format(seed=seed, instance_dir=instance_dir))
+    return [rng.choice(sorted(groups[key]))[1] for key in keys]
+
+
+def __timed(repeat, function, *args):
+    '''
+    Result of the last call and the minimum time over repeat calls.
+    '''
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def __peak_mb(function, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def __lp_write(instance, directory):
+    filename = os.path.join(directory, 'model.lp')
+    instance.write(filename, io_options={'symbolic_solver_labels': False})
+    return os.path.getsize(filename)
+
+
+def benchmark_instance(instance_dir, instance_name, repeat=3, portfolio_passes=None, models=True):
+    '''
+    Metrics of every phase of one instance as a dictionary of 'phase.metric' values.
+    '''
+    metrics = {}
+    project, metrics['load.time'] = __timed(repeat, Instance.load, instance_dir, instance_name, False)
+    data = project.to_data()
+    act_count, r_count, sink = project.act_count, project.r_count, project.sink
+    act_pre, act_proc, r_cons, r_cap = data['act_pre'], data['act_proc'], data['r_cons'], data['r_cap']
+
+    def cpm(horizon):
+        est, eft = get_earliest_times(sink, act_pre, act_proc)
+        lst, lft = BackwardRecursion(sink, horizon, act_pre, act_proc).get_latest_times()
+        return est, eft, lst, lft
+
+    (est, eft, lst_init, lft_init), metrics['cpm.time'] = __timed(repeat, cpm, sum(act_proc.values()))
+
+    (upper_bound, schedule), metrics['sgs.time'] = __timed(
+        repeat, lambda: serial_schedule_generation(act_count, act_proc, act_pre, r_count, r_cons, r_cap, lft_init,
+                                                   return_schedule=True))
+    metrics['sgs.makespan'] = upper_bound
+    metrics['sgs.deviation'] = (upper_bound - est[sink]) / est[sink] if est[sink] else 0.0
+
+    if portfolio_passes is not None:
+        (makespan, _, _), metrics['portfolio.time'] = __timed(
+            repeat, lambda: run_portfolio(project, passes=portfolio_passes, seed=0,
+                                          act_proc=[act_proc[act] for act in range(sink + 1)]))
+        metrics['portfolio.makespan'] = makespan
+
+    est, eft, lst, lft = cpm(upper_bound)
+    closure, metrics['closure.time'] = __timed(repeat, transitive_closure, project)
+    sets, metrics['sets.time'] = __timed(repeat, continuous_sets, project, est, lft, closure)
+
+    if not models:
+        return metrics
+
+    # Pyomo is only needed for the models, heuristics and preprocessing run without it
+    import rcpsp.formulations.perfect_knowledge.continuous.rcpsp_con as rcpsp_con
+    import rcpsp.formulations.perfect_knowledge.discrete.rcpsp_dis as rcpsp_dis
+    from rcpsp.formulations.perfect_knowledge.discrete.direct_dis import build_model
+
+    data.update({'est': est, 'eft': eft, 'lst': lst, 'lft': lft, 'upper_bound': {None: upper_bound}})
+    data_dis = dict(data, x_set_init=[(act, t) for act in range(sink + 1) for t in range(est[act], lst[act] + 1)])
+    data_con = dict(data, **{name: sets[name] for name in ('B', 'C', 'G', 'K', 'S', 'P')})
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, model, model_data in (('dis', rcpsp_dis.model, data_dis), ('con', rcpsp_con.model, data_con)):
+            instance, metrics[name + '_build.time'] = __timed(repeat, model.create_instance, {None: model_data})
+            _, metrics[name + '_build.peak_mb'] = __peak_mb(model.create_instance, {None: model_data})
+            metrics[name + '_build.variables'] = instance.nvariables()
+            metrics[name + '_build.constraints'] = instance.nconstraints()
+            metrics[name + '_lp.bytes'], metrics[name + '_lp.time'] = __timed(repeat, __lp_write, instance, directory)
+
+    _, metrics['dis_direct.time'] = __timed(repeat, build_model, project, est, lst, upper_bound, act_proc)
+
+    return metrics
+
+
+def __git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sets, per_set=8, seed=0, repeat=3, portfolio_passes=None, models=True, output=None):
+    '''
+    Benchmark the stratified sample of every set and store the run as json. Returns the run.
+    '''
+    sample = [(instance_dir, instance_name) for instance_dir in sets
+              for instance_name in stratified_sample(instance_dir, per_set, seed)]
+
+    pyomo_version = None
+    if models:
+        import pyomo.version
+        pyomo_version = pyomo.version.version
+
+    instances = {}
+    for done, (instance_dir, instance_name) in enumerate(sample, start=1):
+        key = instance_dir + '/' + instance_name
+        instances[key] = benchmark_instance(instance_dir, instance_name, repeat, portfolio_passes, models)
+        print('[{done}/{count}] {key}: sgs {makespan} ({deviation:.1%} over the critical path)'.format(
+            done=done, count=len(sample), key=key, makespan=instances[key]['sgs.makespan'],
+            deviation=instances[key]['sgs.deviation']), flush=True)
+
+    benchmark = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': __git_commit(),
+        'python': platform.python_version(),
+        'pyomo': pyomo_version,
+        'platform': platform.platform(),
+        'options': {'sets': sets, 'per_set': per_set, 'seed': seed, 'repeat': repeat,
+                    'portfolio_passes': portfolio_passes, 'models': models},
+        'totals': totals(instances),
+        'instances': instances
+    }
+
+    if output is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        output = '{directory}benchmark_{timestamp}.json'.format(
+            directory=BENCHMARK_DIR, timestamp=datetime.now().strftime("%d_%m_%Y_%H_%M_%S"))
+    with open(output, 'w') as jsonFile:
+        json.dump(benchmark, jsonFile, indent=4)
+    print('Stored ' + output)
+
+    return benchmark
+
+
+def totals(instances, keys=None):
+    '''
+    Sum of every metric over the given instances, all by default. Only metrics of every instance are added up.
+    '''
+    keys = sorted(instances) if keys is None else keys
+    metrics = set.intersection(*(set(instances[key]) for key in keys)) if keys else set()
+    return {metric: sum(instances[key][metric] for key in keys) for metric in sorted(metrics)}
+
+
+def compare(base, new, threshold=0.1, quality_threshold=0.0):
+    '''
+    Ratio of every metric total of new over base, on the instances of both runs.
+    Returns (metric, kind, base total, new total, ratio, regression) rows.
+    '''
+    keys = sorted(set(base['instances']) & set(new['instances']))
+    if not keys:
+        raise ValueError('The benchmarks have no instance in common')
+
+    base_totals, new_totals = totals(base['instances'], keys), totals(new['instances'], keys)
+
+    rows = []
+    for kind, metrics in METRICS.items():
+        for metric in metrics:
+            if metric not in base_totals or metric not in new_totals:
+                continue
+            before, after = base_totals[metric], new_totals[metric]
+            ratio = after / before if before else (1.0 if after == before else float('inf'))
+            regression = ratio > 1 + (quality_threshold if kind == 'quality' else threshold)
+            if kind == 'time' and max(before, after) < MIN_TIME:
+                regression = False
+            rows.append((metric, kind, before, after, ratio, regression))
+
+    return rows
+
+
+def __print_comparison(rows, base, new, count):
+    print('{count} instances, base {base} ({base_commit}), new {new} ({new_commit})'.format(
+        count=count, base=base['created'], base_commit=(base.get('commit') or '-')[:10],
+        new=new['created'], new_commit=(new.get('commit') or '-')[:10]))
+    print('{:<24}{:<9}{:>14}{:>14}{:>9}'.format('Metric', 'Kind', 'Base', 'New', 'Ratio'))
+    for metric, kind, before, after, ratio, regression in rows:
+        print('{:<24}{:<9}{:>14.4g}{:>14.4g}{:>9.3f}{}'.format(metric, kind, before, after, ratio,
+                                                              '  REGRESSION' if regression else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark a stratified sample of the sets")
+    run_parser.add_argument("sets", nargs='+')
+    run_parser.add_argument("-n", "--per-set", type=int, default=8, dest="per_set",
+                            help="parameter groups per set, one instance each")
+    run_parser.add_argument("-seed", "--seed", type=int, default=0)
+    run_parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs of every phase, the minimum is kept")
+    run_parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                            help="also run the priority rule portfolio with this many sampling passes")
+    run_parser.add_argument("--no-models", dest="models", action="store_false", default=True,
+                            help="only the heuristics and the preprocessing, no model build or LP file")
+    run_parser.add_argument("-o", "--output", default=None)
+
+    compare_parser = commands.add_parser("compare", help="flag metrics that grew between two runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                                help="relative growth of a metric total that counts as a regression")
+    compare_parser.add_argument("-q", "--quality-threshold", type=float, default=0.0, dest="quality_threshold",
+                                help="relative growth of the makespans that counts as a regression")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.sets, args.per_set, args.seed, args.repeat, args.portfolio_passes, args.models, args.output)
+    else:
+        with open(args.base, 'r') as jsonFile:
+            base = json.load(jsonFile)
+        with open(args.new, 'r') as jsonFile:
+            new = json.load(jsonFile)
+
+        rows = compare(base, new, args.threshold, args.quality_threshold)
+        __print_comparison(rows, base, new, len(set(base['instances']) & set(new['instances'])))
+        sys.exit(1 if any(row[-1] for row in rows) else 0)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+'''
+Solve whole PSPLIB sets with a pool of worker processes.
+
+Every worker imports Python and Pyomo once and solves instances in-process.
+CPLEX threads are split between the workers so cores are not oversubscribed.
+Results are written to the usual data/results layout and instances that already
+have a result file, for the robust formulations one for the same THETA and GAMMA,
+are skipped, so an interrupted sweep can be resumed.
+
+Usage: python run_batch.py j30 j60 -f discrete -w 4
+       python run_batch.py 'j120/j12010_*' -f continuous
+'''
+
+import argparse
+import glob
+import importlib
+import multiprocessing
+import os
+import time
+
+from rcpsp.formulations.results import has_result, point_tag
+from rcpsp.formulations.solvers import INTERFACES
+
+INSTANCE_BASE = 'data/instances/json/'
+
+SOLVERS = {
+    'discrete': 'rcpsp.formulations.perfect_knowledge.discrete.solver_dis',
+    'continuous': 'rcpsp.formulations.perfect_knowledge.continuous.solver_con',
+    'robust_discrete': 'rcpsp.formulations.robust.discrete.worst_case_makespan.robust_solver_dis',
+    'robust_continuous': 'rcpsp.formulations.robust.continuous.worst_case_makespan.robust_solver_con',
+    'robust_decomposition': 'rcpsp.formulations.robust.decomposition.robust_solver_ccg',
+    'branch_and_bound': 'rcpsp.exact.branch_and_bound'
+}
+
+# Set by the pool initializer in every worker
+solver = None
+solver_options = None
+
+
+def get_instances(patterns):
+    '''
+    Expand set names (j30) or globs relative to the json directory (j30/j301_*)
+    to a sorted list of (instance_dir, instance_name) pairs.
+    '''
+    instances = set()
+    for pattern in patterns:
+        if '/' not in pattern and not glob.has_magic(pattern):
+            pattern = pattern + '/*'
+        if not pattern.endswith('.json'):
+            pattern = pattern + '.json'
+
+        for filename in glob.glob(INSTANCE_BASE + pattern):
+            instance_dir = os.path.basename(os.path.dirname(filename))
+            instance_name = os.path.splitext(os.path.basename(filename))[0]
+            instances.add((instance_dir, instance_name))
+
+    return sorted(instances)
+
+
+def get_solver_options(formulation, threads, timelimit, theta, gamma, portfolio_passes, improve_generations,
+                       interface, cache=True):
+    if formulation == 'discrete':
+        options = {'threads': threads, 'timelimit': timelimit}
+    elif formulation == 'continuous':
+        options = {'store': True, 'threads': threads, 'timelimit': timelimit}
+    elif formulation == 'robust_decomposition':
+        options = {'theta': theta, 'gamma': gamma, 'store': True, 'threads': threads, 'timelimit': timelimit}
+    elif formulation == 'branch_and_bound':
+        # No CPLEX, every batch worker searches its instance in-process
+        options = {'store': True, 'timelimit': timelimit}
+    else:
+        options = {'theta': theta, 'gamma': gamma, 'store': True, 'timelimit': timelimit}
+
+    options['portfolio_passes'] = portfolio_passes
+    options['improve_generations'] = improve_generations
+    if formulation != 'branch_and_bound':
+        options['interface'] = interface
+    options['cache'] = cache
+    return options
+
+
+def init_worker(formulation, options):
+    global solver, solver_options
+    solver = importlib.import_module(SOLVERS[formulation])
+    solver_options = options
+
+
+def solve_instance(task):
+    instance_dir, instance_name = task
+    start = time.time()
+    try:
+        _, results = solver.solve(instance_dir, instance_name, **solver_options)
+        status = str(results.solver.termination_condition)
+    except Exception as e:
+        status = 'error: {error}'.format(error=e)
+
+    return instance_dir, instance_name, status, time.time() - start
+
+
+def run_batch(patterns, formulation, workers, threads=None, timelimit=20 * 60, theta=0.0, gamma=0.0,
+              portfolio_passes=None, improve_generations=None, interface='shell', resume=True, cache=True):
+    instances = get_instances(patterns)
+    if resume:
+        # Robust results are only reused for the same THETA and GAMMA
+        tag = point_tag(theta, gamma) if formulation.startswith('robust') else None
+        instances = [(d, n) for d, n in instances if not has_result(formulation, d, n, tag)]
+
+    # The bilevel metasolver exchanges the inner results through a single file
+    if formulation in ('robust_discrete', 'robust_continuous') and workers > 1:
+        print('The bilevel metasolver shares its inner results file. Using a single worker.')
+        workers = 1
+
+    if threads is None:
+        threads = max(1, multiprocessing.cpu_count() // workers)
+
+    print('Solving {count} instances with {workers} workers and {threads} CPLEX threads each'
+          .format(count=len(instances), workers=workers, threads=threads))
+
+    options = get_solver_options(formulation, threads, timelimit, theta, gamma, portfolio_passes, improve_generations,
+                                 interface, cache)
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(formulation, options)) as pool:
+        for done, (instance_dir, instance_name, status, elapsed) in enumerate(
+                pool.imap_unordered(solve_instance, instances), start=1):
+            print('[{done}/{count}] {instance_dir}/{instance_name}: {status} ({elapsed:.1f}s)'.format(
+                done=done, count=len(instances), instance_dir=instance_dir, instance_name=instance_name,
+                status=status, elapsed=elapsed), flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sets", nargs='+')
+    parser.add_argument("-f", "--formulation", choices=sorted(SOLVERS), default='discrete')
+    parser.add_argument("-w", "--workers", type=int, default=max(1, multiprocessing.cpu_count() // 2))
+    parser.add_argument("-threads", "--threads", type=int, default=None)
+    parser.add_argument("-timelimit", "--timelimit", type=float, default=20 * 60)
+    parser.add_argument("-theta", "--theta", type=float, default=0.0)
+    parser.add_argument("-gamma", "--gamma", type=float, default=0.0)
+    parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes")
+    parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations")
+    parser.add_argument("-interface", "--interface", choices=sorted(INTERFACES), default='shell')
+    parser.add_argument("--no-resume", dest="resume", action="store_false", default=True)
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True,
+                        help="solve instances even if the solve cache holds their result")
+    args = parser.parse_args()
+
+    run_batch(args.sets, args.formulation, args.workers, args.threads, args.timelimit,
+              args.theta, args.gamma, args.portfolio_passes, args.improve_generations,
+              args.interface, args.resume, args.cache)
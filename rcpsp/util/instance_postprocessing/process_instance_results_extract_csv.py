@@ -1,54 +1,62 @@
 #!/usr/bin/env python
-import sys
-import os
-import re
-import json
+
+'''
+Export the latest result of every instance and formulation of a set to csv.
+
+Results come from the result store (rcpsp.formulations.result_store). Result
+files that are not stored yet, e.g. from before the store existed, are imported
+first, so every file is read at most once.
+
+Usage: python process_instance_results_extract_csv.py j30 j60 -f discrete continuous
+'''
+
+import argparse
 import csv
 
-def convert_file(filename, writer):
-    instname = filename.split('_results')[0]
-    with open(dis_dir + filename, 'r') as fpdis:
-        data_dis = json.load(fpdis)
-
-        lower_bound = data_dis['Problem'][0]['Lower bound']
-        upper_bound = data_dis['Problem'][0]['Upper bound']
-        variables = data_dis['Problem'][0]['Number of variables']
-        constraints = data_dis['Problem'][0]['Number of constraints']
-        time = data_dis['Solver'][0]['User time']
-
-        data1 = [instname, 'discrete', lower_bound, upper_bound, time, variables, constraints]
-    
-    for filename in os.listdir(con_dir):
-        if(filename.startswith(instname)):
-            with open(con_dir + filename, 'r') as fpcon:
-                data_con = json.load(fpcon)
-                lower_bound = data_con['Problem'][0]['Lower bound']
-                upper_bound = data_con['Problem'][0]['Upper bound']
-                variables = data_con['Problem'][0]['Number of variables']
-                constraints = data_con['Problem'][0]['Number of constraints']
-                time = data_con['Solver'][0]['User time']
-
-                data = [instname, 'continuous', lower_bound, upper_bound, time, variables, constraints]
-                writer.writerow(data1)
-                writer.writerow(data)
-        
-
-base_dir = sys.argv[1]
-instance = sys.argv[2]
-dis_dir = base_dir + '/discrete/' + instance + '/'
-con_dir = base_dir + '/discrete/' + instance + '/'
-
-f = open(instance + 'results.csv', 'w')
-
-writer = csv.writer(f)
-header = ['instance', 'formulation', 'lower_bound', 'upper_bound', 'time', 'variables', 'constaints']
-writer.writerow(header)
-
-for filename in os.listdir(dis_dir): 
-    if filename.endswith(".json"): 
-        try:
-            convert_file(filename, writer)
-        except:
-            pass
-      
-f.close()
\ No newline at end of file
+from rcpsp.formulations.result_store import RESULTS_DB, import_results, query
+
+HEADER = ['instance', 'group', 'formulation', 'lower_bound', 'upper_bound', 'time', 'variables', 'constraints', 'optimal']
+
+
+def latest_results(instance_dir, formulations, db=RESULTS_DB):
+    '''
+    Last stored row of every instance, formulation, THETA and GAMMA of a set.
+    '''
+    rows = query('SELECT * FROM results WHERE instance_dir = ? AND formulation IN ({formulations}) ORDER BY created, id'
+                 .format(formulations=', '.join('?' * len(formulations))), [instance_dir] + list(formulations), db)
+
+    latest = {}
+    for row in rows:
+        latest[row['instance'], row['formulation'], row['theta'], row['gamma']] = row
+
+    return [latest[key] for key in sorted(latest, key=lambda key: (key[0], formulations.index(key[1]), key[2] or 0, key[3] or 0))]
+
+
+def write_csv(rows, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for row in rows:
+            user_time = None if row['user_time'] is None else round(row['user_time'], 1)
+            writer.writerow([row['instance'], row['instance'].split('_')[0], row['formulation'], row['lower_bound'],
+                             row['upper_bound'], user_time, row['variables'], row['constraints'],
+                             row['termination'] == 'optimal' or row['gap'] == 0])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sets", nargs='+')
+    parser.add_argument("-f", "--formulations", nargs='+', default=['discrete', 'continuous'])
+    parser.add_argument("-o", "--output", default='{instance_dir}results.csv',
+                        help="csv file of every set, {instance_dir} is replaced by the set name")
+    parser.add_argument("--no-import", dest="import_files", action="store_false", default=True,
+                        help="only export what is already in the store")
+    args = parser.parse_args()
+
+    if args.import_files:
+        print('Imported {count} result files'.format(count=import_results(args.formulations)))
+
+    for instance_dir in args.sets:
+        rows = latest_results(instance_dir, args.formulations)
+        write_csv(rows, args.output.format(instance_dir=instance_dir))
+        print('{instance_dir}: {count} results'.format(instance_dir=instance_dir, count=len(rows)))
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+'''
+Build the binary instance cache of one or more sets, e.g. build_cache.py j30 j60 j90 j120
+'''
+
+import argparse
+
+from rcpsp.instance_cache import build_cache
+
+parser = argparse.ArgumentParser()
+parser.add_argument("sets", nargs='+')
+parser.add_argument("-portfolio", "--portfolio", type=int, default=None, dest="portfolio_passes",
+                    help="also cache the windows of the priority rule portfolio with this many sampling passes")
+parser.add_argument("-improve", "--improve", type=int, default=None, dest="improve_generations",
+                    help="also cache the windows of this many generations of the genetic algorithm")
+args = parser.parse_args()
+
+# The windows of the plain SGS are always cached, as the solvers use them by default
+heuristics = [(None, None)]
+if args.portfolio_passes is not None or args.improve_generations is not None:
+    heuristics.append((args.portfolio_passes, args.improve_generations))
+
+for instance_dir in args.sets:
+    count = build_cache(instance_dir, heuristics)
+    print('Cached {count} instances of {instance_dir}'.format(count=count, instance_dir=instance_dir))
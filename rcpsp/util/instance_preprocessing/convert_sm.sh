@@ -3,8 +3,4 @@
 scriptdir=$(dirname "$0")
 instancebase=${scriptdir}/../../../data/instances
 
-for indir in ${instancebase}/sm/*; do
-    for infile in ${indir}/*.sm; do
-        python3 ${scriptdir}/psplibconverter.py ${infile}
-    done
-done
+python3 ${scriptdir}/psplibconverter.py ${instancebase}/sm --workers $(nproc)
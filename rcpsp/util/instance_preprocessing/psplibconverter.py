@@ -1,111 +1,235 @@
 #!/usr/bin/env python
-import sys
-import os
-import re
-import json
 
+'''
+Convert PSPLIB instances to the json layout read by rcpsp.instance.
 
-def extract_val(lines, line_prefix, exception_msg, sep=':'):
-    for line in lines:
-        if line.strip().startswith(line_prefix):
-            return int(re.sub('\D', '', line.split(sep)[1]))
-    raise Exception(exception_msg)
-
-
-def index_of_line_starting_with(prefix, lines):
-    ctr = 0
-    for line in lines:
-        if line.startswith(prefix):
-            return ctr
-        ctr += 1
-    raise Exception('No line starting with prefix: ' + prefix + ' found in list!')
-
-
-def zero_index_activity(act):
-    return int(act) - 1
-
-
-def extract_activity_precedence(lines):
-    pre_data = []
-    pre_data_line = {}
-    ix = index_of_line_starting_with('PRECEDENCE RELATIONS:', lines)
-    # initialize precidence dictionary
-    for act in range(act_count):
-        # pyomo indexed elements required format
-        pre_data_line[act] = {'index': act, 'value': []}
-
-    for line in lines[ix + 2:ix + 2 + act_count]:
-        parts = line.split()
-        act = zero_index_activity(parts[0])
-        succs = parts[3:]
-        # change successor format to predecessor
-        for succ in succs:
-            idx = zero_index_activity(succ)
-            pre_data_line[idx]['value'].append(act)
+Single mode .sm files of PSPLIB and files in the Patterson format (.rcp), e.g.
+the RG300 and RG30 sets, are parsed in one pass over their lines. Directories are
+searched recursively and their files are converted on a process pool.
 
-        pre_data.append(pre_data_line[act])
+Output formats:
+    json     indented json, the layout of data/instances/json
+    compact  the same json without whitespace
+    npz      the compressed sparse row arrays of rcpsp.instance, read by Instance.from_npz
 
-    return pre_data
+By default the first directory named sm or rcp in the input path is replaced by
+json, so data/instances/sm/j30/j301_1.sm becomes data/instances/json/j30/j301_1.json.
 
+Usage: python psplibconverter.py data/instances/sm -w 4
+       python psplibconverter.py data/instances/rcp/RG300 -f npz -o data/instances/json/RG300
+'''
 
-def extract_activity_attributes(lines):
-    r_cons = []
-    act_proc = []
-    ix = index_of_line_starting_with('REQUESTS/DURATIONS:', lines)
+import argparse
+import json
+import multiprocessing
+import os
+import re
 
-    # dummy source and sink activities are skipped.
-    for line in lines[ix + 4:ix + 4 + act_count - 2]:
-        parts = line.split()
-        act = zero_index_activity(parts[0])
-        act_proc.append({'index': act, 'value': int(parts[2])})
-        for r in range(r_count):
-            r_cons.append({'index': [act, 1 + r], 'value': int(parts[3 + r])})
-            
-    return r_cons, act_proc
+import numpy as np
 
+from rcpsp.instance import Instance
 
-def extract_resource_capacities(lines):
-    rcap_data = []
-    ix = index_of_line_starting_with('RESOURCEAVAILABILITIES', lines)
+FORMATS = ('json', 'compact', 'npz')
+EXTENSIONS = ('.sm', '.rcp')
 
-    rlist = list(map(lambda capstr: int(capstr), lines[ix + 2].split()))
-    for idx in range(1, len(rlist) + 1):
-        rcap_data.append({'index': idx, 'value': rlist[idx - 1]})
 
-    return rcap_data
+def __value(line, exception_msg):
+    try:
+        return int(re.sub(r'\D', '', line.split(':')[1]))
+    except (IndexError, ValueError):
+        raise ValueError(exception_msg)
 
 
-def parse_lines(lines):
-    global act_count, r_count
+def instance_data(act_succ, act_proc, r_cons, r_cap):
+    '''
+    Pyomo indexed elements of an instance given the successors, durations and
+    consumptions of all activities, dummy source and sink included.
+    The dummy activities are left out of act_proc and r_cons.
+    '''
+    act_count = len(act_succ)
+    r_count = len(r_cap)
 
-    act_count = extract_val(lines, 'jobs (incl. supersource/sink', 'Unable to extract number of acts!')
-    r_count = extract_val(lines, '- renewable', 'Unable to extract number of resources!')
-    r_cons, act_proc = extract_activity_attributes(lines)
-    r_cap = extract_resource_capacities(lines)
-    pre_data = extract_activity_precedence(lines)
+    # Successor lists become predecessor lists
+    act_pre = [{'index': act, 'value': []} for act in range(act_count)]
+    for act, succs in enumerate(act_succ):
+        for succ in succs:
+            act_pre[succ]['value'].append(act)
 
-    data = {
+    return {
         'act_count': act_count - 2,  # remove source and sink from act count
         'r_count': r_count,
-        'act_pre': pre_data,
-        'r_cap': r_cap,
-        'r_cons': r_cons,
-        'act_proc': act_proc
-
+        'act_pre': act_pre,
+        'r_cap': [{'index': r + 1, 'value': r_cap[r]} for r in range(r_count)],
+        'r_cons': [{'index': [act, r + 1], 'value': r_cons[act][r]} for act in range(1, act_count - 1) for r in range(r_count)],
+        'act_proc': [{'index': act, 'value': act_proc[act]} for act in range(1, act_count - 1)]
     }
 
-    return data
 
+def parse_sm(lines):
+    '''
+    Instance data of a single mode PSPLIB .sm file.
+    '''
+    act_count = r_count = None
+    act_succ, act_proc, r_cons, r_cap = [], [], [], None
 
-def convert_file(smfilename):
-    smpath = os.path.split(smfilename)
-    instname = smpath[1].split('.')[0]
-    smdir = smpath[0].split('sm')
-    with open(smfilename, 'r') as fp:
-        lines = fp.readlines()
-        data = parse_lines(lines)
-        with open(smdir[0] + 'json' + smdir[1] + '/' + instname + '.json', 'w') as jsonfp:
+    lines = iter(lines)
+    for line in lines:
+        text = line.strip()
+        if text.startswith('jobs (incl. supersource/sink'):
+            act_count = __value(text, 'Unable to extract number of acts!')
+        elif text.startswith('- renewable'):
+            r_count = __value(text, 'Unable to extract number of resources!')
+        elif text.startswith('PRECEDENCE RELATIONS:'):
+            next(lines)
+            for _ in range(act_count):
+                parts = next(lines).split()
+                act_succ.append([int(succ) - 1 for succ in parts[3:]])
+        elif text.startswith('REQUESTS/DURATIONS:'):
+            # Column header and separator
+            next(lines)
+            next(lines)
+            for _ in range(act_count):
+                parts = next(lines).split()
+                act_proc.append(int(parts[2]))
+                r_cons.append([int(units) for units in parts[3:3 + r_count]])
+        elif text.startswith('RESOURCEAVAILABILITIES'):
+            next(lines)
+            r_cap = [int(cap) for cap in next(lines).split()]
+
+    if act_count is None or r_count is None:
+        raise ValueError('Unable to extract number of acts and resources!')
+    if len(act_succ) != act_count or len(act_proc) != act_count or r_cap is None:
+        raise ValueError('Missing precedence relations, durations or resource availabilities!')
+
+    return instance_data(act_succ, act_proc, r_cons, r_cap)
+
+
+def parse_rcp(lines):
+    '''
+    Instance data of a Patterson format file. The file holds the number of
+    activities and resources, the capacities and then per activity the duration,
+    the consumptions, the number of successors and the successors, separated by
+    any whitespace.
+    '''
+    tokens = (int(token) for line in lines for token in line.split())
+    try:
+        act_count, r_count = next(tokens), next(tokens)
+        r_cap = [next(tokens) for _ in range(r_count)]
+
+        act_succ, act_proc, r_cons = [], [], []
+        for _ in range(act_count):
+            act_proc.append(next(tokens))
+            r_cons.append([next(tokens) for _ in range(r_count)])
+            act_succ.append([next(tokens) - 1 for _ in range(next(tokens))])
+    except StopIteration:
+        raise ValueError('Patterson file ends before the last activity!')
+
+    return instance_data(act_succ, act_proc, r_cons, r_cap)
+
+
+PARSERS = {'.sm': parse_sm, '.rcp': parse_rcp}
+
+
+def output_filename(filename, out_format='json', output_dir=None, root=None):
+    '''
+    Output file of an instance, below output_dir at the path of the instance relative to root.
+    '''
+    instname = os.path.splitext(os.path.basename(filename))[0]
+    extension = '.npz' if out_format == 'npz' else '.json'
+
+    directory = os.path.dirname(filename)
+    if output_dir is not None:
+        directory = os.path.join(output_dir, os.path.relpath(directory, root or directory))
+    else:
+        parts = directory.split(os.sep)
+        for ix in range(len(parts)):
+            if parts[ix] in ('sm', 'rcp'):
+                parts[ix] = 'json'
+                break
+        directory = os.sep.join(parts)
+
+    return os.path.join(os.path.normpath(directory), instname + extension)
+
+
+def write_data(data, filename, out_format='json'):
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+
+    if out_format == 'npz':
+        project = Instance.from_json_data(data)
+        np.savez_compressed(filename, act_count=project.act_count, r_count=project.r_count, act_proc=project.act_proc,
+                            r_cons=project.r_cons, r_cap=project.r_cap, pre_ptr=project.pre_ptr, pre_idx=project.pre_idx)
+    elif out_format == 'compact':
+        with open(filename, 'w') as jsonfp:
+            json.dump(data, jsonfp, separators=(',', ':'))
+    else:
+        with open(filename, 'w') as jsonfp:
             jsonfp.write(json.dumps(data, sort_keys=False, indent=4, separators=(',', ': ')))
 
 
-convert_file(sys.argv[1])
\ No newline at end of file
+def convert_file(filename, out_format='json', output_dir=None, root=None):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in PARSERS:
+        raise ValueError('Unknown instance format: ' + filename)
+
+    with open(filename, 'r') as fp:
+        data = PARSERS[extension](fp)
+
+    outfile = output_filename(filename, out_format, output_dir, root)
+    write_data(data, outfile, out_format)
+    return outfile
+
+
+def __convert_task(task):
+    try:
+        convert_file(*task)
+        return task[0], None
+    except (OSError, ValueError) as e:
+        return task[0], str(e)
+
+
+def find_instances(paths):
+    '''
+    (filename, root) of every instance file given directly or found below a directory.
+    '''
+    instances = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if os.path.splitext(filename)[1].lower() in EXTENSIONS:
+                        instances.append((os.path.join(dirpath, filename), path))
+        else:
+            instances.append((path, os.path.dirname(path)))
+
+    return sorted(instances)
+
+
+def convert(paths, out_format='json', output_dir=None, workers=1):
+    '''
+    Convert every instance below paths. Returns the number of converted files and the failures.
+    '''
+    tasks = [(filename, out_format, output_dir, root) for filename, root in find_instances(paths)]
+
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            done = list(pool.imap_unordered(__convert_task, tasks, chunksize=16))
+    else:
+        done = list(map(__convert_task, tasks))
+
+    failures = [(filename, error) for filename, error in done if error is not None]
+    return len(done) - len(failures), failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs='+', help="instance files or directories searched recursively")
+    parser.add_argument("-f", "--format", choices=FORMATS, default='json', dest="out_format")
+    parser.add_argument("-o", "--output", default=None, dest="output_dir",
+                        help="output directory, the input directory structure is kept below it")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    converted, failures = convert(args.paths, args.out_format, args.output_dir, args.workers)
+    for filename, error in failures:
+        print('{filename}: {error}'.format(filename=filename, error=error))
+    print('Converted {count} instances'.format(count=converted))
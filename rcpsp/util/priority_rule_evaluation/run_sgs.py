@@ -1,56 +1,89 @@
 import argparse
+import sys
 
-import pyomo.dataportal as dp
-import pyomo.environ as pyo
-from pyomo.core.base.component import CloneError
+from rcpsp.instance import Instance
 from rcpsp.heuristics.backward_recursion import BackwardRecursion
 from rcpsp.heuristics.forward_recursion import get_earliest_times
+from rcpsp.heuristics.genetic import improve
+from rcpsp.heuristics.portfolio import RULES, run_portfolio
 from rcpsp.heuristics.sgs import serial_schedule_generation
-
-import rcpsp.formulations.perfect_knowledge.continuous.rcpsp_con as rcpsp
+from rcpsp.profiling import Profiler
 
 parser = argparse.ArgumentParser()
 parser.add_argument("dir") 
 parser.add_argument("instance") 
 parser.add_argument("-pr", "--use_pr", action="store_true", default=False) 
+parser.add_argument("--portfolio", action="store_true", default=False)
+parser.add_argument("--rules", nargs='+', choices=RULES, default=list(RULES))
+parser.add_argument("--passes", type=int, default=0)
+parser.add_argument("--workers", type=int, default=1)
+parser.add_argument("--generations", type=int, default=None)
+parser.add_argument("--islands", type=int, default=1)
+parser.add_argument("--timelimit", type=float, default=None)
+parser.add_argument("--seed", type=int, default=None)
+parser.add_argument("-v", "--verbose", action="store_true", default=False)
+parser.add_argument("--profile", default=None, metavar="FILE",
+                    help="time every phase, write the profile to this json file and the table to stderr")
+parser.add_argument("--cprofile", nargs='+', default=[], metavar="PHASE",
+                    help="also run these phases under cProfile, needs --profile")
 
 args = parser.parse_args()
 
-instance_dir = 'data/instances/json/{instance_dir}/'.format(instance_dir=args.dir)
 instance_name = args.instance
+profiler = Profiler(args.profile is not None, args.cprofile)
 
-data = dp.DataPortal()
-data.load(filename=instance_dir + instance_name + '.json')
+with profiler.phase('load'):
+    project = Instance.load(args.dir, instance_name)
+    data = project.to_data()
 
-act_count = data['act_count']
+act_count = project.act_count
 act_pre = data['act_pre']    
-r_count = data['r_count']
+r_count = project.r_count
 r_cons = data['r_cons']
 r_cap = data['r_cap']
 act_proc = data['act_proc']
 
-# Initialize dummy source and sink activities
-source = 0
-sink = act_count + 1
-
-act_proc[source] = 0
-act_proc[sink] = 0
-
-for r in range(1, r_count + 1):
-    r_cons[source, r] = 0
-    r_cons[sink, r] = 0
+# Dummy source and sink activities
+source = project.source
+sink = project.sink
 
 # Calculate earliest start and finish times
-est, eft = get_earliest_times(sink, act_pre, act_proc)
-data['est'] = est
-data['eft'] = eft
+with profiler.phase('cpm'):
+    est, eft = get_earliest_times(sink, act_pre, act_proc)
+    data['est'] = est
+    data['eft'] = eft
 
-# Calculate initial latest start and finish times. Upper bound is the sum of processing times
-br_init = BackwardRecursion(sink, sum(act_proc.values()), act_pre, act_proc)
-lst_init, lft_init = br_init.get_latest_times()
+    # Calculate initial latest start and finish times. Upper bound is the sum of processing times
+    br_init = BackwardRecursion(sink, sum(act_proc.values()), act_pre, act_proc)
+    lst_init, lft_init = br_init.get_latest_times()
 
 # Tighten upper bound with SGS
-upper_bound = serial_schedule_generation(
-    act_count, act_proc, act_pre, r_count, r_cons, r_cap, lft_init, args.use_pr)
+with profiler.phase('sgs'):
+    upper_bound = serial_schedule_generation(
+        act_count, act_proc, act_pre, r_count, r_cons, r_cap, lft_init, args.use_pr)
+
+# Best schedule over the priority rules and sampling passes
+if args.portfolio:
+    with profiler.phase('portfolio'):
+        makespan, start, rule = run_portfolio(project, args.rules, args.passes, workers=args.workers, seed=args.seed)
+    if args.verbose:
+        print('Portfolio best {makespan} by {rule}, single pass SGS {upper_bound}'
+              .format(makespan=makespan, rule=rule, upper_bound=upper_bound))
+    upper_bound = min(upper_bound, makespan)
+
+# Genetic algorithm with forward-backward improvement
+if args.generations is not None:
+    with profiler.phase('improve'):
+        makespan, start, activity_list = improve(project, args.generations, islands=args.islands,
+                                                 timelimit=args.timelimit, seed=args.seed)
+    if args.verbose:
+        print('Genetic algorithm best {makespan} after {generations} generations'
+              .format(makespan=makespan, generations=args.generations))
+    upper_bound = min(upper_bound, makespan)
+
+# run_pr.sh reads the upper bound from stdout
+if profiler.enabled:
+    profiler.write(args.profile)
+    print(profiler.summary(), file=sys.stderr)
 
-print(upper_bound)
\ No newline at end of file
+print(upper_bound)